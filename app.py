@@ -4,6 +4,7 @@ import boto3
 
 from aws_cdk import Aspects
 from cdk_nag import AwsSolutionsChecks
+from stack.compute_profiles import get_compute_profile
 from stack.vpc_stack import VpcStack
 from stack.web_stack import WebStack
 
@@ -14,7 +15,9 @@ env=cdk.Environment(account=account_id, region=region_name)
 app = cdk.App()
 
 vpc_stack = VpcStack(app, "GenAiBedrockVpcStack", env=env)
-WebStack(app, "GenAiBedrockWebStack", vpc=vpc_stack.vpc, env=env)
+# Choose with `cdk deploy -c computeProfile=prod` (see stack/compute_profiles.py)
+profile = get_compute_profile(app.node.try_get_context("computeProfile"))
+WebStack(app, "GenAiBedrockWebStack", vpc=vpc_stack.vpc, profile=profile, env=env)
 
 app.synth()
 
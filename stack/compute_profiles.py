@@ -0,0 +1,69 @@
+"""Per-environment compute for the web stack, chosen with `cdk deploy -c computeProfile=<name>`
+
+Task sizes come from `web-app/benchmarks/task_size.py`, fed with the per-session memory growth
+that `web-app/benchmarks/load_test.py` measures on the heaviest page (text to image, about 41 MiB
+per session, on a process of about 90 MiB). Web tasks hold up to 20 sessions (the
+`ActiveSessions` scaling target): 0.25 vCPU / 2 GiB by memory, with the CPU raised so that
+thumbnailing and image pre-processing don't queue. Background generations (see
+web-app/utils/jobs.py) run inside the web tasks, so there is no separate worker tier to size.
+
+Fargate Spot only runs X86_64 tasks, so a profile uses either Spot or ARM64 (Graviton), not both.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class TaskSize:
+    cpu: int         # CPU units (1024 is 1 vCPU)
+    memory_mib: int  # Must be valid for `cpu` on Fargate
+
+
+@dataclass(frozen=True)
+class ComputeProfile:
+    web: TaskSize
+    arm64: bool = False
+    # Share of tasks placed on Fargate Spot (by weight against on-demand Fargate), after the
+    # first `on_demand_base` tasks, which are always on-demand
+    spot_weight: int = 0
+    on_demand_weight: int = 1
+    on_demand_base: int = 0
+    min_tasks: int = 1
+    max_tasks: int = 10
+
+    def __post_init__(self):
+        if self.arm64 and self.spot_weight:
+            raise ValueError(
+                "Fargate Spot doesn't run ARM64 tasks: use spot_weight=0 with arm64=True"
+            )
+
+
+COMPUTE_PROFILES = {
+    # Cheapest: everything on Spot, which may interrupt a task with two minutes' notice
+    "dev": ComputeProfile(
+        web=TaskSize(cpu=512, memory_mib=2048),
+        spot_weight=1,
+        on_demand_weight=0,
+        min_tasks=1,
+        max_tasks=2,
+    ),
+    # Graviton on-demand tasks, ~20% cheaper than X86_64 for the same size, never interrupted
+    "prod": ComputeProfile(
+        web=TaskSize(cpu=1024, memory_mib=2048),
+        arm64=True,
+        min_tasks=2,
+        max_tasks=10,
+    ),
+}
+DEFAULT_COMPUTE_PROFILE = "dev"
+
+
+def get_compute_profile(name: Optional[str]) -> ComputeProfile:
+    """The profile called `name` (or the default profile, if None)"""
+    name = name or DEFAULT_COMPUTE_PROFILE
+    try:
+        return COMPUTE_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown compute profile {name!r}: expected one of {', '.join(COMPUTE_PROFILES)}"
+        ) from None
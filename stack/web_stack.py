@@ -1,77 +1,212 @@
 from aws_cdk import (
     Duration,
+    RemovalPolicy,
     Stack,
+    aws_applicationautoscaling as appscaling,
+    aws_cloudwatch as cloudwatch,
+    aws_dynamodb as dynamodb,
     aws_ec2 as ec2,    
+    aws_ecr_assets as ecr_assets,
     aws_iam as iam,
     aws_ecs as ecs,
     aws_ecs_patterns as ecs_patterns,
 )
 from constructs import Construct
+from typing import Optional
+
+from stack.compute_profiles import ComputeProfile, get_compute_profile
+
+# CloudWatch namespace and `Service` dimension of the load metrics the app publishes (see
+# web-app/utils/cloudwatch.py)
+METRICS_NAMESPACE = "GenAiBedrockWeb"
+METRICS_SERVICE = "WebApplication"
 
 class WebStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, vpc: ec2.IVpc, **kwargs) -> None:
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        vpc: ec2.IVpc,
+        profile: Optional[ComputeProfile] = None,
+        **kwargs,
+    ) -> None:
         super().__init__(scope, construct_id, **kwargs)
+        # See stack/compute_profiles.py
+        profile = profile or get_compute_profile(None)
+
+        # Create ECS cluster. Tasks run on Fargate (and Fargate Spot, by profile): no EC2 capacity
+        cluster = ecs.Cluster(self, "WebDemoCluster", vpc=vpc, enable_fargate_capacity_providers=True)
+
+        capacity_provider_strategies = []
+        if profile.on_demand_weight or profile.on_demand_base:
+            capacity_provider_strategies.append(ecs.CapacityProviderStrategy(
+                capacity_provider="FARGATE", base=profile.on_demand_base, weight=profile.on_demand_weight,
+            ))
+        if profile.spot_weight:
+            capacity_provider_strategies.append(ecs.CapacityProviderStrategy(
+                capacity_provider="FARGATE_SPOT", weight=profile.spot_weight,
+            ))
+        if profile.arm64:
+            platform = ecr_assets.Platform.LINUX_ARM64
+            runtime_platform = ecs.RuntimePlatform(
+                cpu_architecture=ecs.CpuArchitecture.ARM64,
+                operating_system_family=ecs.OperatingSystemFamily.LINUX,
+            )
+        else:
+            platform = ecr_assets.Platform.LINUX_AMD64
+            runtime_platform = ecs.RuntimePlatform(
+                cpu_architecture=ecs.CpuArchitecture.X86_64,
+                operating_system_family=ecs.OperatingSystemFamily.LINUX,
+            )
 
-        # Create ECS cluster
-        cluster = ecs.Cluster(self, "WebDemoCluster", vpc=vpc)
-
-        # Add an AutoScalingGroup with spot instances to the existing cluster
-        cluster.add_capacity("AsgSpot",
-            max_capacity=2,
-            min_capacity=1,
-            desired_capacity=2,
-            instance_type=ec2.InstanceType("c5.4xlarge"),
-            spot_price="0.0735",
-            # Enable the Automated Spot Draining support for Amazon ECS
-            spot_instance_draining=True
+        # Session state that must survive reconnecting to another task (see
+        # web-app/utils/session_store.py). Expired items are deleted by DynamoDB TTL.
+        session_table = dynamodb.Table(
+            self, "SessionTable",
+            partition_key=dynamodb.Attribute(name="session_id", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="name", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires",
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY,
         )
 
-        # Build Dockerfile from local folder and push to ECR
-        image = ecs.ContainerImage.from_asset("web-app")
+        # Build Dockerfile from local folder (for the profile's architecture) and push to ECR
+        image = ecs.ContainerImage.from_asset("web-app", platform=platform)
+        environment = {
+            "CLOUDWATCH_METRICS_NAMESPACE": METRICS_NAMESPACE,
+            "CLOUDWATCH_METRICS_SERVICE": METRICS_SERVICE,
+            "SESSION_STORE": "dynamodb",
+            "SESSION_STORE_TABLE": session_table.table_name,
+        }
 
         # Create Fargate service
         fargate_service = ecs_patterns.ApplicationLoadBalancedFargateService(
             self, "WebApplication",
             cluster=cluster,            # Required
-            cpu=2048,                   # Default is 256 (512 is 0.5 vCPU, 2048 is 2 vCPU)
-            desired_count=1,            # Default is 1
+            cpu=profile.web.cpu,        # 512 is 0.5 vCPU, 2048 is 2 vCPU
+            memory_limit_mib=profile.web.memory_mib,
+            runtime_platform=runtime_platform,
+            capacity_provider_strategies=capacity_provider_strategies,
+            desired_count=profile.min_tasks,
             task_image_options=ecs_patterns.ApplicationLoadBalancedTaskImageOptions(
                 image=image, 
                 container_port=8501,
+                environment=environment,
                 ),
-            memory_limit_mib=4096,      # Default is 512
             public_load_balancer=True)  # Default is True
 
+        # Streamlit keeps a session's state in the task serving its websocket: send reconnecting
+        # browsers back to the same task while it's there
+        fargate_service.target_group.enable_cookie_stickiness(Duration.hours(8))
+        # On scale-in, give open sessions time to finish what they're doing before the task stops
+        fargate_service.target_group.set_attribute("deregistration_delay.timeout_seconds", "120")
+        fargate_service.task_definition.node.default_child.add_property_override(
+            "ContainerDefinitions.0.StopTimeout", 120  # The most Fargate allows
+        )
+
+        self.grant_app_permissions(fargate_service.task_definition, session_table)
+
+        # Setup task auto-scaling
+        scaling = fargate_service.service.auto_scale_task_count(
+            min_capacity=profile.min_tasks,
+            max_capacity=profile.max_tasks,
+        )
+        scaling.scale_on_cpu_utilization(
+            "CpuScaling",
+            target_utilization_percent=50,
+            scale_in_cooldown=Duration.seconds(60),
+            scale_out_cooldown=Duration.seconds(60),
+        )
+
+        # The app is I/O-bound on Bedrock, so CPU stays low while users wait on long SDXL calls:
+        # also scale on its own load metrics, and on ALB requests. Target tracking scales out when
+        # any of these policies asks for it, and only scales in when all of them allow it.
+        def app_metric(metric_name, statistic):
+            return cloudwatch.Metric(
+                namespace=METRICS_NAMESPACE,
+                metric_name=metric_name,
+                dimensions_map={"Service": METRICS_SERVICE},
+                statistic=statistic,
+                period=Duration.minutes(1),
+            )
 
-        fargate_service.task_definition.add_to_task_role_policy(iam.PolicyStatement(
+        scaling.scale_to_track_custom_metric(
+            "InFlightRequestsScaling",
+            metric=app_metric("InFlightRequests", "Average"),
+            target_value=8,
+            scale_in_cooldown=Duration.seconds(300),
+            scale_out_cooldown=Duration.seconds(60),
+        )
+        scaling.scale_to_track_custom_metric(
+            "ActiveSessionsScaling",
+            metric=app_metric("ActiveSessions", "Average"),
+            target_value=20,
+            scale_in_cooldown=Duration.seconds(300),
+            scale_out_cooldown=Duration.seconds(60),
+        )
+        scaling.scale_on_request_count(
+            "RequestCountScaling",
+            requests_per_target=1000,
+            target_group=fargate_service.target_group,
+            scale_in_cooldown=Duration.seconds(300),
+            scale_out_cooldown=Duration.seconds(60),
+        )
+        # Step scaling on the slowest task's p95 Bedrock latency: add tasks faster the worse it gets.
+        # Scale-out only: step scaling doesn't wait for the target tracking policies above before
+        # removing tasks, and low latency says nothing about how busy the tasks are
+        scaling.scale_on_metric(
+            "LatencyScaling",
+            metric=app_metric("BedrockLatencyP95", "Maximum"),
+            scaling_steps=[
+                appscaling.ScalingInterval(lower=30, change=+1),
+                appscaling.ScalingInterval(lower=60, change=+2),
+            ],
+            adjustment_type=appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+            cooldown=Duration.seconds(120),
+        )
+
+    @staticmethod
+    def grant_app_permissions(task_definition: ecs.TaskDefinition, session_table: dynamodb.ITable):
+        """Permissions the app needs, for any task definition running it"""
+        session_table.grant_read_write_data(task_definition.task_role)
+
+        # Background jobs protect their task from scale-in while they run (see
+        # web-app/utils/task_protection.py)
+        task_definition.add_to_task_role_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["ecs:GetTaskProtection", "ecs:UpdateTaskProtection"],
+                resources=["*"],
+            )
+        )
+
+        task_definition.add_to_task_role_policy(iam.PolicyStatement(
             effect=iam.Effect.ALLOW,
             actions = ["ssm:GetParameter"],
             resources = ["arn:aws:ssm:*"],
             )
         )  
-        
-        fargate_service.task_definition.add_to_task_role_policy(iam.PolicyStatement(
+
+        task_definition.add_to_task_role_policy(iam.PolicyStatement(
             effect=iam.Effect.ALLOW,
             actions = ["execute-api:Invoke","execute-api:ManageConnections"],
             resources = ["*"],
             )
         )
 
-        fargate_service.task_definition.add_to_task_role_policy(iam.PolicyStatement(
+        task_definition.add_to_task_role_policy(iam.PolicyStatement(
                 effect=iam.Effect.ALLOW,
                 actions=["bedrock:*"],
                 resources=["*"]
             )
         )             
 
-        # Setup task auto-scaling
-        scaling = fargate_service.service.auto_scale_task_count(
-            max_capacity=10
+        # Let the app publish its load metrics, in its own namespace only
+        task_definition.add_to_task_role_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["cloudwatch:PutMetricData"],
+                resources=["*"],
+                conditions={"StringEquals": {"cloudwatch:namespace": METRICS_NAMESPACE}},
+            )
         )
-        scaling.scale_on_cpu_utilization(
-            "CpuScaling",
-            target_utilization_percent=50,
-            scale_in_cooldown=Duration.seconds(60),
-            scale_out_cooldown=Duration.seconds(60),
-        )
\ No newline at end of file
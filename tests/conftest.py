@@ -0,0 +1,23 @@
+"""Shared pytest setup: the app's `utils` package is imported from web-app/, as the pages do, and
+the CDK `stack` package from the repository root, as app.py does
+
+Directories the app writes to by default are pointed at a temporary folder for the test run, so
+tests never share state with a local run of the app.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "web-app"))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix="bedrock-tests-")
+for name, folder in [
+    ("BATCH_OUTPUT_DIR", "batches"),
+    ("IMAGE_STORE_DIR", "images"),
+    ("RAG_INDEX_DIR", "rag"),
+]:
+    os.environ.setdefault(name, os.path.join(_scratch, folder))
+os.environ.setdefault("SESSION_STORE_PATH", os.path.join(_scratch, "sessions.sqlite"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
@@ -0,0 +1,79 @@
+import csv
+import io
+import time
+
+import pytest
+
+from utils.batch import Batch, read_rows, results_to_csv
+
+
+def run_batch(tmp_path, rows, fn):
+    batch = Batch("test", rows, fn, str(tmp_path / "test.jsonl"), max_concurrency=2)
+    batch.run()
+    return batch
+
+
+def test_csv_and_jsonl_rows_are_read():
+    assert read_rows(b"prompt,id\nHello,1\n", "prompts.csv") == [{"prompt": "Hello", "id": "1"}]
+    assert read_rows(b'{"prompt": "Hello"}\n\n{"prompt": "Bye"}\n', "prompts.jsonl") == [
+        {"prompt": "Hello"},
+        {"prompt": "Bye"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "data, filename",
+    [
+        (b"prompt,output\nHello,\n", "prompts.csv"),
+        (b"row,prompt\n1,Hello\n", "prompts.csv"),
+        (b'{"prompt": "Hello", "error": ""}\n', "prompts.jsonl"),
+    ],
+)
+def test_columns_named_like_result_fields_are_rejected(data, filename):
+    with pytest.raises(ValueError, match="used for the results"):
+        read_rows(data, filename)
+
+
+def test_csv_fields_longer_than_the_csv_module_default_are_read():
+    document = "a" * 200_000
+
+    assert read_rows(f'prompt\n"{document}"\n'.encode(), "documents.csv") == [{"prompt": document}]
+
+
+def test_malformed_csv_raises_value_error():
+    with pytest.raises(ValueError, match="Invalid CSV"):
+        # A carriage return on its own inside an unquoted field
+        read_rows(b"prompt\nHello\rthere\n", "prompts.csv")
+
+
+def test_results_keep_input_columns_and_row_order(tmp_path):
+    rows = [{"prompt": f"Question {n}"} for n in range(5)]
+
+    def answer(row):
+        if row["prompt"] == "Question 3":
+            raise RuntimeError("boom")
+        time.sleep(0.01 * (5 - int(row["prompt"][-1])))
+        return row["prompt"].upper()
+
+    batch = run_batch(tmp_path, rows, answer)
+
+    assert (batch.status, batch.succeeded, batch.failed) == ("done", 4, 1)
+    records = list(csv.DictReader(io.StringIO(batch.results_csv().decode("utf-8"))))
+    assert [record["row"] for record in records] == ["0", "1", "2", "3", "4"]
+    assert records[0] == {"prompt": "Question 0", "row": "0", "output": "QUESTION 0", "error": ""}
+    assert records[3]["error"] == "RuntimeError: boom"
+
+
+def test_resumed_batch_only_processes_unfinished_rows(tmp_path):
+    rows = [{"prompt": f"Question {n}"} for n in range(3)]
+    run_batch(tmp_path, rows, lambda row: 1 / 0 if row["prompt"] == "Question 1" else "ok")
+
+    calls = []
+    batch = run_batch(tmp_path, rows, lambda row: calls.append(row["prompt"]) or "ok")
+
+    assert calls == ["Question 1"]
+    assert batch.resumed == 2
+    # The failure stays in the JSONL file, but the CSV only shows the row's latest success
+    assert len(batch.results().decode("utf-8").splitlines()) == 4
+    records = list(csv.DictReader(io.StringIO(results_to_csv(batch.results()).decode("utf-8"))))
+    assert [(record["output"], record["error"]) for record in records] == [("ok", "")] * 3
@@ -0,0 +1,80 @@
+import datetime
+
+import boto3
+from botocore.stub import Stubber
+import pytest
+
+from utils import bedrock
+from utils.models import get_default_client
+
+ROLE = "arn:aws:iam::123456789012:role/bedrock-demo"
+
+
+def assume_role_response(n, expires_in):
+    expiration = datetime.datetime.now(datetime.timezone.utc) + expires_in
+    return {
+        "Credentials": {
+            "AccessKeyId": f"ASIAFAKEKEY{n:09d}",
+            "SecretAccessKey": f"secret-{n}",
+            "SessionToken": f"token-{n}",
+            "Expiration": expiration,
+        },
+    }
+
+
+@pytest.fixture
+def stubbed_sts(monkeypatch):
+    """An STS client with queued `assume_role` responses, used by every new boto3 session"""
+    sts = boto3.client("sts", region_name="us-east-1", aws_access_key_id="fake", aws_secret_access_key="fake")
+    stubber = Stubber(sts)
+    real_client = boto3.Session.client
+
+    def client(session, service_name, *args, **kwargs):
+        if service_name == "sts":
+            return sts
+        return real_client(session, service_name, *args, **kwargs)
+
+    monkeypatch.setattr(boto3.Session, "client", client)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "fake")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "fake")
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    bedrock.clear_client_cache()
+    with stubber:
+        yield stubber
+    bedrock.clear_client_cache()
+
+
+def test_expiring_assumed_role_credentials_refresh_on_the_same_client(stubbed_sts):
+    # The first credentials are inside botocore's refresh window, so the next use refreshes them
+    stubbed_sts.add_response("assume_role", assume_role_response(1, datetime.timedelta(minutes=1)))
+    stubbed_sts.add_response("assume_role", assume_role_response(2, datetime.timedelta(hours=1)))
+
+    client = bedrock.get_bedrock_client(assumed_role=ROLE, region="us-east-1")
+    credentials = client._request_signer._credentials
+    assert credentials.access_key == "ASIAFAKEKEY000000002"
+    stubbed_sts.assert_no_pending_responses()
+
+    # No further STS call while the refreshed credentials are fresh, and still the same client
+    assert bedrock.get_bedrock_client(assumed_role=ROLE, region="us-east-1") is client
+    assert client._request_signer._credentials.get_frozen_credentials().token == "token-2"
+
+
+def test_clients_are_cached_by_configuration(stubbed_sts):
+    first = bedrock.get_bedrock_client(region="us-east-1")
+
+    assert bedrock.get_bedrock_client(region="us-east-1") is first
+    assert bedrock.get_bedrock_client(region="us-west-2") is not first
+    assert bedrock.get_bedrock_client(region="us-east-1", max_pool_connections=10) is not first
+
+
+def test_default_client_is_reused(stubbed_sts, monkeypatch):
+    monkeypatch.delenv("BEDROCK_FAKE", raising=False)
+    monkeypatch.delenv("BEDROCK_ASSUME_ROLE", raising=False)
+
+    assert get_default_client() is get_default_client()
+
+
+def test_fake_default_client_is_reused(monkeypatch):
+    monkeypatch.setenv("BEDROCK_FAKE", "1")
+
+    assert get_default_client() is get_default_client()
@@ -0,0 +1,98 @@
+import pytest
+
+from utils.chat import Conversation
+from utils.embeddings import HashingEmbedder
+from utils.fake_bedrock import FakeBedrockClient
+from utils.models import invoke_stream
+from utils.response_cache import ResponseCache
+
+CLAUDE = "anthropic.claude-v2"
+HISTORY = " ".join(["We talked about the history of the Roman Empire in a lot of detail."] * 30)
+
+
+@pytest.fixture
+def semantic_cache():
+    from utils.semantic_cache import SemanticCache
+
+    return SemanticCache(HashingEmbedder())
+
+
+def chat_turn(conversation, message, client, semantic_cache, **kwargs):
+    """One turn of the text generation page's chat mode"""
+    prompt = conversation.build_prompt(message)
+    reply = "".join(
+        invoke_stream(
+            CLAUDE,
+            client=client,
+            cache=ResponseCache(),
+            semantic_cache=semantic_cache,
+            semantic_prompt=message,
+            semantic_context=conversation.context_digest(),
+            prompt=prompt,
+            temperature=0.5,
+            **kwargs,
+        )
+    )
+    conversation.add_exchange(message, reply)
+    return reply
+
+
+def conversation_with_history():
+    conversation = Conversation()
+    conversation.add_exchange("Tell me about the Roman Empire", HISTORY)
+    return conversation
+
+
+def test_different_follow_ups_in_one_conversation_dont_hit_each_other(semantic_cache):
+    client = FakeBedrockClient(latency=0, chunk_delay=0)
+    first, second = conversation_with_history(), conversation_with_history()
+
+    chat_turn(first, "When did it fall?", client, semantic_cache)
+    chat_turn(second, "Who was its first emperor?", client, semantic_cache)
+
+    # The whole prompts are near-duplicates (mostly the same long history), but the messages aren't
+    assert semantic_cache.hits == 0
+    assert client.calls == 2
+
+
+def test_next_turns_dont_hit_earlier_ones(semantic_cache):
+    client = FakeBedrockClient(latency=0, chunk_delay=0)
+    conversation = conversation_with_history()
+
+    chat_turn(conversation, "When did it fall?", client, semantic_cache)
+    chat_turn(conversation, "When did it fall?", client, semantic_cache)
+
+    # The same message, but after a different history
+    assert semantic_cache.hits == 0
+    assert client.calls == 2
+
+
+def test_same_message_after_the_same_history_hits(semantic_cache):
+    client = FakeBedrockClient(latency=0, chunk_delay=0)
+
+    reply = chat_turn(conversation_with_history(), "When did it fall?", client, semantic_cache)
+    again = chat_turn(conversation_with_history(), "When did it fall?", client, semantic_cache)
+
+    assert again == reply
+    assert semantic_cache.hits == 1
+    assert client.calls == 1
+
+
+def test_context_digest_covers_summary_and_recent_turns():
+    conversation = conversation_with_history()
+    digest = conversation.context_digest()
+
+    assert Conversation().context_digest() != digest
+    assert conversation_with_history().context_digest() == digest
+    conversation.summary = "A summary"
+    assert conversation.context_digest() != digest
+
+
+def test_conversation_round_trips_through_dict():
+    conversation = conversation_with_history()
+    conversation.add_exchange("When did it fall?", "In 476.")
+
+    restored = Conversation.from_dict(conversation.to_dict())
+
+    assert restored.turns == conversation.turns
+    assert restored.context_digest() == conversation.context_digest()
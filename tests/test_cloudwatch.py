@@ -0,0 +1,109 @@
+import threading
+import time
+
+import boto3
+import pytest
+from botocore.stub import ANY, Stubber
+
+from utils.cloudwatch import CloudWatchPublisher
+from utils.fake_bedrock import FakeBedrockClient
+from utils.metrics import get_metrics
+from utils.models import invoke
+
+NAMESPACE = "GenAiBedrockWeb"
+
+
+@pytest.fixture
+def cloudwatch():
+    return boto3.client("cloudwatch", region_name="us-east-1", aws_access_key_id="fake", aws_secret_access_key="fake")
+
+
+def by_name(metric_data):
+    return {datum["MetricName"]: datum for datum in metric_data}
+
+
+def test_publishes_load_while_requests_run(cloudwatch):
+    publisher = CloudWatchPublisher(cloudwatch, NAMESPACE, service="Web", session_count=lambda: 3)
+    publisher.collect()  # Forget latencies recorded by earlier tests
+    bedrock = FakeBedrockClient(latency=0.5)
+    threads = [
+        threading.Thread(target=invoke, args=("anthropic.claude-v2",), kwargs={
+            "client": bedrock, "cache": None, "prompt": f"Request {n}", "temperature": 1.0,
+        })
+        for n in range(12)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+
+    # The stubber checks every call against the CloudWatch API model
+    with Stubber(cloudwatch) as stubber:
+        stubber.add_response("put_metric_data", {}, {"Namespace": NAMESPACE, "MetricData": ANY})
+        stubber.add_response("put_metric_data", {}, {"Namespace": NAMESPACE, "MetricData": ANY})
+        during = by_name(publisher.publish())
+        for thread in threads:
+            thread.join()
+        after = by_name(publisher.publish())
+        stubber.assert_no_pending_responses()
+
+    assert during["InFlightRequests"]["Value"] + during["QueuedRequests"]["Value"] == 12
+    assert during["ActiveSessions"]["Value"] == 3
+    assert "BedrockLatencyP95" not in during
+    assert after["InFlightRequests"]["Value"] == after["QueuedRequests"]["Value"] == 0
+    assert after["BedrockLatencyP95"]["Value"] >= 0.5
+    assert after["BedrockLatencyP95"]["Unit"] == "Seconds"
+    assert all(datum["Dimensions"] == [{"Name": "Service", "Value": "Web"}] for datum in [*during.values(), *after.values()])
+
+
+def test_metric_data_is_sent_in_batches_of_the_api_limit(cloudwatch, monkeypatch):
+    monkeypatch.setattr("utils.cloudwatch.MAX_METRIC_DATA", 3)
+    publisher = CloudWatchPublisher(cloudwatch, NAMESPACE, session_count=lambda: 1)
+    get_metrics().observe("bedrock_latency_seconds", "anthropic.claude-v2", 1.0)
+
+    with Stubber(cloudwatch) as stubber:
+        stubber.add_response("put_metric_data", {}, {"Namespace": NAMESPACE, "MetricData": [ANY, ANY, ANY]})
+        stubber.add_response("put_metric_data", {}, {"Namespace": NAMESPACE, "MetricData": [ANY]})
+        sent = publisher.publish()
+        stubber.assert_no_pending_responses()
+
+    assert [datum["MetricName"] for datum in sent] == [
+        "InFlightRequests", "QueuedRequests", "ActiveSessions", "BedrockLatencyP95",
+    ]
+
+
+def test_publish_failures_are_not_raised(cloudwatch):
+    publisher = CloudWatchPublisher(cloudwatch, NAMESPACE, session_count=lambda: None)
+
+    with Stubber(cloudwatch) as stubber:
+        stubber.add_client_error("put_metric_data", "InternalServiceFault", http_status_code=500)
+        assert publisher.publish() == []
+        stubber.assert_no_pending_responses()
+
+
+def test_background_publishing_survives_failures():
+    calls, collects = [], []
+
+    class FailingClient:
+        def put_metric_data(self, **kwargs):
+            calls.append(kwargs)
+            raise ConnectionError("CloudWatch unreachable")
+
+    def session_count():
+        collects.append(None)
+        if len(collects) == 1:
+            raise RuntimeError("Streamlit runtime not started yet")
+        return 1
+
+    publisher = CloudWatchPublisher(FailingClient(), NAMESPACE, interval=0.01, session_count=session_count)
+    thread = publisher.start()
+    try:
+        deadline = time.time() + 5
+        while len(calls) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        publisher.stop()
+        thread.join(timeout=1)
+
+    # Neither the failed collect nor the failed requests stopped the thread
+    assert len(calls) >= 3
+    assert not thread.is_alive()
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.embedding_service import EmbeddingService
+from utils.embeddings import HashingEmbedder
+
+
+class RecordingEmbedder(HashingEmbedder):
+    """Hashing embedder recording each batch it gets, and the most batches it had in flight at once"""
+
+    def __init__(self, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.batches = []
+        self.peak = self._running = 0
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+            self._running += 1
+            self.peak = max(self.peak, self._running)
+        time.sleep(self.delay)
+        with self._lock:
+            self._running -= 1
+        return super().embed(texts)
+
+    @property
+    def texts(self):
+        return [text for batch in self.batches for text in batch]
+
+
+def embed_concurrently(service, texts):
+    results = [None] * len(texts)
+
+    def embed(n):
+        results[n] = service.embed([texts[n]])[0]
+
+    threads = [threading.Thread(target=embed, args=(n,)) for n in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_requests_are_coalesced_into_batches():
+    embedder = RecordingEmbedder()
+    service = EmbeddingService(embedder, batch_window=0.1, batch_size=32)
+    texts = [f"question {n}" for n in range(20)]
+
+    results = embed_concurrently(service, texts)
+
+    assert len(embedder.batches) < len(texts)
+    assert sorted(embedder.texts) == sorted(texts)
+    np.testing.assert_allclose(np.stack(results), HashingEmbedder().embed(texts), rtol=1e-6)
+
+
+def test_batches_are_split_at_batch_size():
+    embedder = RecordingEmbedder()
+    service = EmbeddingService(embedder, batch_window=0.05, batch_size=4)
+
+    service.embed([f"chunk {n}" for n in range(10)])
+
+    assert [len(batch) for batch in embedder.batches] == [4, 4, 2]
+
+
+def test_duplicate_texts_are_embedded_once():
+    embedder = RecordingEmbedder(delay=0.1)
+    service = EmbeddingService(embedder, batch_window=0.01)
+
+    vectors = service.embed(["same", "other", "same"])
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    # Requests for a text already being embedded wait for that embedding
+    embed_concurrently(service, ["popular"] * 8)
+
+    assert sorted(embedder.texts) == ["other", "popular", "same"]
+
+
+def test_recent_texts_are_served_from_the_lru_cache():
+    embedder = RecordingEmbedder()
+    vector_bytes = HashingEmbedder().embed(["x"]).astype(np.float32).nbytes
+    service = EmbeddingService(embedder, batch_window=0, cache_bytes=2 * vector_bytes)
+
+    first = service.embed(["a"])
+    service.embed(["b"])
+    assert np.array_equal(service.embed(["a"]), first)
+    assert embedder.texts == ["a", "b"]
+
+    # "b" is now the least recently used of the two cached vectors
+    service.embed(["c"])
+    service.embed(["a"])
+    service.embed(["b"])
+    assert embedder.texts == ["a", "b", "c", "b"]
+    assert service.stats()["cache bytes"] <= 2 * vector_bytes
+
+
+def test_batches_in_flight_are_bounded_by_max_concurrency():
+    embedder = RecordingEmbedder(delay=0.05)
+    service = EmbeddingService(embedder, batch_window=0, batch_size=1, max_concurrency=2)
+
+    embed_concurrently(service, [f"text {n}" for n in range(12)])
+
+    assert embedder.peak == 2
+
+
+def test_embedder_errors_reach_every_waiting_caller():
+    class FailingEmbedder:
+        def embed(self, texts):
+            raise RuntimeError("model unavailable")
+
+    service = EmbeddingService(FailingEmbedder(), batch_window=0.01)
+
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        service.embed(["a", "b"])
+    # Failed texts aren't left pending: the next request tries again
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        service.embed(["a"])
@@ -0,0 +1,74 @@
+from functools import partial
+import time
+
+from utils.fake_bedrock import FakeBedrockClient
+from utils.fan_out import fan_out, merge_streams
+from utils.models import invoke, invoke_stream
+from utils.response_cache import ResponseCache
+
+LATENCY = 0.3
+
+
+def test_fan_out_takes_as_long_as_the_longest_call():
+    client = FakeBedrockClient(latency=LATENCY)
+    prompts = [f"Question {n}" for n in range(4)]
+
+    start = time.monotonic()
+    results = list(
+        fan_out(
+            lambda prompt: invoke("anthropic.claude-v2", client=client, cache=ResponseCache(), prompt=prompt),
+            prompts,
+            max_concurrency=4,
+        )
+    )
+    elapsed = time.monotonic() - start
+
+    assert sorted(result.index for result in results) == [0, 1, 2, 3]
+    assert all(result.error is None for result in results)
+    assert client.calls == 4
+    # Concurrent: about one call's latency, far from the sum of all four
+    assert LATENCY <= elapsed < 2 * LATENCY
+
+
+def test_fan_out_is_bounded_by_max_concurrency():
+    client = FakeBedrockClient(latency=LATENCY)
+
+    start = time.monotonic()
+    list(fan_out(lambda n: client.invoke_model(modelId="anthropic.claude-v2", body="{}"), range(4), max_concurrency=2))
+    elapsed = time.monotonic() - start
+
+    assert 2 * LATENCY <= elapsed < 3 * LATENCY
+
+
+def test_fan_out_reports_failures_and_timeouts_per_call():
+    def call(n):
+        if n == 1:
+            raise RuntimeError("boom")
+        if n == 2:
+            time.sleep(1.5)
+        return n
+
+    results = {result.index: result for result in fan_out(call, range(3), timeout=0.2)}
+
+    assert results[0].result == 0
+    assert isinstance(results[1].error, RuntimeError)
+    assert isinstance(results[2].error, TimeoutError)
+
+
+def test_merge_streams_takes_as_long_as_the_longest_stream():
+    client = FakeBedrockClient(latency=0, chunk_delay=0.05)
+    factories = [
+        partial(invoke_stream, "anthropic.claude-v2", client=client, cache=ResponseCache(), prompt=f"Question {n}")
+        for n in range(4)
+    ]
+    one = time.monotonic()
+    chunks = len(list(factories[0]()))
+    single = time.monotonic() - one
+
+    start = time.monotonic()
+    events = list(merge_streams(factories))
+    elapsed = time.monotonic() - start
+
+    assert sum(event.chunk is None for event in events) == 4
+    assert len(events) == 4 * (chunks + 1)
+    assert elapsed < 2 * single
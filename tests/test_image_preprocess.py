@@ -0,0 +1,122 @@
+import io
+
+from PIL import Image
+import pytest
+
+from utils import image_preprocess
+from utils.image_codec import decode_image, prepare_init_image
+from utils.image_preprocess import preprocess_image, square_crop_box
+
+
+def encode(image, format="PNG", **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+def halves(width, height, horizontal=True):
+    """A width x height image, red in its left (or top) half and blue in the other"""
+    image = Image.new("RGB", (width, height), "blue")
+    image.paste("red", (0, 0, width // 2, height) if horizontal else (0, 0, width, height // 2))
+    return image
+
+
+@pytest.mark.parametrize(
+    "width, height, box",
+    [
+        (100, 100, (0, 0, 100, 100)),
+        (300, 100, (100, 0, 200, 100)),
+        (100, 301, (0, 100, 100, 200)),
+        (1, 1000, (0, 499, 1, 500)),
+        (1000, 1, (499, 0, 500, 1)),
+    ],
+)
+def test_square_crop_box_is_centered_and_square(width, height, box):
+    left, top, right, bottom = square_crop_box(width, height)
+
+    assert (left, top, right, bottom) == box
+    assert right - left == bottom - top == min(width, height)
+
+
+@pytest.mark.parametrize(
+    "width, height",
+    [
+        (20000, 300),  # extreme panoramas
+        (300, 20000),
+        (1, 1),  # 1-pixel sides
+        (1, 777),
+        (777, 1),
+        (1000, 667),  # sides that aren't multiples of 64
+        (513, 511),
+        (100, 60),  # smaller than the output: upscaled
+    ],
+)
+@pytest.mark.parametrize("format", ["PNG", "JPEG"])
+def test_any_aspect_ratio_gives_an_exact_square(width, height, format):
+    image = preprocess_image(encode(halves(width, height), format=format), size=512)
+
+    assert image.size == (512, 512)
+    assert image.mode == "RGB"
+
+
+def test_panorama_keeps_its_center():
+    # Red on the left, blue on the right: the centered crop straddles the boundary
+    image = preprocess_image(encode(halves(4000, 100)), size=64, resample="nearest")
+
+    assert image.getpixel((0, 32)) == (255, 0, 0)
+    assert image.getpixel((63, 32)) == (0, 0, 255)
+
+
+@pytest.mark.parametrize("size", [64, 100, 512, 1024])
+def test_output_size_needs_not_be_a_multiple_of_64(size):
+    assert preprocess_image(encode(halves(999, 333)), size=size).size == (size, size)
+
+
+def test_exif_rotation_is_applied():
+    # Stored landscape with red on the left; orientation 6 means "rotate 90 degrees clockwise to
+    # display", which puts the red half at the top
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    data = encode(halves(200, 100), format="JPEG", exif=exif, quality=95)
+
+    image = preprocess_image(data, size=64, resample="nearest")
+
+    red, _, blue = image.getpixel((32, 2))
+    assert red > 200 and blue < 50
+    red, _, blue = image.getpixel((32, 61))
+    assert blue > 200 and red < 50
+
+
+def test_grayscale_and_transparent_images_are_converted_to_rgb():
+    assert preprocess_image(encode(Image.new("L", (80, 60))), size=64).mode == "RGB"
+    assert preprocess_image(encode(Image.new("RGBA", (80, 60))), size=64).mode == "RGB"
+    assert preprocess_image(encode(Image.new("P", (80, 60))), size=64).mode == "RGB"
+
+
+def test_too_many_pixels_raises_value_error(monkeypatch):
+    monkeypatch.setattr(image_preprocess, "MAX_UPLOAD_PIXELS", 10_000)
+
+    with pytest.raises(ValueError, match="too large"):
+        preprocess_image(encode(halves(101, 100)))
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image", encode(halves(64, 64))[:40]])
+def test_unreadable_uploads_raise_value_error(data):
+    with pytest.raises(ValueError):
+        preprocess_image(data)
+
+
+def test_unknown_resampling_filter_raises_value_error():
+    with pytest.raises(ValueError, match="resampling filter"):
+        preprocess_image(encode(halves(64, 64)), resample="sinc")
+
+
+def test_prepare_init_image_returns_the_png_and_its_base64():
+    prepare_init_image.cache_clear()
+    data = encode(halves(1000, 667), format="JPEG")
+
+    png_bytes, init_image = prepare_init_image(data)
+
+    assert decode_image(init_image) == png_bytes
+    assert Image.open(io.BytesIO(png_bytes)).size == (512, 512)
+    assert prepare_init_image(data)[0] is png_bytes
@@ -0,0 +1,91 @@
+import io
+import os
+import time
+
+from PIL import Image
+import pytest
+
+from utils.image_store import Gallery, ImageStore
+
+
+def png(seed, size=256):
+    image = Image.effect_noise((size, size), 64 + seed).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def age(store, key, seconds):
+    """Make an image look last used `seconds` ago"""
+    then = time.time() - seconds
+    os.utime(store._path(key), (then, then))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path), thumbnail_cache_bytes=1024 * 1024)
+
+
+def test_images_are_stored_once_by_content(store):
+    data = png(1)
+    key = store.put(data)
+
+    assert store.put(data) == key
+    assert store.full(key) == data
+    assert Image.open(io.BytesIO(store.thumbnail(key, 64))).width == 64
+
+
+def test_prune_deletes_least_recently_used_first(store, tmp_path):
+    keys = [store.put(png(n)) for n in range(4)]
+    for n, key in enumerate(keys):
+        age(store, key, 100 - n)
+    # Showing the oldest image counts as using it
+    store.thumbnail(keys[0], 64)
+
+    store.max_bytes = sum(file.stat().st_size for file in tmp_path.rglob("*") if file.is_file()) - 1
+    store.prune()
+
+    assert [key in store for key in keys] == [True, False, True, True]
+
+
+def test_pruned_images_raise_key_error(store):
+    key = store.put(png(1))
+    store.thumbnail(key, 64)  # Now in the in-memory cache too
+
+    store.max_bytes = 0
+    store.prune()
+
+    assert key not in store
+    with pytest.raises(KeyError):
+        store.full(key)
+    with pytest.raises(KeyError):
+        store.thumbnail(key, 64)
+
+
+def test_prune_leaves_files_being_written(store):
+    key = store.put(png(1))
+    tmp_path = f"{store._path(key, '.w64.thumb')}.1234.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"partial thumbnail")
+    other_tmp = os.path.join(os.path.dirname(tmp_path), "f" * 64 + ".png.1234.tmp")
+    with open(other_tmp, "wb") as f:
+        f.write(b"partial image")
+
+    store.max_bytes = 0
+    store.prune()
+
+    assert key not in store
+    assert os.path.exists(tmp_path)
+    assert os.path.exists(other_tmp)
+
+
+def test_gallery_keeps_newest_unique_keys():
+    gallery = Gallery(max_items=2)
+
+    assert gallery.add("a", "first")
+    assert not gallery.add("a", "again")
+    gallery.add("b")
+    gallery.add("c")
+
+    assert [item.key for item in gallery.items] == ["c", "b"]
+    assert Gallery.from_list(gallery.to_list()).items == gallery.items
@@ -0,0 +1,35 @@
+import time
+
+from utils.jobs import LocalJobBackend
+
+
+def wait_for(job_backend, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job_backend.get(job_id).done:
+        assert time.monotonic() < deadline, "job didn't finish"
+        time.sleep(0.01)
+    return job_backend.get(job_id)
+
+
+def test_job_results_are_kept_per_item():
+    backend = LocalJobBackend()
+
+    job = wait_for(backend, backend.submit(lambda n: n * n, [1, 2, 3], params={"prompt": "x"}))
+
+    assert job.status == "done"
+    assert [outcome.result for outcome in job.results] == [1, 4, 9]
+    assert sorted(job.completion_order) == [0, 1, 2]
+    assert job.params == {"prompt": "x"}
+
+
+def test_jobs_are_only_found_by_their_own_kind():
+    backend = LocalJobBackend()
+    image_job = backend.submit(str, ["anime"], params={"prompt": "x"}, kind="image_to_image")
+    text_job = backend.submit(str, ["anime"], params={"prompt": "x", "steps": 50}, kind="text_to_image")
+
+    # e.g. a text-to-image page opened with an image-to-image job's ID in its URL
+    assert backend.get(image_job, kind="text_to_image") is None
+    assert backend.get(image_job, kind="image_to_image").id == image_job
+    assert backend.get(text_job, kind="text_to_image").params["steps"] == 50
+    assert backend.get(image_job).id == image_job
+    assert backend.get("unknown", kind="text_to_image") is None
@@ -0,0 +1,15 @@
+from utils.metrics import MetricsStore
+
+
+def test_prometheus_label_values_are_escaped():
+    store = MetricsStore()
+    store.increment("bedrock_errors_total", 'model "a"\\b\nc')
+    store.observe("page_render_seconds", "Chat\nPage", 0.5)
+
+    text = store.render_prometheus()
+
+    assert 'bedrock_errors_total{model="model \\"a\\"\\\\b\\nc"} 1' in text
+    assert 'page_render_seconds_count{page="Chat\\nPage"} 1' in text
+    # Every sample stays on one line
+    assert all(line.startswith(("# TYPE ", "bedrock_", "page_")) for line in text.splitlines())
+
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from utils.embedding_service import EmbeddingService
+from utils.embeddings import HashingEmbedder
+from utils.rag import DocumentIndex
+
+PAGES = [
+    "The Roman Empire was ruled from Rome for centuries.",
+    "Photosynthesis turns sunlight, water and carbon dioxide into sugar.",
+    "Faiss searches dense vectors by inner product.",
+] * 8
+
+
+class PeakEmbedder(HashingEmbedder):
+    """Hashing embedder recording the most `embed` calls it has had in flight at once"""
+
+    def __init__(self, max_concurrency, **kwargs):
+        super().__init__(**kwargs)
+        self.max_concurrency = max_concurrency
+        self.peak = self._running = 0
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            self._running += 1
+            self.peak = max(self.peak, self._running)
+        time.sleep(0.02)
+        with self._lock:
+            self._running -= 1
+        return super().embed(texts)
+
+
+def test_indexing_defaults_to_the_embedders_concurrency(tmp_path):
+    embedder = PeakEmbedder(max_concurrency=2)
+    stats = DocumentIndex(str(tmp_path), embedder).add_document("doc.pdf", iter(PAGES), batch_size=1)
+
+    assert stats.chunks == len(PAGES)
+    assert embedder.peak == 2
+
+
+def test_index_through_embedding_service(tmp_path):
+    index = DocumentIndex(str(tmp_path), EmbeddingService(HashingEmbedder(), max_concurrency=2))
+    index.add_document("doc.pdf", iter(PAGES))
+
+    hits, _ = index.search("Faiss searches dense vectors by inner product.", k=1)
+    assert "Faiss" in hits[0].chunk.text
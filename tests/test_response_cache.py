@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from utils.fake_bedrock import FakeBedrockClient
+from utils.models import get_provider, invoke, invoke_stream, prepare_request
+from utils.response_cache import ResponseCache, cache_key, is_cacheable
+
+TITAN = "amazon.titan-text-express-v1"
+LLAMA = "meta.llama2-13b-chat-v1"
+TEXT_MODELS = ["anthropic.claude-v2", TITAN, LLAMA, "cohere.command-text-v14"]
+
+
+@pytest.fixture
+def client():
+    return FakeBedrockClient(latency=0, chunk_delay=0)
+
+
+def test_cache_key_ignores_key_order_but_not_stream():
+    assert cache_key(TITAN, {"a": 1, "b": 2}) == cache_key(TITAN, {"b": 2, "a": 1})
+    assert cache_key(TITAN, {"a": 1}) != cache_key(TITAN, {"a": 1}, stream=True)
+    assert cache_key(TITAN, {"a": 1}) != cache_key(LLAMA, {"a": 1})
+
+
+@pytest.mark.parametrize("model_id", TEXT_MODELS)
+@pytest.mark.parametrize("temperature, cacheable", [(0, True), (0.7, False)])
+def test_providers_report_their_sampling_temperature(model_id, temperature, cacheable):
+    provider = get_provider(model_id)
+    body = provider.build_body(prompt="Hi", temperature=temperature)
+
+    assert provider.temperature(body) == temperature
+    assert provider.is_cacheable(body) is cacheable
+    assert prepare_request(model_id, temperature=temperature).render(prompt="Hi").cacheable is cacheable
+
+
+def test_titan_nested_temperature():
+    body = get_provider(TITAN).build_body(prompt="Hi", temperature=0.7)
+
+    assert "temperature" not in body
+    assert is_cacheable(body, temperature=0.7) is False
+
+
+@pytest.mark.parametrize("model_id", TEXT_MODELS)
+def test_sampled_titan_and_other_text_responses_are_not_cached(model_id, client):
+    cache = ResponseCache()
+    for _ in range(2):
+        result = invoke(model_id, client=client, cache=cache, prompt="Hi", temperature=0.7)
+        assert not result.cached
+
+    assert client.calls == 2
+
+
+@pytest.mark.parametrize("model_id", TEXT_MODELS)
+def test_deterministic_responses_are_cached(model_id, client):
+    cache = ResponseCache()
+    first = invoke(model_id, client=client, cache=cache, prompt="Hi", temperature=0)
+    second = invoke(model_id, client=client, cache=cache, prompt="Hi", temperature=0)
+
+    assert second.cached and second.output == first.output
+    assert client.calls == 1
+
+
+@pytest.mark.parametrize("model_id", TEXT_MODELS)
+def test_stream_then_invoke_share_no_cache_entry(model_id, client):
+    cache = ResponseCache()
+    streamed = "".join(invoke_stream(model_id, client=client, cache=cache, prompt="Hi", temperature=0))
+    result = invoke(model_id, client=client, cache=cache, prompt="Hi", temperature=0)
+
+    assert result.output.strip() == streamed.strip()
+    assert not result.cached
+    # Each is served from its own entry afterwards
+    assert invoke(model_id, client=client, cache=cache, prompt="Hi", temperature=0).cached
+    assert "".join(invoke_stream(model_id, client=client, cache=cache, prompt="Hi", temperature=0)) == streamed
+    assert client.calls == 2
+
+
+@pytest.mark.parametrize("model_id", TEXT_MODELS)
+def test_invoke_then_stream_share_no_cache_entry(model_id, client):
+    cache = ResponseCache()
+    result = invoke(model_id, client=client, cache=cache, prompt="Hi", temperature=0)
+    streamed = "".join(invoke_stream(model_id, client=client, cache=cache, prompt="Hi", temperature=0))
+
+    assert result.output.strip() == streamed.strip()
+    assert client.calls == 2
+
+
+def test_disk_tier_prunes_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.response_cache.PRUNE_EVERY", 1)
+    cache = ResponseCache(max_bytes=0, directory=str(tmp_path), disk_max_bytes=350)
+    for n in range(3):
+        cache.put(f"{n:02d}", b"x" * 100)
+        # Distinct modification times, oldest first
+        os.utime(cache._path(f"{n:02d}"), (n, n))
+    # A disk hit makes "00" the most recently used
+    assert cache.get("00") is not None
+    cache.put("03", b"x" * 100)
+
+    assert not os.path.exists(cache._path("01"))
+    assert all(os.path.exists(cache._path(key)) for key in ["00", "02", "03"])
@@ -0,0 +1,104 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils.semantic_cache import SemanticCache, semantic_scope
+
+SCOPE = semantic_scope("anthropic.claude-v2", {"max_tokens": 100})
+
+
+class AngleEmbedder:
+    """Embeds a text "<name>@<degrees>" as the unit vector at that angle, so cosine similarities
+    between texts are known exactly"""
+
+    def embed(self, texts):
+        angles = [math.radians(float(text.rsplit("@", 1)[1])) for text in texts]
+        return np.asarray([[math.cos(angle), math.sin(angle)] for angle in angles], dtype=np.float32)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    clock.time = lambda: clock.now
+    monkeypatch.setattr("utils.semantic_cache.time", clock)
+    return clock
+
+
+def test_hits_at_or_above_the_threshold_only():
+    cache = SemanticCache(AngleEmbedder(), threshold=0.95)
+    cache.put(SCOPE, "question@0", "answer")
+
+    hit = cache.lookup(SCOPE, "close@15")  # cos 15 degrees = 0.966
+    assert hit is not None and hit.completion == "answer" and hit.prompt == "question@0"
+    assert hit.similarity == pytest.approx(math.cos(math.radians(15)), abs=1e-6)
+    assert cache.lookup(SCOPE, "far@20") is None  # 0.940
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_other_scopes_do_not_match():
+    cache = SemanticCache(AngleEmbedder())
+    cache.put(SCOPE, "question@0", "answer")
+
+    assert cache.lookup(semantic_scope("anthropic.claude-v2", {"max_tokens": 200}), "question@0") is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SemanticCache(AngleEmbedder(), ttl=60)
+    cache.put(SCOPE, "question@0", "answer")
+
+    clock.now += 59
+    assert cache.lookup(SCOPE, "question@0") is not None
+    clock.now += 2
+    assert cache.lookup(SCOPE, "question@0") is None
+    # Expired entries are dropped on the next put
+    cache.put(SCOPE, "other@90", "other answer")
+    assert len(cache) == 1
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = SemanticCache(AngleEmbedder(), max_entries=2)
+    cache.put(SCOPE, "first@0", "1")
+    cache.put(SCOPE, "second@90", "2")
+    # Looking "first" up makes "second" the least recently used
+    assert cache.lookup(SCOPE, "first@0").completion == "1"
+
+    cache.put(SCOPE, "third@180", "3")
+
+    assert len(cache) == 2
+    assert cache.lookup(SCOPE, "second@90") is None
+    assert cache.lookup(SCOPE, "first@0").completion == "1"
+    assert cache.lookup(SCOPE, "third@180").completion == "3"
+
+
+def test_entries_persist_and_reload(tmp_path, clock):
+    cache = SemanticCache(AngleEmbedder(), ttl=60, directory=str(tmp_path))
+    cache.put(SCOPE, "old@0", "old answer")
+    clock.now += 30
+    cache.put(SCOPE, "new@90", "new answer")
+    cache.save()
+
+    reloaded = SemanticCache(AngleEmbedder(), ttl=60, directory=str(tmp_path))
+    assert len(reloaded) == 2
+    assert reloaded.lookup(SCOPE, "new@90").completion == "new answer"
+    # New entries don't reuse the IDs of reloaded ones
+    reloaded.put(SCOPE, "newer@180", "newer answer")
+    assert reloaded.lookup(SCOPE, "old@0").completion == "old answer"
+
+    # The put saved the reloaded cache; entries that expired since are dropped on load
+    clock.now += 45
+    expired = SemanticCache(AngleEmbedder(), ttl=60, directory=str(tmp_path))
+    assert len(expired) == 2
+    assert expired.lookup(SCOPE, "old@0") is None
+
+
+def test_unreadable_directory_starts_empty(tmp_path):
+    (tmp_path / "entries.json").write_text("not json")
+    (tmp_path / "index.faiss").write_bytes(b"not an index")
+
+    cache = SemanticCache(AngleEmbedder(), directory=str(tmp_path))
+
+    assert len(cache) == 0
+    cache.put(SCOPE, "question@0", "answer")
+    assert cache.lookup(SCOPE, "question@0") is not None
@@ -0,0 +1,84 @@
+import pytest
+
+from utils import session_store
+from utils.chat import Conversation
+from utils.session_store import DynamoDBSessionStore, SessionValueTooLarge, SQLiteSessionStore, session_id
+
+
+class FakeDynamoDB:
+    """Just enough of the boto3 DynamoDB client, enforcing the 400 KB item limit"""
+
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, TableName, Item):
+        size = sum(len(name) + len(next(iter(value.values())).encode("utf-8")) for name, value in Item.items())
+        if size > 400 * 1024:
+            raise ValueError("Item size has exceeded the maximum allowed size")
+        self.items[(Item["session_id"]["S"], Item["name"]["S"])] = Item
+
+    def get_item(self, TableName, Key, ConsistentRead):
+        item = self.items.get((Key["session_id"]["S"], Key["name"]["S"]))
+        return {} if item is None else {"Item": item}
+
+    def delete_item(self, TableName, Key):
+        self.items.pop((Key["session_id"]["S"], Key["name"]["S"]), None)
+
+
+@pytest.fixture(params=["sqlite", "dynamodb"])
+def store(request):
+    if request.param == "sqlite":
+        return SQLiteSessionStore(":memory:")
+    return DynamoDBSessionStore("sessions", client=FakeDynamoDB())
+
+
+def test_values_round_trip(store):
+    value = {"turns": [["Human", "Grüße aus Köln 👋"]], "n": 1}
+
+    store.put("a" * 32, "conversation", value)
+
+    assert store.get("a" * 32, "conversation") == value
+    assert store.get("b" * 32, "conversation", "missing") == "missing"
+    store.delete("a" * 32, "conversation")
+    assert store.get("a" * 32, "conversation") is None
+
+
+def test_limit_is_on_utf8_bytes(store, monkeypatch):
+    monkeypatch.setattr(session_store, "MAX_VALUE_BYTES", 1000)
+    # 300 characters, 1200 bytes of UTF-8 (and 3600 if ASCII-escaped)
+    with pytest.raises(SessionValueTooLarge):
+        store.put("a" * 32, "text", "👋" * 300)
+    # 900 characters, 900 bytes
+    store.put("a" * 32, "text", "a" * 900)
+    # 400 characters, 800 bytes of UTF-8, but 2400 if ASCII-escaped
+    store.put("a" * 32, "text", "é" * 400)
+
+
+def test_largest_conversation_fits_in_a_dynamodb_item():
+    conversation = Conversation()
+    # Non-ASCII text, worst case for ASCII-escaped JSON
+    reply = "Ünïcödé réplý 🙂 " * 200
+    for n in range(200):
+        conversation.add_exchange(f"Mëssägé {n}", reply)
+        conversation.compact()
+
+    assert conversation.dropped
+    assert conversation.size <= conversation.max_bytes
+    store = DynamoDBSessionStore("sessions", client=FakeDynamoDB())
+    store.put("a" * 32, "conversation", conversation.to_dict())
+
+
+def test_conversation_size_counts_utf8_bytes():
+    conversation = Conversation()
+    conversation.add_exchange("é", "👋")
+
+    assert conversation.size == 2 + 4
+
+
+def test_session_id_is_kept_or_created():
+    state, query_params = {}, {}
+    sid = session_id(state, query_params)
+
+    assert len(sid) == 32 and query_params["session"] == sid
+    assert session_id({}, {"session": sid}) == sid
+    assert session_id({}, {"session": "not-an-id"}) != "not-an-id"
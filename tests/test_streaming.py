@@ -0,0 +1,49 @@
+from utils.fake_bedrock import FakeBedrockClient
+from utils.models import invoke_stream
+from utils.response_cache import ResponseCache
+from utils.streaming import StreamStats
+
+
+def test_stream_yields_chunks_and_records_timing():
+    stats = StreamStats()
+    chunks = list(invoke_stream(
+        "anthropic.claude-v2", client=FakeBedrockClient(chunk_delay=0), stats=stats, cache=ResponseCache(),
+        prompt="Hello", temperature=0.5,
+    ))
+
+    assert len(chunks) > 1
+    assert "".join(chunks).startswith("This is a fake completion")
+    assert stats.time_to_first_token is not None
+    assert stats.output_tokens == len(chunks)
+
+
+def test_closing_the_stream_closes_the_response():
+    client = FakeBedrockClient(chunk_delay=0)
+    streams = []
+    original = client.invoke_model_with_response_stream
+
+    def recording(**kwargs):
+        response = original(**kwargs)
+        streams.append(response["body"])
+        return response
+
+    client.invoke_model_with_response_stream = recording
+    chunks = invoke_stream("anthropic.claude-v2", client=client, cache=ResponseCache(), prompt="Hello", temperature=0.5)
+    next(chunks)
+    chunks.close()
+
+    assert streams[0].closed
+
+
+def test_deterministic_stream_is_served_from_cache():
+    client = FakeBedrockClient(chunk_delay=0)
+    cache = ResponseCache()
+    first = "".join(invoke_stream("anthropic.claude-v2", client=client, cache=cache, prompt="Hi", temperature=0.0))
+    stats = StreamStats()
+    second = "".join(invoke_stream(
+        "anthropic.claude-v2", client=client, cache=cache, stats=stats, prompt="Hi", temperature=0.0,
+    ))
+
+    assert second == first
+    assert stats.cached
+    assert client.calls == 1
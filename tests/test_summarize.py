@@ -0,0 +1,73 @@
+import itertools
+
+from utils.summarize import estimate_tokens, map_reduce, split_text
+
+SENTENCE = "The quick brown fox jumps over the lazy dog, again and again."
+
+
+def make_pages(count, paragraphs=4, sentences=5):
+    return [
+        "\n\n".join(
+            " ".join(f"Page {page} paragraph {paragraph}. {SENTENCE}" for _ in range(sentences))
+            for paragraph in range(paragraphs)
+        )
+        for page in range(count)
+    ]
+
+
+def test_chunks_stay_within_chunk_tokens():
+    pages = make_pages(10) + [" ".join([SENTENCE] * 100)]
+
+    chunks = list(split_text(pages, chunk_tokens=120))
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 120 for chunk in chunks)
+
+
+def test_text_is_kept_across_chunk_boundaries():
+    # One paragraph too long for a chunk, even sentence by sentence: split down to words
+    pages = make_pages(3) + [" ".join(f"word{n}" for n in range(500))]
+
+    chunks = list(split_text(pages, chunk_tokens=50))
+
+    assert " ".join(" ".join(chunks).split()) == " ".join(" ".join(pages).split())
+
+
+def test_single_oversized_word_is_its_own_chunk():
+    word = "x" * 1000
+    assert estimate_tokens(word) > 50
+
+    chunks = list(split_text([f"before {word} after"], chunk_tokens=50))
+
+    assert chunks == ["before", word, "after"]
+
+
+def test_pages_are_consumed_lazily():
+    consumed = []
+
+    def pages():
+        for page in itertools.count():
+            consumed.append(page)
+            yield make_pages(1)[0]
+
+    first = next(split_text(pages(), chunk_tokens=200))
+
+    assert estimate_tokens(first) <= 200
+    assert len(consumed) <= 2
+
+
+def test_map_reduce_summarizes_until_it_fits():
+    calls = []
+
+    def summarize(text):
+        calls.append(text)
+        return text.split(".")[0] + "."
+
+    result = map_reduce(make_pages(20), summarize, chunk_tokens=100, max_concurrency=4)
+
+    assert calls
+    assert estimate_tokens(result) <= 100
+
+
+def test_map_reduce_returns_short_documents_as_they_are():
+    assert map_reduce(["Short text."], lambda text: 1 / 0) == "Short text."
@@ -0,0 +1,49 @@
+import base64
+import json
+
+import pytest
+
+from utils.templates import BodyTemplate, PromptTemplate
+
+
+def build(prompt, init_image, cfg_scale=7):
+    return {"text_prompts": [{"text": prompt}], "init_image": init_image, "cfg_scale": cfg_scale}
+
+
+@pytest.fixture
+def template():
+    return BodyTemplate(build, fields=["prompt"], raw_fields=["init_image"], cfg_scale=5)
+
+
+def test_render_matches_json_encoding(template):
+    init_image = base64.b64encode(bytes(range(256)) * 4).decode("ascii")
+    prompt = 'A "quoted"\tprompt\nwith ünïcode \\ and \x01 controls'
+
+    body = template.render(prompt=prompt, init_image=init_image)
+
+    assert body.text == json.dumps(build(prompt, init_image, cfg_scale=5))
+    assert json.loads(body.text)["text_prompts"][0]["text"] == prompt
+
+
+@pytest.mark.parametrize("value", ["abc\tdef", "abc\x01def", "abc\x1fdef", 'abc"def', "abc\\def", "abc\ndef", "abcédef"])
+def test_raw_field_needing_escaping_is_rejected(template, value):
+    with pytest.raises(ValueError, match="init_image"):
+        template.render(prompt="a prompt", init_image=value)
+
+
+def test_prompt_template_normalizes_whitespace():
+    prompt = PromptTemplate("""
+        {instruction}
+
+
+
+        <text>
+        {text}
+        </text>
+    """)
+
+    assert prompt.render(instruction=" Summarize. ", text="Some {braces}") == (
+        "Summarize.\n\n<text>\nSome {braces}\n</text>"
+    )
+    with pytest.raises(KeyError, match="text"):
+        prompt.render(instruction="Summarize.")
@@ -0,0 +1,141 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from utils.throttling import MIN_RATE, AdaptiveConcurrency, ModelGovernor, is_throttling_error
+
+CLAUDE = "anthropic.claude-v2"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+
+
+def succeed(limiter, times):
+    for _ in range(times):
+        limiter.release(limiter.acquire())
+
+
+def test_throttling_errors_are_recognized():
+    assert is_throttling_error(client_error("ThrottlingException"))
+    assert not is_throttling_error(client_error("ValidationException"))
+    assert not is_throttling_error(RuntimeError("ThrottlingException"))
+
+
+def test_additive_increase_after_limit_successes():
+    limiter = AdaptiveConcurrency(initial=2, maximum=10)
+
+    succeed(limiter, 1)
+    assert limiter.limit == 2
+    succeed(limiter, 1)
+    assert limiter.limit == 3
+    succeed(limiter, 3)
+    assert limiter.limit == 4
+
+
+def test_multiplicative_decrease_once_per_generation():
+    limiter = AdaptiveConcurrency(initial=8)
+    tokens = [limiter.acquire() for _ in range(3)]
+
+    for token in tokens:
+        limiter.release(token, throttled=True)
+
+    # The three requests were all in flight at the old limit: halved once, not three times
+    assert limiter.limit == 4
+    assert limiter.throttles == 3
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 2
+
+
+def test_limit_stays_within_bounds():
+    limiter = AdaptiveConcurrency(initial=100, minimum=2, maximum=5)
+    assert limiter.limit == 5
+
+    succeed(limiter, 50)
+    assert limiter.limit == 5
+    for _ in range(5):
+        limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 2
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AdaptiveConcurrency(initial=1)
+    token = limiter.acquire()
+
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0.05)
+    assert limiter.queue_depth == 0
+    limiter.release(token)
+    limiter.release(limiter.acquire(timeout=0.05))
+
+
+def test_slot_lowers_the_limit_on_throttling_exception():
+    governor = ModelGovernor(CLAUDE, initial=8)
+
+    with pytest.raises(ClientError):
+        with governor.slot():
+            raise client_error("ThrottlingException")
+    assert governor.limit == 4
+
+    with pytest.raises(ClientError):
+        with governor.slot():
+            raise client_error("ValidationException")
+    assert governor.limit == 4
+    assert governor.in_flight == 0
+
+
+def test_token_bucket_refills_at_the_rate_up_to_the_burst():
+    clock = FakeClock()
+    governor = ModelGovernor(CLAUDE, rate=2.0, burst=2.0, initial=8, clock=clock)
+
+    succeed(governor, 2)
+    with pytest.raises(TimeoutError):
+        governor.acquire(timeout=0.05)
+
+    clock.now += 0.5
+    succeed(governor, 1)
+    with pytest.raises(TimeoutError):
+        governor.acquire(timeout=0.05)
+
+    # A long quiet period only refills up to `burst` tokens
+    clock.now += 60
+    succeed(governor, 2)
+    with pytest.raises(TimeoutError):
+        governor.acquire(timeout=0.05)
+
+
+def test_first_throttle_sets_the_rate_from_observed_throughput():
+    clock = FakeClock()
+    governor = ModelGovernor(CLAUDE, initial=64, maximum=64, clock=clock)
+    for _ in range(20):
+        succeed(governor, 1)
+        clock.now += 0.5
+
+    governor.release(governor.acquire(), throttled=True)
+
+    # 20 requests over 10 seconds, less 10%
+    assert governor.rate == pytest.approx(0.9 * 20 / 10, rel=0.1)
+    rate = governor.rate
+    clock.now += 10
+    governor.release(governor.acquire(), throttled=True)
+    assert governor.rate == pytest.approx(rate / 2)
+
+
+def test_rate_grows_after_successes_and_has_a_floor():
+    clock = FakeClock()
+    governor = ModelGovernor(CLAUDE, rate=MIN_RATE * 1.5, burst=1.0, initial=1, maximum=1, clock=clock)
+
+    clock.now += 100
+    governor.release(governor.acquire(), throttled=True)
+    assert governor.rate == MIN_RATE
+
+    clock.now += 100
+    succeed(governor, 1)
+    assert governor.rate == pytest.approx(MIN_RATE * 1.1)
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+# jsii warns on every import when the local node is past its end of life
+os.environ.setdefault("JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION", "1")
+cdk = pytest.importorskip("aws_cdk")
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk.assertions import Match, Template
+
+from stack.compute_profiles import COMPUTE_PROFILES, ComputeProfile, TaskSize, get_compute_profile
+from stack.web_stack import WebStack
+
+
+@pytest.fixture(scope="module", params=sorted(COMPUTE_PROFILES))
+def synthesized(request):
+    """(profile, template) of the web stack, synthesized for each compute profile"""
+    app = cdk.App()
+    env = cdk.Environment(account="123456789012", region="us-east-1")
+    network = cdk.Stack(app, "Network", env=env)
+    vpc = ec2.Vpc(network, "Vpc", max_azs=2)
+    profile = get_compute_profile(request.param)
+    stack = WebStack(app, "Web", vpc=vpc, profile=profile, env=env)
+    return profile, Template.from_stack(stack)
+
+
+def test_task_size_and_platform_follow_the_profile(synthesized):
+    profile, template = synthesized
+
+    template.resource_count_is("AWS::ECS::TaskDefinition", 1)
+    template.has_resource_properties("AWS::ECS::TaskDefinition", {
+        "Cpu": str(profile.web.cpu),
+        "Memory": str(profile.web.memory_mib),
+        "RequiresCompatibilities": ["FARGATE"],
+        "RuntimePlatform": {
+            "CpuArchitecture": "ARM64" if profile.arm64 else "X86_64",
+            "OperatingSystemFamily": "LINUX",
+        },
+    })
+
+
+def test_capacity_providers_follow_the_profile(synthesized):
+    profile, template = synthesized
+
+    strategy = []
+    if profile.on_demand_weight or profile.on_demand_base:
+        strategy.append({"CapacityProvider": "FARGATE", "Base": profile.on_demand_base, "Weight": profile.on_demand_weight})
+    if profile.spot_weight:
+        strategy.append({"CapacityProvider": "FARGATE_SPOT", "Weight": profile.spot_weight})
+    template.has_resource_properties("AWS::ECS::Service", {
+        "CapacityProviderStrategy": strategy,
+        "DesiredCount": profile.min_tasks,
+    })
+
+
+def test_dev_runs_on_spot_and_prod_on_graviton():
+    dev, prod = get_compute_profile("dev"), get_compute_profile("prod")
+
+    assert dev.spot_weight and not dev.on_demand_weight and not dev.arm64
+    assert prod.arm64 and not prod.spot_weight
+    assert (dev.web.cpu, dev.web.memory_mib) == (512, 2048)
+    assert (prod.web.cpu, prod.web.memory_mib) == (1024, 2048)
+
+
+def test_spot_and_arm64_cant_be_combined():
+    with pytest.raises(ValueError, match="ARM64"):
+        ComputeProfile(web=TaskSize(cpu=512, memory_mib=2048), arm64=True, spot_weight=1)
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown compute profile"):
+        get_compute_profile("staging")
+
+
+def test_target_tracking_policies(synthesized):
+    profile, template = synthesized
+
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+        "MinCapacity": profile.min_tasks,
+        "MaxCapacity": profile.max_tasks,
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+        "PolicyType": "TargetTrackingScaling",
+        "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+            "PredefinedMetricSpecification": {"PredefinedMetricType": "ECSServiceAverageCPUUtilization"},
+            "TargetValue": 50,
+        }),
+    })
+    for metric_name, target in [("InFlightRequests", 8), ("ActiveSessions", 20)]:
+        template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+            "PolicyType": "TargetTrackingScaling",
+            "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+                "CustomizedMetricSpecification": Match.object_like({
+                    "MetricName": metric_name,
+                    "Namespace": "GenAiBedrockWeb",
+                    "Statistic": "Average",
+                }),
+                "TargetValue": target,
+                "ScaleInCooldown": 300,
+                "ScaleOutCooldown": 60,
+            }),
+        })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+        "PolicyType": "TargetTrackingScaling",
+        "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+            "PredefinedMetricSpecification": Match.object_like({"PredefinedMetricType": "ALBRequestCountPerTarget"}),
+            "TargetValue": 1000,
+        }),
+    })
+
+
+def test_latency_step_scaling_only_scales_out(synthesized):
+    _, template = synthesized
+
+    step_policies = template.find_resources("AWS::ApplicationAutoScaling::ScalingPolicy", {
+        "Properties": {"PolicyType": "StepScaling"},
+    })
+    assert len(step_policies) == 1
+    (config,) = [policy["Properties"]["StepScalingPolicyConfiguration"] for policy in step_policies.values()]
+    assert config["AdjustmentType"] == "ChangeInCapacity"
+    assert [step["ScalingAdjustment"] for step in config["StepAdjustments"]] == [1, 2]
+
+    # A single alarm, on high latency only
+    template.resource_count_is("AWS::CloudWatch::Alarm", 1)
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "MetricName": "BedrockLatencyP95",
+        "ComparisonOperator": "GreaterThanOrEqualToThreshold",
+        "Threshold": 30,
+        "Statistic": "Maximum",
+    })
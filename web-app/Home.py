@@ -1,13 +1,17 @@
 import streamlit as st
 
+from utils.warmup import logo, warm_up
+
 st.set_page_config(
     page_title="Amazon Bedrock Demos",
     layout="wide",
 )
 
+warm_up()
+
 c1, c2 = st.columns([1, 8])
 with c1:
-    st.image("./imgs/bedrock.png", width=100)
+    st.image(logo(), width=100)
 
 with c2:
     st.header("Amazon Bedrock Demos")
@@ -0,0 +1,70 @@
+"""Benchmark of chat prompt size over a long conversation: full history vs. bounded memory
+
+Replies and summaries are simulated, so this measures prompt size (and the time to build it)
+rather than model latency. Run from the web-app folder:
+
+    python -m benchmarks.chat_memory_bench [--turns 100]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.chat import Conversation
+from utils.summarize import estimate_tokens
+
+
+WORDS = "order refund delivery invoice account password shipping warranty address payment product support".split()
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def fake_summarizer():
+    """Stands in for Claude: keeps the first sentence of every folded message, like a terse summary"""
+    def summarize(summary, turns):
+        notes = " ".join(turn.text.split(".")[0] + "." for turn in turns)
+        return f"{summary} {notes}".strip()
+
+    return summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    conversation = Conversation()
+    summarize = fake_summarizer()
+    full_history = ""
+
+    print(f"{'turn':>5} {'full history':>13} {'bounded':>8} {'build ms':>9} {'held KiB':>9}")
+    total_full = total_bounded = 0
+    for turn in range(1, args.turns + 1):
+        message = " ".join(sentence(rng, rng.randint(8, 25)) for _ in range(rng.randint(1, 4)))
+        reply = " ".join(sentence(rng, rng.randint(10, 30)) for _ in range(rng.randint(3, 10)))
+
+        full_prompt = full_history + message
+        start_time = time.perf_counter()
+        prompt = conversation.build_prompt(message, summarize=summarize)
+        build_time = time.perf_counter() - start_time
+
+        full_tokens, bounded_tokens = estimate_tokens(full_prompt), estimate_tokens(prompt)
+        total_full += full_tokens
+        total_bounded += bounded_tokens
+        if turn == 1 or turn % 10 == 0:
+            print(f"{turn:>5} {full_tokens:>13} {bounded_tokens:>8} {build_time * 1000:>9.2f} {conversation.size / 1024:>9.1f}")
+
+        conversation.add_exchange(message, reply)
+        full_history += f"{message}\n\nAssistant: {reply}\n\nHuman: "
+
+    print(f"Prompt tokens over {args.turns} turns: {total_full} with full history, {total_bounded} bounded "
+          f"({total_bounded / total_full:.0%})")
+
+
+if __name__ == "__main__":
+    main()
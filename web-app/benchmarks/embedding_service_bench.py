@@ -0,0 +1,116 @@
+"""Benchmark of embedding throughput with and without the coalescing `EmbeddingService`
+
+Simulated sessions each embed one text at a time, as semantic caching and document search do.
+By default the stub embedder behaves like `embeddings.BedrockEmbedder`: Titan embeds one text per
+request, so a batch is sent as one request per text (up to 8 at a time), each taking `--overhead`
+seconds, with at most `--capacity` requests running at once (like the model's request governor).
+Batching then saves no requests: what the service gains comes from its cache and from embedding
+concurrent requests for the same text once. `--batch-endpoint` models an embedder taking a whole
+batch in one request instead (a fixed overhead plus a small cost per text), where batching also
+cuts the number of requests. A share of texts (`--repeat`) repeats recent ones, as popular
+prompts do. Run from the web-app folder:
+
+    python -m benchmarks.embedding_service_bench
+    python -m benchmarks.embedding_service_bench --sessions 1 4 16 64 --overhead 0.05 --batch-endpoint
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.embedding_service import EmbeddingService
+from utils.embeddings import HashingEmbedder
+
+
+class StubEmbedder(HashingEmbedder):
+    """Hashing embedder with the latency profile of a remote embedding endpoint
+
+    With `batch_endpoint`, one request per `embed` call; otherwise one request per text, sent up
+    to `max_workers` at a time, as `BedrockEmbedder` does. `requests` counts them.
+    """
+
+    def __init__(self, overhead, per_text, capacity, batch_endpoint=False, max_workers=8, **kwargs):
+        super().__init__(**kwargs)
+        self.overhead = overhead
+        self.per_text = per_text
+        self.batch_endpoint = batch_endpoint
+        self.max_workers = max_workers
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._capacity = threading.Semaphore(capacity)
+
+    def _request(self, count):
+        with self._capacity:
+            with self._lock:
+                self.requests += 1
+            time.sleep(self.overhead + self.per_text * count)
+
+    def embed(self, texts):
+        if self.batch_endpoint or len(texts) <= 1:
+            self._request(len(texts))
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(texts), self.max_workers)) as executor:
+                list(executor.map(lambda _: self._request(1), texts))
+        return super().embed(texts)
+
+
+def run(embedder, sessions, texts_per_session, repeat, seed):
+    """Texts embedded per second with `sessions` threads each embedding texts one at a time"""
+    def session(n):
+        rng = random.Random(seed + n)
+        for i in range(texts_per_session):
+            if i and rng.random() < repeat:
+                text = f"popular question {rng.randrange(20)}"
+            else:
+                text = f"session {n} question {i} about {rng.random()}"
+            embedder.embed([text])
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sessions * texts_per_session / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--texts", type=int, default=20, help="texts embedded by each session")
+    parser.add_argument("--overhead", type=float, default=0.05, help="seconds per embedder call")
+    parser.add_argument("--per-text", type=float, default=0.001, help="extra seconds per text in a call")
+    parser.add_argument("--capacity", type=int, default=8, help="embedder calls running at once")
+    parser.add_argument("--repeat", type=float, default=0.2, help="share of texts repeating popular ones")
+    parser.add_argument("--window-ms", type=float, default=10)
+    parser.add_argument(
+        "--batch-endpoint", action="store_true", help="embed a whole batch per request, unlike Titan",
+    )
+    args = parser.parse_args()
+
+    def stub():
+        return StubEmbedder(args.overhead, args.per_text, args.capacity, batch_endpoint=args.batch_endpoint)
+
+    print("Batch embedding endpoint" if args.batch_endpoint else "One request per text, as BedrockEmbedder")
+    print(f"{'sessions':>8s} {'direct/s':>9s} {'reqs':>6s} {'service/s':>10s} {'reqs':>6s} {'batch':>6s} {'speed-up':>9s}")
+    for sessions in args.sessions:
+        direct = stub()
+        direct_rate = run(direct, sessions, args.texts, args.repeat, seed=0)
+
+        behind = stub()
+        service = EmbeddingService(behind, batch_window=args.window_ms / 1000, max_concurrency=args.capacity)
+        service_rate = run(service, sessions, args.texts, args.repeat, seed=0)
+        batch = service.stats()["mean batch size"] or 0
+
+        print(
+            f"{sessions:8d} {direct_rate:9.1f} {direct.requests:6d} {service_rate:10.1f} {behind.requests:6d} "
+            f"{batch:6.1f} {service_rate / direct_rate:8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
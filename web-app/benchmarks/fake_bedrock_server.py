@@ -0,0 +1,241 @@
+"""Local HTTP stand-in for the `bedrock-runtime` API, for load tests and offline benchmarks
+
+Serves `InvokeModel` and `InvokeModelWithResponseStream` (AWS event-stream encoded) with
+randomized, log-normally distributed latencies and realistically sized SDXL payloads, so a real
+boto3 client - and so the whole app - can be pointed at it:
+
+    python -m benchmarks.fake_bedrock_server --port 8600
+    BEDROCK_ENDPOINT_URL=http://localhost:8600 AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x \
+        AWS_DEFAULT_REGION=us-east-1 streamlit run Home.py
+"""
+import argparse
+import base64
+import binascii
+import io
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.embeddings import HashingEmbedder
+from utils.fake_bedrock import FakeBedrockClient
+
+
+# Median latencies (seconds) and log-normal spread, roughly in line with observed Bedrock timings
+TEXT_TTFB_MEDIAN = 0.6
+TEXT_TOKENS_PER_SECOND = 40
+IMAGE_MEDIAN_SECONDS_PER_STEP = 0.08
+EMBEDDING_MEDIAN_SECONDS = 0.1
+LATENCY_SIGMA = 0.35
+
+
+def lognormal(median: float, sigma: float = LATENCY_SIGMA) -> float:
+    return random.lognormvariate(0, sigma) * median
+
+
+def noise_png(size: int) -> bytes:
+    """A noisy PNG, which compresses about as badly as a real SDXL output"""
+    image = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _event_header(name: str, value: str) -> bytes:
+    name_bytes, value_bytes = name.encode("utf-8"), value.encode("utf-8")
+    # Header value type 7 is "string"
+    return struct.pack("!B", len(name_bytes)) + name_bytes + struct.pack("!BH", 7, len(value_bytes)) + value_bytes
+
+
+def encode_event(payload: dict) -> bytes:
+    """Encode one `chunk` event in the binary AWS event-stream format used by Bedrock streaming"""
+    headers = (
+        _event_header(":event-type", "chunk")
+        + _event_header(":content-type", "application/json")
+        + _event_header(":message-type", "event")
+    )
+    body = json.dumps({"bytes": base64.b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")}).encode("utf-8")
+    total_length = 12 + len(headers) + len(body) + 4
+    prelude = struct.pack("!II", total_length, len(headers))
+    prelude += struct.pack("!I", binascii.crc32(prelude))
+    message = prelude + headers + body
+    return message + struct.pack("!I", binascii.crc32(message))
+
+
+class FakeBedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeBedrock/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "model":
+            self._send_json(404, {"message": f"Unknown path {self.path}"})
+            return
+        model_id, operation = unquote(parts[1]), parts[2]
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.count_request()
+
+        if self.server.throttle_rate and random.random() < self.server.throttle_rate:
+            self._send_json(
+                429, {"message": "Too many requests, please wait before trying again."},
+                {"x-amzn-ErrorType": "ThrottlingException:http://internal.amazon.com/coral/com.amazon.bedrock/"},
+            )
+            return
+
+        if operation == "invoke":
+            self._invoke(model_id, request)
+        elif operation == "invoke-with-response-stream":
+            self._invoke_stream(model_id, request)
+        else:
+            self._send_json(404, {"message": f"Unknown operation {operation}"})
+
+    def _completion_words(self, request: dict):
+        max_tokens = (
+            request.get("max_tokens_to_sample")
+            or request.get("max_gen_len")
+            or request.get("max_tokens")
+            or request.get("textGenerationConfig", {}).get("maxTokenCount", 200)
+        )
+        count = max(1, min(max_tokens, int(random.gauss(self.server.completion_tokens, self.server.completion_tokens / 4))))
+        return [f"word{n}" for n in range(count)]
+
+    def _invoke(self, model_id: str, request: dict):
+        if model_id.startswith("stability."):
+            time.sleep(lognormal(IMAGE_MEDIAN_SECONDS_PER_STEP * request.get("steps", 50)) * self.server.time_scale)
+            self._send_json(200, {
+                "result": "success",
+                "artifacts": [{"seed": request.get("seed", 0), "base64": self.server.image_b64, "finishReason": "SUCCESS"}],
+            })
+            return
+
+        if model_id.startswith("amazon.titan-embed"):
+            time.sleep(lognormal(EMBEDDING_MEDIAN_SECONDS) * self.server.time_scale)
+            self._send_json(200, {
+                "embedding": HashingEmbedder(1536).embed([request["inputText"]])[0].tolist(),
+                "inputTextTokenCount": len(request["inputText"].split()),
+            })
+            return
+
+        words = self._completion_words(request)
+        time.sleep((lognormal(TEXT_TTFB_MEDIAN) + len(words) / TEXT_TOKENS_PER_SECOND) * self.server.time_scale)
+        text = " ".join(words)
+        headers = {
+            "x-amzn-bedrock-input-token-count": str(len(json.dumps(request)) // 4),
+            "x-amzn-bedrock-output-token-count": str(len(words)),
+        }
+        self._send_json(200, FakeBedrockClient._text_response(model_id, text), headers)
+
+    def _invoke_stream(self, model_id: str, request: dict):
+        words = self._completion_words(request)
+        key = FakeBedrockClient._stream_key(model_id)
+        time.sleep(lognormal(TEXT_TTFB_MEDIAN) * self.server.time_scale)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Bedrock sends a few tokens per chunk
+        for n in range(0, len(words), 4):
+            payload = {key: (" " if n else "") + " ".join(words[n:n + 4])}
+            if n + 4 >= len(words):
+                payload["amazon-bedrock-invocationMetrics"] = {
+                    "inputTokenCount": len(json.dumps(request)) // 4,
+                    "outputTokenCount": len(words),
+                }
+            time.sleep(4 / TEXT_TOKENS_PER_SECOND * self.server.time_scale)
+            self._write_chunk(encode_event(payload))
+        self._write_chunk(b"")
+
+
+class FakeBedrockServer(ThreadingHTTPServer):
+    """Threaded fake `bedrock-runtime` server
+
+    Parameters
+    ----------
+    address :
+        (host, port) to listen on. Use port 0 to pick a free port.
+    time_scale :
+        Multiplier for all simulated latencies (e.g. 0.1 to run a quick smoke test).
+    image_size :
+        Side length of the returned images; 1024 matches SDXL 1.0 output.
+    completion_tokens :
+        Mean number of tokens in text completions.
+    throttle_rate :
+        Fraction of requests to reject with a ThrottlingException.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), time_scale=1.0, image_size=1024, completion_tokens=200, throttle_rate=0.0):
+        super().__init__(address, FakeBedrockHandler)
+        self.time_scale = time_scale
+        self.completion_tokens = completion_tokens
+        self.throttle_rate = throttle_rate
+        self.image_b64 = base64.b64encode(noise_png(image_size)).decode("ascii")
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread"""
+        thread = threading.Thread(target=self.serve_forever, name="fake-bedrock", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeBedrockServer(
+        (args.host, args.port),
+        time_scale=args.time_scale,
+        image_size=args.image_size,
+        completion_tokens=args.completion_tokens,
+        throttle_rate=args.throttle_rate,
+    )
+    print(f"Fake bedrock-runtime listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
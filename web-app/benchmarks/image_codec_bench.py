@@ -0,0 +1,83 @@
+"""Micro-benchmark of the SDXL image decode path and init-image encoding, before vs. after
+
+Run from the web-app folder:
+
+    python -m benchmarks.image_codec_bench
+"""
+import base64
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.image_codec import decode_image, prepare_init_image
+
+
+def make_png(size=1024):
+    """A noisy PNG of roughly SDXL-output size (noise defeats compression, like a real photo)"""
+    image = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def decode_before(base_64_img_str):
+    # What the image pages did: decode to a PIL image, which Streamlit then re-encodes for display
+    image = Image.open(io.BytesIO(base64.decodebytes(bytes(base_64_img_str, "utf-8"))))
+    image.load()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def decode_after(base_64_img_str):
+    return decode_image(base_64_img_str)
+
+
+def init_image_before(data):
+    image = Image.open(io.BytesIO(data))
+    image = image.resize((512, 512))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def init_image_after(data):
+    return prepare_init_image(data)[1]
+
+
+def measure(fn, arg, repeat=10):
+    """Return (mean seconds per call, peak bytes allocated during one call)"""
+    fn(arg)  # warm up (and populate caches, as a previous rerun would have)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    png = make_png()
+    b64 = base64.b64encode(png).decode("ascii")
+    print(f"Image: {len(png) / 1e6:.2f} MB PNG, {len(b64) / 1e6:.2f} MB base64\n")
+    for name, fn, arg in [
+        ("decode (before)", decode_before, b64),
+        ("decode (after)", decode_after, b64),
+        ("init image per rerun (before)", init_image_before, png),
+        ("init image per rerun (after)", init_image_after, png),
+    ]:
+        elapsed, peak = measure(fn, arg)
+        print(f"{name:32s} {elapsed * 1000:8.2f} ms/image {peak / 1e6:8.2f} MB peak allocated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark of perceived latency on the text-to-image page, with and without quick previews
+
+Runs the page's job (one SDXL request per style preset, plus a 10-step preview of each when
+enabled) against the fake Bedrock server, whose image latency grows with the step count, and
+reports when the first image, an image of every preset, and every full render were ready.
+Run from the web-app folder:
+
+    python -m benchmarks.image_preview_bench [--presets 8] [--steps 150] [--time-scale 0.1]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from benchmarks.fake_bedrock_server import FakeBedrockServer
+
+
+PRESETS = ["3d-model", "analog-film", "anime", "cinematic", "comic-book", "digital-art", "enhance", "fantasy-art"]
+PREVIEW_STEPS = 10
+
+
+def run(tasks, seed):
+    """Seconds until the first image, an image for every preset, and every full render"""
+    from utils.fan_out import fan_out
+    from utils.models import invoke
+
+    def generate(task):
+        preset, steps = task
+        return invoke("stability.stable-diffusion-xl-v1", prompt="Unicorn", seed=seed, steps=steps, style_preset=preset)
+
+    presets = {preset for preset, _ in tasks}
+    seen = set()
+    first = every_preset = None
+    start = time.perf_counter()
+    for outcome in fan_out(generate, tasks):
+        now = time.perf_counter() - start
+        preset, _ = outcome.item
+        seen.add(preset)
+        first = first or now
+        if every_preset is None and seen == presets:
+            every_preset = now
+    return first, every_preset, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--presets", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=150)
+    parser.add_argument("--time-scale", type=float, default=0.1, help="multiplier for simulated Bedrock latency")
+    args = parser.parse_args()
+
+    server = FakeBedrockServer(time_scale=args.time_scale, image_size=256)
+    server.start()
+    os.environ.update({
+        "BEDROCK_ENDPOINT_URL": server.url,
+        "AWS_ACCESS_KEY_ID": "fake",
+        "AWS_SECRET_ACCESS_KEY": "fake",
+        "AWS_DEFAULT_REGION": "us-east-1",
+    })
+
+    presets = PRESETS[: args.presets]
+    full = [(preset, args.steps) for preset in presets]
+    previews = [(preset, PREVIEW_STEPS) for preset in presets] + full
+    print(f"{len(presets)} presets x {args.steps} steps, latency scaled by {args.time_scale}")
+    print(f"{'':16s} {'first image':>12s} {'every preset':>13s} {'all full':>9s}")
+    # Different seeds, so the second run isn't served from the response cache
+    for seed, (name, tasks) in enumerate([("full only", full), ("with previews", previews)]):
+        first, every_preset, total = run(tasks, seed)
+        print(f"{name:16s} {first:11.2f}s {every_preset:12.2f}s {total:8.2f}s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
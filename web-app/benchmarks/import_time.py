@@ -0,0 +1,89 @@
+"""Cold-start import cost of each page, measured with `python -X importtime`
+
+For every page, the module-level imports are collected from its source (without running it) and
+imported in a fresh interpreter, so each figure is what a new task pays the first time that page
+is rendered. Run from the web-app folder:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --top 15 --repeat 5
+"""
+import argparse
+import ast
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def page_scripts():
+    yield os.path.join(APP_DIR, "Home.py")
+    pages_dir = os.path.join(APP_DIR, "pages")
+    for name in sorted(os.listdir(pages_dir)):
+        if name.endswith(".py"):
+            yield os.path.join(pages_dir, name)
+
+
+def module_imports(path: str) -> str:
+    """Source of the import statements a script runs at module level (not inside functions)"""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    statements = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statements.append(ast.unparse(node))
+    return "\n".join(statements)
+
+
+def measure(code: str):
+    """Run `code` in a fresh interpreter; return total microseconds and cumulative time by top-level module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    by_module = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Only count modules imported directly by the script (indent of one space), so nested
+        # imports aren't counted twice
+        if match and len(match.group(3)) == 1:
+            by_module[match.group(4)] = int(match.group(2))
+    return sum(by_module.values()), by_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page; the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="heaviest top-level imports to list per page")
+    args = parser.parse_args()
+
+    # Streamlit itself is imported by the server before any page runs
+    # (along with the interpreter's own start-up modules), so it's reported separately
+    baseline_runs = [measure("import streamlit") for _ in range(args.repeat)]
+    baseline = statistics.median(total for total, _ in baseline_runs)
+    preloaded = set(baseline_runs[0][1])
+    print(f"streamlit + interpreter start-up (paid once per server): {baseline / 1000:8.1f} ms\n")
+
+    for path in page_scripts():
+        code = "import streamlit\n" + module_imports(path)
+        runs = [measure(code) for _ in range(args.repeat)]
+        totals = [total for total, _ in runs]
+        _, by_module = runs[totals.index(sorted(totals)[len(totals) // 2])]
+        by_module = {name: micros for name, micros in by_module.items() if name not in preloaded}
+        page_total = sum(by_module.values())
+        print(f"{os.path.relpath(path, APP_DIR):32s} {page_total / 1000:8.1f} ms")
+        for name, micros in sorted(by_module.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {name:28s} {micros / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Headless load test of the Streamlit pages against a local fake Bedrock
+
+Each simulated user loads a page and clicks its "Generate" button, using Streamlit's AppTest to
+run the real page scripts in-process. All Bedrock traffic goes through a real boto3 client to
+`fake_bedrock_server`, so client pooling, caching, PIL work and page rendering are all exercised.
+Run from the web-app folder:
+
+    python -m benchmarks.load_test --users 8 --iterations 3
+    python -m benchmarks.load_test --pages 3_Text_to_Image --users 16 --time-scale 0.2
+
+AppTest's mock Streamlit runtime is a per-process singleton, so each simulated user runs in its
+own worker process (against the same fake Bedrock). RSS is reported as the growth of a worker
+process per session it ran. The image-to-image page needs a file upload, which AppTest can't
+simulate, so it is only measured up to the upload prompt.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+import resource
+import sys
+import time
+import warnings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path.insert(0, APP_DIR)
+
+from benchmarks.fake_bedrock_server import FakeBedrockServer
+
+
+PAGES = ["1_Text_Generation", "2_Text_Summarization", "3_Text_to_Image", "4_Image_to_Image"]
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (falls back to the peak where /proc is missing)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(math.ceil(q * len(values)) - 1, 0)] if values else float("nan")
+
+
+def _init_worker(env: dict):
+    os.environ.update(env)
+    os.environ.pop("BEDROCK_FAKE", None)
+    os.chdir(APP_DIR)  # Pages load ./imgs/bedrock.png
+    warnings.filterwarnings("ignore")
+
+
+def run_session(page: str, iterations: int, timeout: float):
+    """Load `page` and click its Generate button `iterations` times, each in a new session
+
+    Returns the seconds taken by each interaction, and the RSS growth of this process per session.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rss_before = rss_bytes()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        app = AppTest.from_file(os.path.join(APP_DIR, "pages", f"{page}.py"), default_timeout=timeout)
+        app.run()
+        for button in app.button:
+            if button.label.startswith("Generate"):
+                button.click()
+                app.run()
+                break
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        latencies.append(time.perf_counter() - start)
+    return latencies, (rss_bytes() - rss_before) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--users", type=int, default=4, help="concurrent simulated users per page")
+    parser.add_argument("--iterations", type=int, default=2, help="interactions per user")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier for simulated Bedrock latency")
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    server = FakeBedrockServer(time_scale=args.time_scale, image_size=args.image_size, throttle_rate=args.throttle_rate)
+    server.start()
+    env = {
+        "BEDROCK_ENDPOINT_URL": server.url,
+        "AWS_ACCESS_KEY_ID": "fake",
+        "AWS_SECRET_ACCESS_KEY": "fake",
+        "AWS_DEFAULT_REGION": "us-east-1",
+    }
+
+    print(f"Fake Bedrock at {server.url}; {args.users} users x {args.iterations} iterations per page\n")
+    print(f"{'page':22s} {'req/s':>7s} {'p50 s':>7s} {'p95 s':>7s} {'p99 s':>7s} {'errors':>6s} {'RSS/session MB':>15s}")
+    for page in args.pages:
+        requests_before = server.requests
+        latencies, rss_growth, errors = [], [], 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.users, initializer=_init_worker, initargs=(env,)) as executor:
+            futures = [executor.submit(run_session, page, args.iterations, args.timeout) for _ in range(args.users)]
+            for future in futures:
+                try:
+                    session_latencies, session_rss = future.result()
+                except Exception as e:
+                    errors += 1
+                    print(f"  {page}: {e}")
+                else:
+                    latencies.extend(session_latencies)
+                    rss_growth.append(session_rss)
+        elapsed = time.perf_counter() - start
+        rss_per_session = sum(rss_growth) / max(len(rss_growth), 1) / 1e6
+        print(
+            f"{page:22s} {len(latencies) / elapsed:7.2f} {percentile(latencies, 0.5):7.2f} "
+            f"{percentile(latencies, 0.95):7.2f} {percentile(latencies, 0.99):7.2f} {errors:6d} {rss_per_session:15.2f}"
+            f"   ({server.requests - requests_before} Bedrock requests)"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark of upload preprocessing for the image-to-image page, before vs. after
+
+Run from the web-app folder:
+
+    python -m benchmarks.preprocess_bench
+"""
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.image_preprocess import preprocess_image
+
+
+def make_jpeg(width, height):
+    """A smooth-gradient JPEG of the given size (cheap to generate, realistic to decode)"""
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def preprocess_before(data):
+    # The image-to-image page's original crop/resize code
+    image = Image.open(io.BytesIO(data))
+    image_width, image_height = image.size
+    if image_width > image_height:
+        crop_delta = int(round((image_width - image_height) / 2))
+        image = image.crop((crop_delta, 0, (image_width - crop_delta), image_height))
+    elif image_height > image_width:
+        crop_delta = int(round((image_height - image_width) / 2))
+        image = image.crop((0, crop_delta, image_width, (image_height - crop_delta)))
+    return image.resize((512, 512))
+
+
+def preprocess_after(data):
+    return preprocess_image(data)
+
+
+def measure(fn, data, repeat=3):
+    """Return mean seconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return (time.perf_counter() - start) / repeat
+
+
+def decoded_bytes(data, draft):
+    """Size of the decoded pixel buffer (PIL allocates it outside tracemalloc's view)"""
+    image = Image.open(io.BytesIO(data))
+    if draft:
+        image.draft("RGB", (512, 512))
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+def main():
+    for width, height in [(1024, 768), (4032, 3024), (8660, 5773)]:
+        data = make_jpeg(width, height)
+        print(f"{width}x{height} JPEG ({width * height / 1e6:.1f} MP, {len(data) / 1e6:.1f} MB)")
+        for name, fn, draft in [("before", preprocess_before, False), ("after", preprocess_after, True)]:
+            elapsed = measure(fn, data)
+            print(f"  {name:8s} {elapsed * 1000:9.1f} ms {decoded_bytes(data, draft) / 1e6:8.1f} MB decoded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark of document index build throughput vs. the embedding service's concurrency
+
+Indexes embed through an `EmbeddingService`, as `rag.get_document_index` sets them up, so the
+batches in flight are bounded by its `max_concurrency` (EMBEDDING_MAX_CONCURRENCY in the app).
+Embedding calls are simulated with the local hashing embedder plus a fixed per-request latency,
+like a Bedrock embedding request would add. Run from the web-app folder:
+
+    python -m benchmarks.rag_index_bench [--pages 200] [--latency 0.1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.embedding_service import EmbeddingService
+from utils.embeddings import HashingEmbedder
+from utils.rag import DocumentIndex
+
+
+class SlowEmbedder(HashingEmbedder):
+    """Hashing embedder that sleeps `latency` seconds per text, like one Titan request each"""
+
+    def __init__(self, latency, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def embed(self, texts):
+        time.sleep(self.latency * len(texts))
+        return super().embed(texts)
+
+
+def make_pages(count):
+    words = "bedrock claude titan index vector search chunk page document answer question model".split()
+    return [
+        "\n\n".join(
+            " ".join(words[(page + paragraph + n) % len(words)] for n in range(120)) + "."
+            for paragraph in range(8)
+        )
+        for page in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per text embedded")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages)
+    print(f"{args.pages} pages, {args.latency * 1000:.0f} ms per embedding")
+    print(f"{'concurrency':>11} {'chunks':>8} {'seconds':>8} {'chunks/s':>9}")
+    for concurrency in [1, 2, 4, 8, 16]:
+        service = EmbeddingService(SlowEmbedder(args.latency), batch_size=8, max_concurrency=concurrency)
+        with tempfile.TemporaryDirectory() as directory:
+            index = DocumentIndex(directory, service)
+            stats = index.add_document("bench.pdf", iter(pages), batch_size=8)
+        print(f"{concurrency:>11} {stats.chunks:>8} {stats.seconds:>8.2f} {stats.chunks / stats.seconds:>9.1f}")
+
+    # Re-indexing the same document only checks page hashes
+    with tempfile.TemporaryDirectory() as directory:
+        index = DocumentIndex(directory, EmbeddingService(SlowEmbedder(args.latency)))
+        index.add_document("bench.pdf", iter(pages))
+        stats = index.add_document("bench.pdf", iter(pages + make_pages(args.pages + 5)[-5:]))
+    print(f"Re-upload with 5 pages added: {stats.new_pages} pages, {stats.chunks} chunks indexed in {stats.seconds:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
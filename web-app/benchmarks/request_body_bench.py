@@ -0,0 +1,128 @@
+"""Micro-benchmark of building and serializing each page's Bedrock request, before vs. after
+
+"Before" builds the body dict for every request and serializes it twice, once for the response
+cache key and once to send (as `invoke` does for a plain call). "After" fills a request
+template from `models.prepare_request` in, once per set of parameters. The prompt bytes show the
+source indentation the summarization page's f-string used to send, and that the compiled
+`PromptTemplate` leaves out. Last, it times ways of checking that a raw field (the base64 init
+image) needs no JSON escaping. Run from the web-app folder:
+
+    python -m benchmarks.request_body_bench
+"""
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from benchmarks.image_codec_bench import make_png
+from utils.image_codec import prepare_init_image
+from utils.models import get_provider, prepare_request
+from utils.response_cache import cache_key, is_cacheable, serialize_body
+from utils.summarize import INSTRUCTION_PROMPT
+from utils.templates import _JSON_UNSAFE
+
+CLAUDE = "anthropic.claude-v2"
+SDXL = "stability.stable-diffusion-xl-v1"
+NEGATIVE_PROMPTS = ["poorly rendered", "poor background details", "poorly drawn mountains", "disfigured mountain features"]
+PRESETS = ["3d-model", "analog-film", "anime", "cinematic", "comic-book", "digital-art", "enhance", "fantasy-art"]
+
+
+def old_summary_prompt(instruction, text):
+    # The summarization page's prompt, indented as it was in the page's source
+    prompt = f"""{instruction}
+            <text>
+            {text}
+            </text>"""
+    return prompt
+
+
+def time_per_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def before(model_id, params):
+    body = get_provider(model_id).build_body(**params)
+    if is_cacheable(body):
+        cache_key(model_id, body)
+    return serialize_body(body)
+
+
+def after(model_id, request, fields):
+    body = request.render(**fields)
+    if is_cacheable(body):
+        cache_key(model_id, body)
+    return serialize_body(body)
+
+
+def main():
+    instruction = "Summarize the following text in 3 bullet points."
+    text = " ".join(["Amazon Bedrock makes foundation models available through an API."] * 40)
+    init_image = prepare_init_image(make_png(1024), size=1024)[1]
+    image_params = dict(negative_prompts=NEGATIVE_PROMPTS, cfg_scale=5, seed=42, steps=50)
+
+    cases = [
+        (
+            "summary (Claude)",
+            CLAUDE,
+            dict(prompt=old_summary_prompt(instruction, text), max_tokens=4096, temperature=0.5, top_k=250, top_p=0.5),
+            prepare_request(CLAUDE, max_tokens=4096, temperature=0.5, top_k=250, top_p=0.5),
+            dict(prompt=INSTRUCTION_PROMPT.render(instruction=instruction, text=text)),
+        ),
+        (
+            "text to image (SDXL)",
+            SDXL,
+            dict(prompt="Unicorn with beach in the background", style_preset=PRESETS[0], **image_params),
+            prepare_request(SDXL, fields=["prompt", "style_preset"], **image_params),
+            dict(prompt="Unicorn with beach in the background", style_preset=PRESETS[0]),
+        ),
+        (
+            "image to image (SDXL)",
+            SDXL,
+            dict(prompt="high quality", style_preset=PRESETS[0], init_image=init_image, **image_params),
+            prepare_request(SDXL, fields=["prompt", "style_preset"], raw_fields=["init_image"], **image_params),
+            dict(prompt="high quality", style_preset=PRESETS[0], init_image=init_image),
+        ),
+    ]
+
+    print(f"{'request':22s} {'before us':>10s} {'after us':>9s} {'speed-up':>9s} {'before bytes':>13s} {'after bytes':>12s}")
+    for name, model_id, params, request, fields in cases:
+        repeat = 20 if "init_image" in params else 2000
+        before_time = time_per_call(lambda: before(model_id, params), repeat)
+        after_time = time_per_call(lambda: after(model_id, request, fields), repeat)
+        before_bytes = len(before(model_id, params).encode("utf-8"))
+        after_bytes = len(after(model_id, request, fields).encode("utf-8"))
+        print(
+            f"{name:22s} {before_time * 1e6:10.1f} {after_time * 1e6:9.1f} {before_time / after_time:8.1f}x "
+            f"{before_bytes:13d} {after_bytes:12d}"
+        )
+
+    # A generation with every preset: the page's requests differ by preset only
+    image_fields = [dict(prompt="high quality", style_preset=preset, init_image=init_image) for preset in PRESETS]
+    request = prepare_request(SDXL, fields=["prompt", "style_preset"], raw_fields=["init_image"], **image_params)
+    before_time = time_per_call(lambda: [before(SDXL, {**image_params, **fields}) for fields in image_fields], 10)
+    after_time = time_per_call(lambda: [after(SDXL, request, fields) for fields in image_fields], 10)
+    print(f"\nImage to image, {len(PRESETS)} presets ({len(init_image) / 1e6:.1f} MB init image each):")
+    print(f"  before {before_time * 1e3:.1f} ms, after {after_time * 1e3:.1f} ms")
+
+    # What `BodyTemplate.render` does for a raw field, against the alternatives
+    unsafe = re.compile(r'[\x00-\x1f"\\]').search
+    checks = [
+        ("bytes.translate", lambda: len(init_image.encode("ascii").translate(None, _JSON_UNSAFE)) != len(init_image)),
+        ("regular expression", lambda: unsafe(init_image)),
+        ("JSON-encoding", lambda: json.dumps(init_image)),
+    ]
+    print(f"\nRaw field check ({len(init_image) / 1e6:.1f} MB init image):")
+    for name, check in checks:
+        print(f"  {name:20s} {time_per_call(check, 20) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
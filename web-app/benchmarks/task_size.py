@@ -0,0 +1,78 @@
+"""Smallest Fargate task size for a given number of sessions, from measured memory use
+
+Memory is what sizes this app's tasks: it is I/O-bound on Bedrock, so CPU stays low, while every
+session holds its page state and images. A task needs the RSS of a warmed-up process, plus the
+growth per session reported by `load_test` for the heaviest page, times the sessions a task is
+scaled to hold (the `ActiveSessions` target in `stack/web_stack.py`), plus headroom. This prints
+the smallest valid Fargate CPU/memory combination for that, to copy into
+`stack/compute_profiles.py`. Run from the web-app folder, after `load_test`:
+
+    python -m benchmarks.task_size --rss-per-session-mb 41.4 --sessions 20
+    python -m benchmarks.task_size --rss-per-session-mb 41.4 --sessions 4 --min-cpu 1024
+"""
+import argparse
+import importlib
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path.insert(0, APP_DIR)
+
+from benchmarks.load_test import rss_bytes
+
+
+# Valid Fargate (Linux) memory sizes in MiB, by CPU units
+FARGATE_SIZES = {
+    256: [512, 1024, 2048],
+    512: list(range(1024, 4097, 1024)),
+    1024: list(range(2048, 8193, 1024)),
+    2048: list(range(4096, 16385, 1024)),
+    4096: list(range(8192, 30721, 1024)),
+    8192: list(range(16384, 61441, 4096)),
+    16384: list(range(32768, 122881, 8192)),
+}
+
+
+def baseline_rss_mb() -> float:
+    """RSS of a process that has warmed up and imported what the pages import"""
+    os.environ.setdefault("BEDROCK_FAKE", "1")
+    from utils.warmup import _warm_up
+
+    _warm_up()
+    for name in ("streamlit", "PIL.Image", "faiss", "pypdf"):
+        importlib.import_module(name)
+    return rss_bytes() / 2**20
+
+
+def smallest_size(memory_mib: float, min_cpu: int = 256):
+    """Smallest (cpu, memory) Fargate size with at least `memory_mib` and `min_cpu`"""
+    for cpu, memories in FARGATE_SIZES.items():
+        if cpu < min_cpu:
+            continue
+        for memory in memories:
+            if memory >= memory_mib:
+                return cpu, memory
+    raise ValueError(f"No Fargate task size has {memory_mib:.0f} MiB of memory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rss-per-session-mb", type=float, required=True, help="from load_test, heaviest page")
+    parser.add_argument("--sessions", type=int, default=20, help="sessions per task at the scaling target")
+    parser.add_argument("--baseline-mb", type=float, help="RSS of an idle task (measured if not given)")
+    parser.add_argument("--headroom", type=float, default=1.5, help="multiplier for spikes and fragmentation")
+    parser.add_argument("--min-cpu", type=int, default=256, choices=sorted(FARGATE_SIZES))
+    args = parser.parse_args()
+
+    baseline = args.baseline_mb if args.baseline_mb is not None else baseline_rss_mb()
+    needed = (baseline + args.sessions * args.rss_per_session_mb) * args.headroom
+    cpu, memory = smallest_size(needed, args.min_cpu)
+    print(f"Baseline RSS:  {baseline:8.0f} MiB")
+    print(f"Sessions:      {args.sessions:8d} x {args.rss_per_session_mb:.1f} MiB")
+    print(f"With headroom: {needed:8.0f} MiB (x{args.headroom})")
+    print(f"Task size:     cpu={cpu}, memory_mib={memory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,158 @@
 import streamlit as st
-import json
 import os
 import sys
 import time
-from langchain.llms.bedrock import Bedrock
+from contextlib import closing
 
 
 st.set_page_config(
     page_title="Text Summarization",
     layout="wide",
 )
+
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
 c1, c2 = st.columns([1, 8])
 with c1:
-    st.image("./imgs/bedrock.png", width=100)
+    st.image(logo(), width=100)
 
 with c2:
     st.header("Text generation")
     st.caption("Using Claude in Bedrock")
 
-module_path = ".."
-sys.path.append(os.path.abspath(module_path))
-from utils import bedrock, print_ww
+from utils.chat import Conversation, claude_summarizer, get_conversations
+from utils.metrics import PageTimer
+from utils.models import get_default_client, invoke_stream
+from utils.semantic_cache import get_semantic_cache
+from utils.session_store import get_session_store, session_id
+from utils.streaming import StreamStats
+from utils.summarize import estimate_tokens
+
+page_timer = PageTimer("Text generation")
 
 # ---- ⚠️ Un-comment and edit the below lines as needed for your AWS setup ⚠️ ----
 # os.environ["AWS_DEFAULT_REGION"] = "<REGION_NAME>"  # E.g. "us-east-1"
 # os.environ["AWS_PROFILE"] = "<YOUR_PROFILE>"
 # os.environ["BEDROCK_ASSUME_ROLE"] = "<YOUR_ROLE_ARN>"  # E.g. "arn:aws:..."
 
-boto3_bedrock = bedrock.get_bedrock_client(
-    assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
-    region=os.environ.get("AWS_DEFAULT_REGION", None)
-)
+boto3_bedrock = get_default_client()
 
 modelId = 'anthropic.claude-v2' # change this to use a different version from the model provider
-accept = 'application/json'
-contentType = 'application/json'
-
-sample_instruction = """Write an email from Bob, Customer Service Manager, to the customer "John Doe" that provided negative feedback on the service provided by our customer support engineer."""
-
-
-instruction = st.text_area("Prompt:", sample_instruction, height=100)
-
 
+mode = st.sidebar.radio("Mode:", ["Single prompt", "Chat"], horizontal=True)
 max_tokens_to_sample = st.sidebar.slider("max_tokens_to_sample:", min_value=500, max_value=4096, value=4096)
 temperature = st.sidebar.slider("temperature:", min_value=0.0, max_value=1.0, value=0.5, step=0.1)
 top_k = st.sidebar.slider('top_k:', min_value=10, max_value=500, value=250, step=10)
 top_p = st.sidebar.slider('top_p:', min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+use_semantic_cache = st.sidebar.checkbox(
+    "Reuse answers to similar prompts", value=True,
+    help="Serve a near-duplicate of an earlier prompt from the semantic cache, without calling Claude",
+)
+semantic_cache = get_semantic_cache() if use_semantic_cache else None
 
+sample_instruction = """Write an email from Bob, Customer Service Manager, to the customer "John Doe" that provided negative feedback on the service provided by our customer support engineer."""
 
-if st.button("Generate Response", key=instruction):
-    if instruction == "":        
-        st.error("Please enter a prompt...")
-    else:
-        with st.spinner("Wait for it..."):    
-            
-            start_time = time.time()
-            prompt = f"""Human: {instruction}
-
-            Assistant:"""
 
-            inference_modifier = {
-                "max_tokens_to_sample": max_tokens_to_sample,
-                "temperature": temperature,
-                "top_k": top_k,
-                "top_p": top_p,
-                "stop_sequences": ["\n\nHuman"],
-            }
-            
-            textgen_llm = Bedrock(
-                model_id="anthropic.claude-v2",
+if mode == "Chat":
+    # Also kept in the session store, so the conversation survives reconnecting to another task
+    session_store = get_session_store()
+    sid = session_id(st.session_state, st.query_params)
+    if "conversation" not in st.session_state:
+        saved = session_store.get(sid, "conversation")
+        st.session_state.conversation = Conversation() if saved is None else Conversation.from_dict(saved)
+    conversation = st.session_state.conversation
+    get_conversations().touch(conversation)
+    if conversation.evicted:
+        st.info("This conversation was cleared after being idle. Start a new one below.")
+        conversation.evicted = False
+        session_store.delete(sid, "conversation")
+    if st.sidebar.button("Clear conversation"):
+        conversation.clear()
+        session_store.delete(sid, "conversation")
+
+    if conversation.dropped:
+        st.caption(f"{conversation.dropped} earlier messages are no longer shown, but are part of the conversation summary.")
+    for turn in conversation.turns:
+        with st.chat_message("user" if turn.role == "Human" else "assistant"):
+            st.markdown(turn.text)
+
+    message = st.chat_input("Message Claude...")
+    if message:
+        with st.chat_message("user"):
+            st.markdown(message)
+        with st.chat_message("assistant"):
+            start_time = time.time()
+            prompt = conversation.build_prompt(message, summarize=claude_summarizer(modelId, client=boto3_bedrock))
+            stats = StreamStats()
+            placeholder = st.empty()
+            response = ""
+            chunks = invoke_stream(
+                modelId,
                 client=boto3_bedrock,
-                model_kwargs=inference_modifier,
+                stats=stats,
+                # Only the new message is matched by similarity, and only within the same history
+                semantic_cache=semantic_cache,
+                semantic_prompt=message,
+                semantic_context=conversation.context_digest(),
+                prompt=prompt,
+                max_tokens=max_tokens_to_sample,
+                temperature=temperature,
+                top_k=top_k,
+                top_p=top_p,
             )
-            
-            response = textgen_llm(prompt)
-
-            st.write(response)
+            with closing(chunks):
+                for chunk in chunks:
+                    response += chunk
+                    placeholder.markdown(response)
+            conversation.add_exchange(message, response.strip())
+            try:
+                session_store.put(sid, "conversation", conversation.to_dict())
+            except Exception as e:
+                # Still kept in this task's memory: only reconnecting to another task would lose it
+                st.warning(f"The conversation could not be saved for reconnecting: {e}")
 
             execution_time = round(time.time() - start_time, 2)
+            st.caption(f"Execution time: {execution_time} seconds | Prompt: ~{estimate_tokens(prompt)} tokens")
+            st.caption(stats.caption())
 
-            st.success("Done!")
-            st.caption(f"Execution time: {execution_time} seconds")
\ No newline at end of file
+else:
+    instruction = st.text_area("Prompt:", sample_instruction, height=100)
+
+    if st.button("Generate Response", key=instruction):
+        if instruction == "":        
+            st.error("Please enter a prompt...")
+        else:
+            with st.spinner("Wait for it..."):    
+            
+                start_time = time.time()
+                stats = StreamStats()
+                placeholder = st.empty()
+                response = ""
+                chunks = invoke_stream(
+                    modelId,
+                    client=boto3_bedrock,
+                    stats=stats,
+                    semantic_cache=semantic_cache,
+                    prompt=instruction,
+                    max_tokens=max_tokens_to_sample,
+                    temperature=temperature,
+                    top_k=top_k,
+                    top_p=top_p,
+                )
+                with closing(chunks):
+                    for chunk in chunks:
+                        response += chunk
+                        placeholder.markdown(response)
+
+                execution_time = round(time.time() - start_time, 2)
+
+                st.success("Done!")
+                st.caption(f"Execution time: {execution_time} seconds")
+                st.caption(stats.caption())
+
+page_timer.finish()
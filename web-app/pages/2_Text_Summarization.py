@@ -1,38 +1,45 @@
 import streamlit as st
-import json
 import os
 import sys
 import time
+from contextlib import closing
 
 st.set_page_config(
     page_title="Text Summarization",
     layout="wide",
 )
+
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
 c1, c2 = st.columns([1, 8])
 with c1:
-    st.image("./imgs/bedrock.png", width=100)
+    st.image(logo(), width=100)
 
 with c2:
     st.header("Text summarization")
     st.caption("Using Claude in Bedrock")
 
-module_path = ".."
-sys.path.append(os.path.abspath(module_path))
-from utils import bedrock, print_ww
+from utils.metrics import PageTimer
+from utils.models import get_default_client, invoke, invoke_stream
+from utils.semantic_cache import get_semantic_cache
+from utils.streaming import StreamStats
+from utils.summarize import CHUNK_SUMMARY_PROMPT, DEFAULT_CHUNK_TOKENS, INSTRUCTION_PROMPT, iter_pdf_pages, map_reduce
+
+page_timer = PageTimer("Text summarization")
 
 # ---- ⚠️ Un-comment and edit the below lines as needed for your AWS setup ⚠️ ----
 # os.environ["AWS_DEFAULT_REGION"] = "<REGION_NAME>"  # E.g. "us-east-1"
 # os.environ["AWS_PROFILE"] = "<YOUR_PROFILE>"
 # os.environ["BEDROCK_ASSUME_ROLE"] = "<YOUR_ROLE_ARN>"  # E.g. "arn:aws:..."
 
-boto3_bedrock = bedrock.get_bedrock_client(
-    assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
-    region=os.environ.get("AWS_DEFAULT_REGION", None)
-)
+boto3_bedrock = get_default_client()
 
 modelId = 'anthropic.claude-v2' # change this to use a different version from the model provider
-accept = 'application/json'
-contentType = 'application/json'
 
 sample_text_1 = """AWS took all of that feedback from customers, and today we are excited to announce Amazon Bedrock, \
 a new service that makes FMs from AI21 Labs, Anthropic, Stability AI, and Amazon accessible via an API. \
@@ -75,7 +82,7 @@ instruction = st.text_area("Instruction:", "Please provide a summary of the foll
 st.write('<style>div.row-widget.stRadio > div{flex-direction:row;justify-content: center;} </style>', unsafe_allow_html=True)
 sample_text = st.sidebar.radio(
     "Select sample text or type your own:",
-    ["Sample 1", "Sample 2"],
+    ["Sample 1", "Sample 2", "Upload PDF"],
     horizontal=True
     )
 
@@ -83,11 +90,36 @@ max_tokens_to_sample = st.sidebar.slider("max_tokens_to_sample:", min_value=500,
 temperature = st.sidebar.slider("temperature:", min_value=0.0, max_value=1.0, value=0.5, step=0.1)
 top_k = st.sidebar.slider('top_k:', min_value=10, max_value=500, value=250, step=10)
 top_p = st.sidebar.slider('top_p:', min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+chunk_tokens = st.sidebar.slider("chunk size (tokens):", min_value=1000, max_value=8000, value=DEFAULT_CHUNK_TOKENS, step=500)
+map_concurrency = st.sidebar.slider("map concurrency:", min_value=1, max_value=8, value=4, step=1)
+use_semantic_cache = st.sidebar.checkbox(
+    "Reuse answers to similar prompts", value=True,
+    help="Serve a near-duplicate of an earlier prompt from the semantic cache, without calling Claude",
+)
+semantic_cache = get_semantic_cache() if use_semantic_cache else None
 
 if sample_text == "Sample 1":
     text = st.text_area("Input Text:", sample_text_1, height=300)
 elif sample_text == "Sample 2":
     text = st.text_area("Input Text:", sample_text_2, height=300)
+elif sample_text == "Upload PDF":
+    uploaded_pdf = st.file_uploader("Upload a PDF", type=["pdf"])
+    text = "" if uploaded_pdf is None else uploaded_pdf.name
+
+def summarize_chunk(chunk):
+    """Summarize one chunk of a long document (map/reduce stage)"""
+    result = invoke(
+        modelId,
+        client=boto3_bedrock,
+        semantic_cache=semantic_cache,
+        prompt=CHUNK_SUMMARY_PROMPT.render(text=chunk),
+        max_tokens=1000,
+        temperature=temperature,
+        top_k=top_k,
+        top_p=top_p,
+        stop_sequences=[],
+    )
+    return result.output.strip()
 
 if st.button("Generate Response", key=instruction):
     if text == "" or instruction == "":        
@@ -96,27 +128,47 @@ if st.button("Generate Response", key=instruction):
         with st.spinner("Wait for it..."):    
             
             start_time = time.time()
-            prompt = f"""Human: {instruction}
-            <text>
-            {text}
-            </text>
-
-            Assistant:"""
-
-            body = json.dumps({"prompt": prompt,
-                "max_tokens_to_sample":4096,
-                "temperature": temperature,
-                "top_k": top_k,
-                "top_p":top_p,
-                "stop_sequences":[]
-                }) 
 
-            response = boto3_bedrock.invoke_model(body=body, modelId=modelId, accept=accept, contentType=contentType)
-            response_body = json.loads(response.get('body').read())
-
-            st.write(response_body.get('completion'))
+            # Long documents are first condensed chunk by chunk, so the final prompt fits the context window
+            if sample_text == "Upload PDF":
+                pages = iter_pdf_pages(uploaded_pdf)
+            else:
+                pages = [text]
+            progress = st.empty()
+
+            def on_progress(level, done, total):
+                stage = "Summarizing chunks" if level == 0 else f"Combining summaries (level {level})"
+                progress.progress(done / total, text=f"{stage}: {done}/{total}")
+
+            text = map_reduce(pages, summarize_chunk, chunk_tokens=chunk_tokens, max_concurrency=map_concurrency, on_progress=on_progress)
+            progress.empty()
+
+            prompt = INSTRUCTION_PROMPT.render(instruction=instruction, text=text)
+
+            stats = StreamStats()
+            placeholder = st.empty()
+            completion = ""
+            chunks = invoke_stream(
+                modelId,
+                client=boto3_bedrock,
+                stats=stats,
+                semantic_cache=semantic_cache,
+                prompt=prompt,
+                max_tokens=4096,
+                temperature=temperature,
+                top_k=top_k,
+                top_p=top_p,
+                stop_sequences=[],
+            )
+            with closing(chunks):
+                for chunk in chunks:
+                    completion += chunk
+                    placeholder.markdown(completion)
 
             execution_time = round(time.time() - start_time, 2)
 
             st.success("Done!")
-            st.caption(f"Execution time: {execution_time} seconds")
\ No newline at end of file
+            st.caption(f"Execution time: {execution_time} seconds")
+            st.caption(stats.caption())
+
+page_timer.finish()
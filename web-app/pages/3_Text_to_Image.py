@@ -1,20 +1,24 @@
 import streamlit as st
-import json
 import os
 import sys
-import base64
-import io
 import time
+from functools import partial
 
-from PIL import Image
 st.set_page_config(
     page_title="Text to Image",
     layout="wide",
 )
 
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
 c1, c2 = st.columns([1, 8])
 with c1:
-    st.image("./imgs/bedrock.png", width=100)
+    st.image(logo(), width=100)
 
 with c2:
     st.header("Text to Image generation")
@@ -48,22 +52,29 @@ picture_width = st.sidebar.slider('Picture Width (px):', min_value=64, max_value
 cfg_scale = st.sidebar.slider('cfg_scale:', min_value=0, max_value=35, value=5, step=1)
 steps = st.sidebar.slider('steps:', min_value=10, max_value=150, value=70, step=10)
 seed = st.sidebar.number_input('seed:', min_value=0, max_value=4294967295, value=5450)
+show_previews = st.sidebar.checkbox(
+    "Quick previews", value=True,
+    help="Render every preset at a few steps first, then replace the previews as the full renders arrive",
+)
 
 
 
-module_path = ".."
-sys.path.append(os.path.abspath(module_path))
-from utils import bedrock, print_ww
+from utils.image_store import Gallery, get_image_store
+from utils.jobs import get_job_backend
+from utils.metrics import PageTimer
+from utils.models import get_default_client, invoke, prepare_request
+from utils.session_store import get_session_store, session_id
+
+page_timer = PageTimer("Text to image")
 
 # ---- ⚠️ Un-comment and edit the below lines as needed for your AWS setup ⚠️ ----
 # os.environ["AWS_DEFAULT_REGION"] = "<REGION_NAME>"  # E.g. "us-east-1"
 # os.environ["AWS_PROFILE"] = "<YOUR_PROFILE>"
 # os.environ["BEDROCK_ASSUME_ROLE"] = "<YOUR_ROLE_ARN>"  # E.g. "arn:aws:..."
 
-boto3_bedrock = bedrock.get_bedrock_client(
-    assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
-    region=os.environ.get("AWS_DEFAULT_REGION", None)
-)
+boto3_bedrock = get_default_client()
+
+modelId = "stability.stable-diffusion-xl-v1"
 
 negative_prompts = [
     "poorly rendered",
@@ -74,6 +85,88 @@ negative_prompts = [
 
 prompt = st.text_area("Prompt:", "Unicorn with beach in the background")
 
+# Seconds between checks of a running generation job
+POLL_INTERVAL = 1
+EXPIRED_IMAGE_MESSAGE = "This image has expired from the image store. Generate it again to see it."
+# Width (px) of the gallery thumbnails in the sidebar
+GALLERY_WIDTH = 128
+# Steps of the quick preview rendered for each preset before the full render
+PREVIEW_STEPS = 10
+# Presets shown side by side
+GRID_COLUMNS = 4
+
+jobs = get_job_backend()
+store = get_image_store()
+# Job IDs and the gallery are also kept in the session store, to survive reconnecting to another task
+session_store = get_session_store()
+sid = session_id(st.session_state, st.query_params)
+# Shared by the text-to-image and image-to-image pages; only holds image keys
+if "image_gallery" not in st.session_state:
+    st.session_state.image_gallery = Gallery.from_list(session_store.get(sid, "image_gallery", []))
+gallery = st.session_state.image_gallery
+
+def generate_image(task, prompt, cfg_scale, seed):
+    """Generate one image with Stable Diffusion XL for a (style preset, steps) task, returning (image store key, cached)"""
+    style_preset, steps = task
+    # Serialized once per set of parameters: only the prompt and preset are filled in per image
+    request = prepare_request(
+        modelId,
+        fields=["prompt", "style_preset"],
+        negative_prompts=negative_prompts,
+        cfg_scale=cfg_scale,
+        seed=seed,
+        steps=steps,
+    )
+    result = invoke(modelId, client=boto3_bedrock, request=request, prompt=prompt, style_preset=style_preset)
+    return store.put(result.output), result.cached
+
+def download_image_button(image_key, file_name, key):
+    """Download button for the full-resolution image, which is only read when clicked"""
+    def data():
+        # Streamlit ignores st.* calls here, so an image pruned since the page was shown gives an
+        # empty file rather than an error, and the rerun after the click shows the warning
+        try:
+            return store.full(image_key)
+        except KeyError:
+            return b""
+
+    def on_click():
+        if image_key not in store:
+            st.session_state[f"{key}-expired"] = True
+
+    st.download_button("Download", data=data, file_name=file_name, mime="image/png", key=key, on_click=on_click)
+    if st.session_state.pop(f"{key}-expired", False):
+        st.warning(EXPIRED_IMAGE_MESSAGE)
+
+def show_gallery():
+    """This session's past generations, as thumbnails in the sidebar"""
+    items = [item for item in gallery.items if item.key in store]
+    if items:
+        with st.sidebar.expander(f"Gallery ({len(items)} images)"):
+            for item in items:
+                try:
+                    st.image(store.thumbnail(item.key, GALLERY_WIDTH), caption=item.caption)
+                except KeyError:
+                    # Pruned from the store since the check above
+                    continue
+                download_image_button(item.key, f"{item.key[:16]}.png", f"gallery-{item.key}")
+
+def show_image(image_key, name, job_id):
+    """A generated image as a thumbnail, with the full resolution loaded only on demand"""
+    try:
+        st.image(store.thumbnail(image_key, picture_width), width=picture_width)
+    except KeyError:
+        # Older images are deleted as the image store fills up, even if a job or gallery still lists them
+        st.warning(EXPIRED_IMAGE_MESSAGE)
+        return
+    if st.toggle("Full resolution", key=f"full-{job_id}-{name}"):
+        try:
+            st.image(store.full(image_key))
+        except KeyError:
+            st.warning(EXPIRED_IMAGE_MESSAGE)
+            return
+    download_image_button(image_key, f"{name}.png", f"download-{job_id}-{name}")
+
 num_presets = len(selected_style_presets)
 
 if st.button("Generate Image", key=prompt):
@@ -81,42 +174,76 @@ if st.button("Generate Image", key=prompt):
     if prompt == "" or num_presets == 0:        
         st.error("Please enter a valid prompt and select presets...")
     else:
-        with st.spinner("Wait for it..."):
-            
-            start_time = time.time()
-
-            tabs = st.tabs(selected_style_presets)
-
-            x = range(num_presets)
-
-            for n in x:
-
-                request = json.dumps({
-                    "text_prompts": (
-                        [{"text": prompt, "weight": 1.0}]
-                        + [{"text": negprompt, "weight": -1.0} for negprompt in negative_prompts]
-                    ),
-                    "cfg_scale": cfg_scale,
-                    "seed": seed,
-                    "steps": steps,
-                    "style_preset": selected_style_presets[n],
-                })
-                modelId = "stability.stable-diffusion-xl-v1"
-
-                response = boto3_bedrock.invoke_model(body=request, modelId=modelId)
-                response_body = json.loads(response.get("body").read())
-
-                print(response_body["result"])
-                base_64_img_str = response_body["artifacts"][0].get("base64")
-                print(f"{base_64_img_str[0:80]}...")
-
-                image_1 = Image.open(io.BytesIO(base64.decodebytes(bytes(base_64_img_str, "utf-8"))))
-
-                with tabs[n]:
-                    st.header(selected_style_presets[n])
-                    st.image(image_1, width=picture_width)
-
-            execution_time = round(time.time() - start_time, 2)
+        # Previews are queued first, so every preset has something to show within seconds. With the
+        # same seed, a preview has the same composition as the full render that replaces it.
+        tasks = [(preset, steps) for preset in selected_style_presets]
+        if show_previews and steps > PREVIEW_STEPS:
+            tasks = [(preset, PREVIEW_STEPS) for preset in selected_style_presets] + tasks
+        # Generation runs as a background job, so it carries on through reruns and reconnects
+        job_id = jobs.submit(
+            partial(generate_image, prompt=prompt, cfg_scale=cfg_scale, seed=seed),
+            tasks,
+            params={"steps": steps, "prompt": prompt},
+            kind="text_to_image",
+        )
+        st.session_state["text_to_image_job"] = job_id
+        session_store.put(sid, "text_to_image_job", job_id)
+        st.query_params["t2i_job"] = job_id
+
+job_id = st.session_state.get("text_to_image_job") or st.query_params.get("t2i_job") or session_store.get(sid, "text_to_image_job")
+job = jobs.get(job_id, kind="text_to_image") if job_id else None
+
+show_gallery()
+
+if job is not None:
+    full_steps = job.params["steps"]
+    presets = list(dict.fromkeys(preset for preset, _ in job.items))
+    # Presets in the order their first image came in, then the ones still waiting
+    order = list(dict.fromkeys(job.items[n][0] for n in list(job.completion_order)))
+    order += [preset for preset in presets if preset not in order]
+    renders = {(preset, task_steps): outcome for (preset, task_steps), outcome in zip(job.items, job.results)}
+
+    failures = 0
+    finished = 0
+    columns = st.columns(GRID_COLUMNS)
+    for n, preset in enumerate(order):
+        with columns[n % GRID_COLUMNS]:
+            st.subheader(preset)
+            outcome = renders.get((preset, full_steps))
+            preview = renders.get((preset, PREVIEW_STEPS)) if full_steps != PREVIEW_STEPS else None
+            if outcome is not None and outcome.error is None:
+                finished += 1
+                image_key, cached = outcome.result
+                show_image(image_key, preset, job.id)
+                st.caption("Cached" if cached else f"Generated in {round(outcome.elapsed, 2)} seconds")
+                if gallery.add(image_key, f"{preset}: {job.params['prompt']}"):
+                    session_store.put(sid, "image_gallery", gallery.to_list())
+            elif outcome is not None:
+                finished += 1
+                failures += 1
+                st.error(f"Generation failed: {outcome.error}")
+            elif preview is not None and preview.error is None:
+                try:
+                    st.image(store.thumbnail(preview.result[0], picture_width), width=picture_width)
+                    st.caption(f"Preview ({PREVIEW_STEPS} steps), full render in progress...")
+                except KeyError:
+                    st.info("Wait for it...")
+            else:
+                st.info("Wait for it...")
+
+    if not job.done:
+        st.caption(f"{finished} of {len(presets)} presets done...")
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+
+    execution_time = round(job.elapsed, 2)
+
+    if job.error is not None:
+        st.error(f"Job failed: {job.error}")
+    elif failures:
+        st.warning(f"Done, but {failures} of {len(presets)} presets failed.")
+    else:
+        st.success("Done!")
+    st.caption(f"Execution time: {execution_time} seconds")
 
-            st.success("Done!")
-            st.caption(f"Execution time: {execution_time} seconds")
\ No newline at end of file
+page_timer.finish()
@@ -1,16 +1,21 @@
 import streamlit as st
-import json
 import os
 import sys
-import base64
-import io
 import time
+from functools import partial
 
-from PIL import Image
 st.set_page_config(
     page_title="Image to Image",
     layout="wide",
 )
+
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
 style_presets = ["3d-model", 
                  "analog-film",
                  "anime", 
@@ -42,25 +47,30 @@ seed = st.sidebar.number_input('seed:', min_value=0, max_value=4294967295, value
 
 c1, c2 = st.columns([1, 8])
 with c1:
-    st.image("./imgs/bedrock.png", width=100)
+    st.image(logo(), width=100)
 
 with c2:
     st.header("Image to Image generation")
     st.caption("Using Stable Diffusion in Bedrock")
 
-module_path = ".."
-sys.path.append(os.path.abspath(module_path))
-from utils import bedrock, print_ww
+from utils.image_codec import prepare_init_image
+from utils.image_preprocess import RESAMPLING_FILTERS
+from utils.image_store import Gallery, get_image_store
+from utils.jobs import get_job_backend
+from utils.metrics import PageTimer
+from utils.models import get_default_client, invoke, prepare_request
+from utils.session_store import get_session_store, session_id
+
+page_timer = PageTimer("Image to image")
 
 # ---- ⚠️ Un-comment and edit the below lines as needed for your AWS setup ⚠️ ----
 # os.environ["AWS_DEFAULT_REGION"] = "<REGION_NAME>"  # E.g. "us-east-1"
 # os.environ["AWS_PROFILE"] = "<YOUR_PROFILE>"
 # os.environ["BEDROCK_ASSUME_ROLE"] = "<YOUR_ROLE_ARN>"  # E.g. "arn:aws:..."
 
-boto3_bedrock = bedrock.get_bedrock_client(
-    assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
-    region=os.environ.get("AWS_DEFAULT_REGION", None)
-)
+boto3_bedrock = get_default_client()
+
+modelId = "stability.stable-diffusion-xl-v1"
 
 negative_prompts = [
     "poorly rendered",
@@ -69,22 +79,93 @@ negative_prompts = [
     "disfigured mountain features",
 ]
 
-def image_to_base64(img) -> str:
-    """Convert a PIL Image or local image file path to a base64 string for Amazon Bedrock"""
-    if isinstance(img, str):
-        if os.path.isfile(img):
-            print(f"Reading image from file: {img}")
-            with open(img, "rb") as f:
-                return base64.b64encode(f.read()).decode("utf-8")
-        else:
-            raise FileNotFoundError(f"File {img} does not exist")
-    elif isinstance(img, Image.Image):
-        print("Converting PIL Image to base64 string")
-        buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
-    else:
-        raise ValueError(f"Expected str (filename) or PIL Image. Got {type(img)}")
+# Seconds between checks of a running generation job
+POLL_INTERVAL = 1
+EXPIRED_IMAGE_MESSAGE = "This image has expired from the image store. Generate it again to see it."
+# Width (px) of the gallery thumbnails in the sidebar
+GALLERY_WIDTH = 128
+
+jobs = get_job_backend()
+store = get_image_store()
+# Job IDs and the gallery are also kept in the session store, to survive reconnecting to another task
+session_store = get_session_store()
+sid = session_id(st.session_state, st.query_params)
+# Shared by the text-to-image and image-to-image pages; only holds image keys
+if "image_gallery" not in st.session_state:
+    st.session_state.image_gallery = Gallery.from_list(session_store.get(sid, "image_gallery", []))
+gallery = st.session_state.image_gallery
+
+def generate_image(style_preset, prompt, cfg_scale, seed, steps, init_image_b64):
+    """Generate one image with Stable Diffusion XL for the given style preset, returning (image store key, cached)"""
+    # Serialized once per set of parameters; the (large) base64 init image is spliced in as it is
+    request = prepare_request(
+        modelId,
+        fields=["prompt", "style_preset"],
+        raw_fields=["init_image"],
+        negative_prompts=negative_prompts,
+        cfg_scale=cfg_scale,
+        seed=seed,
+        steps=steps,
+    )
+    result = invoke(
+        modelId,
+        client=boto3_bedrock,
+        request=request,
+        prompt=prompt,
+        style_preset=style_preset,
+        init_image=init_image_b64,
+    )
+    return store.put(result.output), result.cached
+
+def download_image_button(image_key, file_name, key):
+    """Download button for the full-resolution image, which is only read when clicked"""
+    def data():
+        # Streamlit ignores st.* calls here, so an image pruned since the page was shown gives an
+        # empty file rather than an error, and the rerun after the click shows the warning
+        try:
+            return store.full(image_key)
+        except KeyError:
+            return b""
+
+    def on_click():
+        if image_key not in store:
+            st.session_state[f"{key}-expired"] = True
+
+    st.download_button("Download", data=data, file_name=file_name, mime="image/png", key=key, on_click=on_click)
+    if st.session_state.pop(f"{key}-expired", False):
+        st.warning(EXPIRED_IMAGE_MESSAGE)
+
+def show_gallery():
+    """This session's past generations, as thumbnails in the sidebar"""
+    items = [item for item in gallery.items if item.key in store]
+    if items:
+        with st.sidebar.expander(f"Gallery ({len(items)} images)"):
+            for item in items:
+                try:
+                    st.image(store.thumbnail(item.key, GALLERY_WIDTH), caption=item.caption)
+                except KeyError:
+                    # Pruned from the store since the check above
+                    continue
+                download_image_button(item.key, f"{item.key[:16]}.png", f"gallery-{item.key}")
+
+def show_image(image_key, name, job_id):
+    """A generated image as a thumbnail, with the full resolution loaded only on demand"""
+    try:
+        st.image(store.thumbnail(image_key, picture_width), width=picture_width)
+    except KeyError:
+        # Older images are deleted as the image store fills up, even if a job or gallery still lists them
+        st.warning(EXPIRED_IMAGE_MESSAGE)
+        return
+    if st.toggle("Full resolution", key=f"full-{job_id}-{name}"):
+        try:
+            st.image(store.full(image_key))
+        except KeyError:
+            st.warning(EXPIRED_IMAGE_MESSAGE)
+            return
+    download_image_button(image_key, f"{name}.png", f"download-{job_id}-{name}")
+
+resample = st.sidebar.selectbox('resampling filter:', list(RESAMPLING_FILTERS))
+show_gallery()
 
 col1, col2 = st.columns(2)
 
@@ -92,30 +173,15 @@ with col1:
    uploaded_file = st.file_uploader("Upload an image", type=["png", "jpg", "jpeg"])
 
 if uploaded_file is not None:
-    image = Image.open(uploaded_file)
+    try:
+        source_png, init_image_b64 = prepare_init_image(uploaded_file.getvalue(), resample=resample)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
 
     with col2:
-        image_width, image_height = image.size     
-
-        if image_width > image_height:
-            crop_delta = int(round((image_width - image_height) / 2))
-            box = (crop_delta,0,(image_width-crop_delta),image_height)
-            new_image = image.crop(box)
-            image = new_image
-        elif image_height > image_width:
-            crop_delta = int(round((image_height - image_width) / 2))
-            box = (0,crop_delta,image_width,(image_height-crop_delta))
-            new_image = image.crop(box)
-            image = new_image
-
-        #resize image to 512px x 512px
-        image = image.resize((512, 512))
-
         st.write("Source image")
-        st.image(image, width=100) # Display source image
-
-    init_image_b64 = image_to_base64(image)
-    #st.write(init_image_b64[:80] + "...")    
+        st.image(source_png, width=100) # Display source image
 
     prompt = st.text_area("Prompt:", "high quality, with a dynamic and engaging background")
 
@@ -126,43 +192,52 @@ if uploaded_file is not None:
         if prompt == "" or num_presets == 0:        
             st.error("Please enter a valid prompt and select presets...")
         else:
-            with st.spinner("Wait for it..."):
-                
-                start_time = time.time()
-
-                tabs = st.tabs(selected_style_presets)
-
-                x = range(num_presets)
-
-                for n in x:
-
-                    request = json.dumps({
-                        "text_prompts": (
-                            [{"text": prompt, "weight": 1.0}]
-                            + [{"text": negprompt, "weight": -1.0} for negprompt in negative_prompts]
-                        ),
-                        "cfg_scale": cfg_scale,
-                        "seed": seed,
-                        "steps": steps,
-                        "style_preset": selected_style_presets[n],
-                        "init_image": init_image_b64,
-                    })
-                    modelId = "stability.stable-diffusion-xl-v1"
-
-                    response = boto3_bedrock.invoke_model(body=request, modelId=modelId)
-                    response_body = json.loads(response.get("body").read())
-
-                    print(response_body["result"])
-                    base_64_img_str = response_body["artifacts"][0].get("base64")
-                    print(f"{base_64_img_str[0:80]}...")
-
-                    image_1 = Image.open(io.BytesIO(base64.decodebytes(bytes(base_64_img_str, "utf-8"))))
-
-                    with tabs[n]:
-                        st.header(selected_style_presets[n])
-                        st.image(image_1, width=picture_width)
-
-                execution_time = round(time.time() - start_time, 2)
+            # Generation runs as a background job, so it carries on through reruns and reconnects
+            job_id = jobs.submit(
+                partial(generate_image, prompt=prompt, cfg_scale=cfg_scale, seed=seed, steps=steps, init_image_b64=init_image_b64),
+                selected_style_presets,
+                params={"prompt": prompt},
+                kind="image_to_image",
+            )
+            st.session_state["image_to_image_job"] = job_id
+            session_store.put(sid, "image_to_image_job", job_id)
+            st.query_params["i2i_job"] = job_id
+
+    job_id = st.session_state.get("image_to_image_job") or st.query_params.get("i2i_job") or session_store.get(sid, "image_to_image_job")
+    job = jobs.get(job_id, kind="image_to_image") if job_id else None
+
+    if job is not None:
+        tabs = st.tabs(job.items)
+
+        failures = 0
+        for n, outcome in enumerate(job.results):
+            with tabs[n]:
+                st.header(job.items[n])
+                if outcome is None:
+                    st.info("Wait for it...")
+                elif outcome.error is None:
+                    image_key, cached = outcome.result
+                    show_image(image_key, job.items[n], job.id)
+                    st.caption("Cached" if cached else f"Generated in {round(outcome.elapsed, 2)} seconds")
+                    if gallery.add(image_key, f"{job.items[n]}: {job.params['prompt']}"):
+                        session_store.put(sid, "image_gallery", gallery.to_list())
+                else:
+                    failures += 1
+                    st.error(f"Generation failed: {outcome.error}")
+
+        if not job.done:
+            st.caption(f"{job.completed} of {len(job.items)} presets done...")
+            time.sleep(POLL_INTERVAL)
+            st.rerun()
+
+        execution_time = round(job.elapsed, 2)
+
+        if job.error is not None:
+            st.error(f"Job failed: {job.error}")
+        elif failures:
+            st.warning(f"Done, but {failures} of {len(job.items)} presets failed.")
+        else:
+            st.success("Done!")
+        st.caption(f"Execution time: {execution_time} seconds")
 
-                st.success("Done!")
-                st.caption(f"Execution time: {execution_time} seconds")   
\ No newline at end of file
+page_timer.finish()
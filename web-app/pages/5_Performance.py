@@ -0,0 +1,86 @@
+import streamlit as st
+import os
+import sys
+
+st.set_page_config(
+    page_title="Performance",
+    layout="wide",
+)
+
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
+c1, c2 = st.columns([1, 8])
+with c1:
+    st.image(logo(), width=100)
+
+with c2:
+    st.header("Performance")
+    st.caption("Latency and throughput of this application instance")
+
+from utils.metrics import get_metrics
+from utils.throttling import governor_states
+
+metrics = get_metrics()
+
+
+def percentile_rows(name, label_title):
+    """Table rows of count and p50/p95/p99 (in seconds) for a timing metric"""
+    return [
+        {label_title: label, "count": values["count"], **{q: round(values[q], 3) for q in ("p50", "p95", "p99")}}
+        for label, values in sorted(metrics.summary(name).items())
+    ]
+
+
+st.subheader("Bedrock latency by model (seconds)")
+rows = percentile_rows("bedrock_latency_seconds", "model")
+if rows:
+    st.dataframe(rows)
+else:
+    st.info("No Bedrock calls yet. Try one of the demos!")
+
+st.subheader("Time to first byte by model (seconds)")
+rows = percentile_rows("bedrock_ttfb_seconds", "model")
+if rows:
+    st.dataframe(rows)
+
+st.subheader("Totals by model")
+totals = {}
+for name, title in [
+    ("bedrock_requests_total", "requests"),
+    ("bedrock_cache_hits_total", "cache hits"),
+    ("bedrock_errors_total", "errors"),
+    ("bedrock_retries_total", "retries"),
+    ("bedrock_throttles_total", "throttles"),
+    ("semantic_cache_hits_total", "semantic cache hits"),
+    ("semantic_cache_misses_total", "semantic cache misses"),
+    ("bedrock_input_tokens_total", "input tokens"),
+    ("bedrock_output_tokens_total", "output tokens"),
+    ("bedrock_request_bytes_total", "request bytes"),
+    ("bedrock_response_bytes_total", "response bytes"),
+]:
+    for model, value in metrics.counters(name).items():
+        totals.setdefault(model, {"model": model})[title] = int(value)
+if totals:
+    st.dataframe(list(totals.values()))
+
+st.subheader("Request governors by model")
+st.caption("Shared by all sessions in this instance; limits drop when Bedrock throttles and recover gradually")
+states = governor_states()
+if states:
+    st.dataframe(states)
+
+st.subheader("Page render time (seconds)")
+rows = percentile_rows("page_render_seconds", "page")
+if rows:
+    st.dataframe(rows)
+
+with st.expander("Prometheus metrics"):
+    st.code(metrics.render_prometheus(), language="text")
+
+if st.button("Refresh"):
+    st.rerun()
@@ -0,0 +1,148 @@
+import streamlit as st
+import os
+import sys
+import time
+from contextlib import closing
+from functools import partial
+
+
+st.set_page_config(
+    page_title="Model Comparison",
+    layout="wide",
+)
+
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
+c1, c2 = st.columns([1, 8])
+with c1:
+    st.image(logo(), width=100)
+
+with c2:
+    st.header("Model comparison")
+    st.caption("The same prompt, sent to several text models in Bedrock at once")
+
+from utils.fan_out import merge_streams
+from utils.metrics import PageTimer
+from utils.models import get_default_client, invoke_stream
+from utils.pricing import estimate_cost
+from utils.streaming import StreamStats
+from utils.summarize import estimate_tokens
+
+page_timer = PageTimer("Model comparison")
+
+# ---- ⚠️ Un-comment and edit the below lines as needed for your AWS setup ⚠️ ----
+# os.environ["AWS_DEFAULT_REGION"] = "<REGION_NAME>"  # E.g. "us-east-1"
+# os.environ["AWS_PROFILE"] = "<YOUR_PROFILE>"
+# os.environ["BEDROCK_ASSUME_ROLE"] = "<YOUR_ROLE_ARN>"  # E.g. "arn:aws:..."
+
+boto3_bedrock = get_default_client()
+
+model_ids = ["anthropic.claude-v2",
+             "anthropic.claude-v2:1",
+             "anthropic.claude-instant-v1",
+             "amazon.titan-text-express-v1",
+             "amazon.titan-text-lite-v1",
+             "meta.llama2-13b-chat-v1",
+             "meta.llama2-70b-chat-v1",
+             "cohere.command-text-v14",
+             "cohere.command-light-text-v14"]
+
+selected_models = st.sidebar.multiselect(
+    "Models to compare (maximum 4):",
+    model_ids,
+    ["anthropic.claude-v2", "anthropic.claude-instant-v1", "amazon.titan-text-express-v1"],
+    max_selections=4)
+
+sample_instruction = """Write an email from Bob, Customer Service Manager, to the customer "John Doe" that provided negative feedback on the service provided by our customer support engineer."""
+
+
+instruction = st.text_area("Prompt:", sample_instruction, height=100)
+
+
+# Models with a lower limit than this (e.g. Llama 2) are capped by their provider adapter
+max_tokens_to_sample = st.sidebar.slider("max_tokens_to_sample:", min_value=500, max_value=4096, value=2048)
+temperature = st.sidebar.slider("temperature:", min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+top_k = st.sidebar.slider('top_k:', min_value=10, max_value=500, value=250, step=10)
+top_p = st.sidebar.slider('top_p:', min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+
+
+if st.button("Generate Responses", key=instruction):
+    if instruction == "":
+        st.error("Please enter a prompt...")
+    elif not selected_models:
+        st.error("Please select at least one model...")
+    else:
+        with st.spinner("Wait for it..."):
+
+            start_time = time.time()
+            columns = st.columns(len(selected_models))
+            placeholders, captions = [], []
+            for model_id, column in zip(selected_models, columns):
+                with column:
+                    st.subheader(model_id)
+                    placeholders.append(st.empty())
+                    captions.append(st.empty())
+
+            stats = [StreamStats() for _ in selected_models]
+            responses = [""] * len(selected_models)
+            events = merge_streams([
+                partial(
+                    invoke_stream,
+                    model_id,
+                    client=boto3_bedrock,
+                    stats=model_stats,
+                    prompt=instruction,
+                    max_tokens=max_tokens_to_sample,
+                    temperature=temperature,
+                    top_k=top_k,
+                    top_p=top_p,
+                )
+                for model_id, model_stats in zip(selected_models, stats)
+            ])
+            rows = []
+            with closing(events):
+                for event in events:
+                    n = event.index
+                    if event.chunk is not None:
+                        responses[n] += event.chunk
+                        placeholders[n].markdown(responses[n])
+                        continue
+                    if event.error is not None:
+                        placeholders[n].error(f"{type(event.error).__name__}: {event.error}")
+                        continue
+
+                    # Cached responses don't report token counts, so fall back to an estimate
+                    input_tokens = stats[n].input_tokens or estimate_tokens(instruction)
+                    output_tokens = stats[n].output_tokens or estimate_tokens(responses[n])
+                    latency = (stats[n].end_time or time.time()) - stats[n].start_time
+                    # Nothing is billed for a response served from a cache
+                    cost = 0.0 if stats[n].cached else estimate_cost(selected_models[n], input_tokens, output_tokens)
+                    captions[n].caption(f"Execution time: {round(latency, 2)} seconds | {stats[n].caption()}")
+                    rows.append({
+                        "model": selected_models[n],
+                        "cached": stats[n].cached,
+                        "latency (s)": round(latency, 2),
+                        "time to first token (s)": (
+                            round(stats[n].time_to_first_token, 2) if stats[n].time_to_first_token is not None else None
+                        ),
+                        "tokens/sec": round(stats[n].tokens_per_second, 1) if stats[n].tokens_per_second else None,
+                        "input tokens": input_tokens,
+                        "output tokens": output_tokens,
+                        "estimated cost ($)": round(cost, 5) if cost is not None else None,
+                    })
+
+            execution_time = round(time.time() - start_time, 2)
+
+            st.success("Done!")
+            st.caption(
+                f"Execution time: {execution_time} seconds for all models "
+                f"(vs {round(sum(row['latency (s)'] for row in rows), 2)} seconds one after the other)"
+            )
+            st.dataframe(sorted(rows, key=lambda row: row["latency (s)"]), hide_index=True)
+
+page_timer.finish()
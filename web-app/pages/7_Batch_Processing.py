@@ -0,0 +1,145 @@
+import streamlit as st
+import os
+import sys
+import time
+from functools import partial
+
+
+st.set_page_config(
+    page_title="Batch Processing",
+    layout="wide",
+)
+
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
+c1, c2 = st.columns([1, 8])
+with c1:
+    st.image(logo(), width=100)
+
+with c2:
+    st.header("Batch processing")
+    st.caption("Run a whole file of prompts or texts through Claude in Bedrock")
+
+from utils.batch import batch_id, get_batch, read_rows, start_batch
+from utils.metrics import PageTimer
+from utils.models import get_default_client, invoke
+from utils.summarize import CHUNK_SUMMARY_PROMPT, INSTRUCTION_PROMPT, map_reduce
+
+page_timer = PageTimer("Batch processing")
+
+# ---- ⚠️ Un-comment and edit the below lines as needed for your AWS setup ⚠️ ----
+# os.environ["AWS_DEFAULT_REGION"] = "<REGION_NAME>"  # E.g. "us-east-1"
+# os.environ["AWS_PROFILE"] = "<YOUR_PROFILE>"
+# os.environ["BEDROCK_ASSUME_ROLE"] = "<YOUR_ROLE_ARN>"  # E.g. "arn:aws:..."
+
+boto3_bedrock = get_default_client()
+
+modelId = 'anthropic.claude-v2' # change this to use a different version from the model provider
+
+POLL_INTERVAL = 1  # seconds between progress refreshes while a batch runs
+
+task = st.sidebar.radio("Task:", ["Text generation", "Summarization"], horizontal=True)
+max_tokens_to_sample = st.sidebar.slider("max_tokens_to_sample:", min_value=500, max_value=4096, value=1000)
+temperature = st.sidebar.slider("temperature:", min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+top_k = st.sidebar.slider('top_k:', min_value=10, max_value=500, value=250, step=10)
+top_p = st.sidebar.slider('top_p:', min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+max_concurrency = st.sidebar.slider("max concurrency:", min_value=1, max_value=32, value=8, step=1)
+
+
+def generate(row, column, **params):
+    """Text generation: the row's prompt, as is"""
+    # Throttling is left to the batch's adaptive limit rather than retried here
+    return invoke(modelId, client=boto3_bedrock, max_retries=0, prompt=row[column], **params)
+
+
+def summarize(row, column, instruction, **params):
+    """Summarization: long texts are condensed chunk by chunk first, as on the summarization page"""
+    def summarize_chunk(chunk):
+        result = invoke(
+            modelId,
+            client=boto3_bedrock,
+            max_retries=0,
+            prompt=CHUNK_SUMMARY_PROMPT.render(text=chunk),
+            **{**params, "max_tokens": 1000},
+        )
+        return result.output.strip()
+
+    text = map_reduce([row[column]], summarize_chunk, max_concurrency=1)
+    return invoke(modelId, client=boto3_bedrock, max_retries=0, prompt=INSTRUCTION_PROMPT.render(instruction=instruction, text=text), **params)
+
+
+uploaded_file = st.file_uploader("Upload a CSV (with a header row) or JSONL file", type=["csv", "jsonl"])
+
+if uploaded_file is not None:
+    data = uploaded_file.getvalue()
+    try:
+        rows = read_rows(data, uploaded_file.name)
+    except ValueError as e:
+        st.error(f"Could not read {uploaded_file.name}: {e}")
+        st.stop()
+    columns = list(rows[0]) if rows else []
+    if not columns:
+        st.error("The file has no rows...")
+        st.stop()
+
+    column = st.selectbox(
+        "Column with the prompts:" if task == "Text generation" else "Column with the texts to summarize:",
+        columns,
+        index=columns.index("prompt") if "prompt" in columns else 0,
+    )
+    instruction = ""
+    if task == "Summarization":
+        instruction = st.text_area("Instruction:", "Please provide a summary of the following text.")
+    st.caption(f"{len(rows)} rows")
+
+    params = dict(
+        max_tokens=max_tokens_to_sample,
+        temperature=temperature,
+        top_k=top_k,
+        top_p=top_p,
+        stop_sequences=[],
+    )
+    # The same file and settings always map to the same batch, so starting it again resumes it
+    id = batch_id(data, {"task": task, "column": column, "instruction": instruction, "model": modelId, **params})
+
+    if st.button("Start batch" if get_batch(id) is None else "Resume batch", key=id):
+        if task == "Text generation":
+            fn = partial(generate, column=column, **params)
+        else:
+            fn = partial(summarize, column=column, instruction=instruction, **params)
+        start_batch(id, rows, fn, max_concurrency=max_concurrency)
+        st.session_state["batch"] = id
+        st.query_params["batch"] = id
+
+# Pick up a batch started earlier in this session, or (after a reconnect) from the URL
+current_id = st.session_state.get("batch") or st.query_params.get("batch")
+batch = get_batch(current_id) if current_id else None
+
+if batch is not None:
+    st.progress(batch.completed / max(batch.total, 1), text=f"{batch.completed}/{batch.total} rows ({batch.status})")
+    m1, m2, m3, m4, m5 = st.columns(5)
+    m1.metric("Succeeded", batch.resumed + batch.succeeded, help="Including rows checkpointed by earlier runs")
+    m2.metric("Failed", batch.failed)
+    m3.metric("Rows/min", round(batch.throughput * 60, 1) if batch.throughput else "-")
+    m4.metric("Concurrency limit", f"{batch.limiter.limit} ({batch.limiter.in_flight} in flight)")
+    m5.metric("Throttled", batch.limiter.throttles)
+    if batch.error is not None:
+        st.error(f"Batch failed: {batch.error}")
+
+    # Results are only read (and converted) when a download is clicked, not on every progress refresh
+    d1, d2, d3 = st.columns([1, 1, 4])
+    d1.download_button("Download JSONL", batch.results, file_name=f"batch-{batch.id[:8]}.jsonl", mime="application/jsonl")
+    d2.download_button("Download CSV", batch.results_csv, file_name=f"batch-{batch.id[:8]}.csv", mime="text/csv")
+    if not batch.done and d3.button("Stop batch"):
+        batch.stop()
+
+    if not batch.done:
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+
+page_timer.finish()
@@ -0,0 +1,126 @@
+import streamlit as st
+import os
+import sys
+import time
+from contextlib import closing
+
+
+st.set_page_config(
+    page_title="Chat with Documents",
+    layout="wide",
+)
+
+module_path = os.path.abspath("..")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+from utils.warmup import logo, warm_up
+
+warm_up()
+
+c1, c2 = st.columns([1, 8])
+with c1:
+    st.image(logo(), width=100)
+
+with c2:
+    st.header("Chat with documents")
+    st.caption("Answer questions from your PDFs, using Claude in Bedrock")
+
+from utils.metrics import PageTimer
+from utils.models import get_default_client, invoke_stream
+from utils.rag import ANSWER_PROMPT, DEFAULT_CHUNK_TOKENS, get_document_index
+from utils.streaming import StreamStats
+from utils.summarize import iter_pdf_pages
+
+page_timer = PageTimer("Chat with documents")
+
+# ---- ⚠️ Un-comment and edit the below lines as needed for your AWS setup ⚠️ ----
+# os.environ["AWS_DEFAULT_REGION"] = "<REGION_NAME>"  # E.g. "us-east-1"
+# os.environ["AWS_PROFILE"] = "<YOUR_PROFILE>"
+# os.environ["BEDROCK_ASSUME_ROLE"] = "<YOUR_ROLE_ARN>"  # E.g. "arn:aws:..."
+
+boto3_bedrock = get_default_client()
+
+modelId = 'anthropic.claude-v2' # change this to use a different version from the model provider
+
+collection = st.sidebar.text_input("Collection:", "default", help="Documents are indexed and searched per collection")
+max_tokens_to_sample = st.sidebar.slider("max_tokens_to_sample:", min_value=500, max_value=4096, value=1000)
+temperature = st.sidebar.slider("temperature:", min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+top_k = st.sidebar.slider('top_k:', min_value=10, max_value=500, value=250, step=10)
+top_p = st.sidebar.slider('top_p:', min_value=0.0, max_value=1.0, value=0.5, step=0.1)
+chunks_to_retrieve = st.sidebar.slider("chunks to retrieve:", min_value=1, max_value=10, value=4, step=1)
+chunk_tokens = st.sidebar.slider("chunk size (tokens):", min_value=100, max_value=1000, value=DEFAULT_CHUNK_TOKENS, step=50)
+
+index = get_document_index(collection)
+# Embedding is shared with every session (see utils/embedding_service.py), so its concurrency is set
+# for the whole task rather than per page
+st.sidebar.caption(
+    f"Indexing embeds up to {index.embedder.max_concurrency} batches at once, shared with all sessions "
+    "(EMBEDDING_MAX_CONCURRENCY)"
+)
+
+uploaded_pdfs = st.file_uploader("Add PDFs to the collection", type=["pdf"], accept_multiple_files=True)
+if uploaded_pdfs and st.button("Index documents"):
+    for uploaded_pdf in uploaded_pdfs:
+        progress = st.progress(0.0, text=f"Indexing {uploaded_pdf.name}...")
+
+        def on_progress(done, submitted):
+            progress.progress(done / submitted if submitted else 0.0, text=f"Indexing {uploaded_pdf.name}: {done}/{submitted} chunks embedded")
+
+        stats = index.add_document(
+            uploaded_pdf.name,
+            iter_pdf_pages(uploaded_pdf),
+            chunk_tokens=chunk_tokens,
+            on_progress=on_progress,
+        )
+        progress.empty()
+        st.caption(
+            f"{uploaded_pdf.name}: {stats.new_pages} of {stats.pages} pages new or changed, "
+            f"{stats.chunks} chunks indexed in {round(stats.seconds, 2)} seconds"
+        )
+
+documents = index.documents()
+if documents:
+    st.caption(f"{len(index)} chunks from: " + ", ".join(f"{name} ({pages} pages)" for name, pages in documents.items()))
+else:
+    st.info("No documents in this collection yet. Upload some PDFs to get started.")
+
+question = st.text_input("Question:")
+
+if st.button("Ask", disabled=not documents):
+    if question == "":
+        st.error("Please enter a valid question...")
+    else:
+        hits, timings = index.search(question, k=chunks_to_retrieve)
+        context = "\n\n".join(
+            f'<document name="{hit.chunk.document}" page="{hit.chunk.page}">\n{hit.chunk.text}\n</document>' for hit in hits
+        )
+        prompt = ANSWER_PROMPT.render(context=context, question=question)
+
+        stats = StreamStats()
+        placeholder = st.empty()
+        completion = ""
+        chunks = invoke_stream(
+            modelId,
+            client=boto3_bedrock,
+            stats=stats,
+            prompt=prompt,
+            max_tokens=max_tokens_to_sample,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            stop_sequences=[],
+        )
+        with closing(chunks):
+            for chunk in chunks:
+                completion += chunk
+                placeholder.markdown(completion)
+        timings["generate"] = time.time() - stats.start_time
+
+        st.caption(" | ".join(f"{stage}: {round(seconds * 1000)} ms" for stage, seconds in timings.items()))
+        st.caption(stats.caption())
+        with st.expander("Sources"):
+            for hit in hits:
+                st.markdown(f"**{hit.chunk.document}**, page {hit.chunk.page} (similarity {hit.score:.2f})")
+                st.text(hit.chunk.text)
+
+page_timer.finish()
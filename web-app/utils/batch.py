@@ -0,0 +1,292 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Resumable batch processing of uploaded prompt files
+
+A batch runs one function over every row of a CSV or JSONL file, in the background, with a
+concurrency limit that backs off when Bedrock throttles. Each finished row is appended straight
+away to a JSONL results file, which is at once:
+
+- the checkpoint: starting the same batch again (same input and parameters, so the same ID)
+  skips the rows already in the file, even after a restart of the task, and
+- the output, which pages can offer for download while the batch is still running.
+"""
+# Python Built-Ins:
+from collections import deque
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Local Dependencies:
+from .task_protection import get_task_protection
+from .throttling import AdaptiveConcurrency, is_throttling_error
+
+
+DEFAULT_OUTPUT_DIR = os.environ.get("BATCH_OUTPUT_DIR") or os.path.join(tempfile.gettempdir(), "bedrock-batches")
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", 8))
+# Longest pause before retrying a throttled row
+MAX_BACKOFF = 30.0
+# Fields added to each input row in the results: input files can't have columns with these names
+RESULT_FIELDS = ("row", "output", "error")
+
+
+def read_rows(data: bytes, filename: str) -> List[dict]:
+    """Parse an uploaded CSV (with a header row) or JSONL (one object per line) file into rows
+
+    Raises `ValueError` if the file can't be parsed, or has columns named like `RESULT_FIELDS`.
+    """
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith((".jsonl", ".json", ".ndjson")):
+        rows = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {line_number} is not a JSON object")
+            rows.append(row)
+    else:
+        # No field can be longer than the file, and a prompt column may hold whole documents
+        # (the csv module's default limit is 128 KiB per field). Only ever raised: it's per process
+        csv.field_size_limit(max(csv.field_size_limit(), len(text)))
+        try:
+            rows = list(csv.DictReader(io.StringIO(text)))
+        except csv.Error as e:
+            raise ValueError(f"Invalid CSV: {e}") from e
+    reserved = sorted({field for row in rows for field in RESULT_FIELDS if field in row})
+    if reserved:
+        raise ValueError(
+            f"Column names {', '.join(reserved)} are used for the results; rename them in the file"
+        )
+    return rows
+
+
+def batch_id(data: bytes, params: dict) -> str:
+    """Stable ID of a batch: the same input and parameters always give the same ID"""
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class Batch:
+    """One run of `fn` over `rows`, writing results to `output_path`
+
+    Use `start_batch` rather than creating these directly.
+    """
+
+    def __init__(
+        self,
+        id: str,
+        rows: List[dict],
+        fn: Callable[[dict], Any],
+        output_path: str,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        self.id = id
+        self.rows = rows
+        self.fn = fn
+        self.output_path = output_path
+        self.max_concurrency = max_concurrency
+        self.limiter = AdaptiveConcurrency(initial=min(4, max_concurrency), maximum=max_concurrency)
+        self.status = "queued"
+        self.error: Optional[BaseException] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.resumed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def total(self) -> int:
+        return len(self.rows)
+
+    @property
+    def completed(self) -> int:
+        """Rows finished so far, including ones finished by earlier runs of this batch"""
+        return self.resumed + self.succeeded + self.failed
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed", "stopped")
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Rows finished per second by this run"""
+        if not self.elapsed:
+            return None
+        return (self.succeeded + self.failed) / self.elapsed
+
+    def _checkpointed(self) -> set:
+        """Indexes of rows already processed successfully, according to the results file"""
+        done = set()
+        try:
+            with open(self.output_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash; that row will just be processed again
+                        continue
+                    if record.get("error") is None:
+                        done.add(record["row"])
+        except FileNotFoundError:
+            pass
+        return done
+
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _next_row(self) -> Optional[int]:
+        with self._lock:
+            return self._pending.popleft() if self._pending else None
+
+    def _worker(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            index = self._next_row()
+            if index is None:
+                return
+            token = self.limiter.acquire()
+            throttled = False
+            try:
+                output = self.fn(self.rows[index])
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                if throttled:
+                    # Put the row back and wait before taking another, so the whole pool slows down
+                    with self._lock:
+                        self._pending.appendleft(index)
+                else:
+                    self._write({**self.rows[index], "row": index, "output": None, "error": f"{type(e).__name__}: {e}"})
+                    with self._lock:
+                        self.failed += 1
+            else:
+                # Requests that only succeeded after botocore's own retries are congestion too
+                throttled = getattr(output, "retries", 0) > 0
+                self._write({**self.rows[index], "row": index, "output": getattr(output, "output", output), "error": None})
+                with self._lock:
+                    self.succeeded += 1
+            finally:
+                self.limiter.release(token, throttled=throttled)
+
+            if throttled:
+                time.sleep(random.uniform(0, backoff))
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            else:
+                backoff = 1.0
+
+    def run(self):
+        """Process every row not already in the results file; blocks until done or stopped"""
+        self.status = "running"
+        self.started = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+            done = self._checkpointed()
+            self.resumed = len(done)
+            self._pending.extend(n for n in range(self.total) if n not in done)
+            workers = [
+                threading.Thread(target=self._worker, name=f"batch-{self.id[:8]}-{n}", daemon=True)
+                for n in range(self.max_concurrency)
+            ]
+            # Don't let the task be scaled in under a running batch (it can be resumed, but slowly)
+            with get_task_protection().hold():
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+            self.status = "stopped" if self._stop.is_set() else "done"
+        except BaseException as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            self.finished = time.time()
+
+    def stop(self):
+        """Stop taking new rows; rows already in flight are still written out"""
+        self._stop.set()
+
+    def results(self) -> bytes:
+        """The results file so far, as JSONL bytes"""
+        with self._lock:
+            try:
+                with open(self.output_path, "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return b""
+
+    def results_csv(self) -> bytes:
+        """The results so far, as CSV bytes (see `results_to_csv`)"""
+        return results_to_csv(self.results())
+
+
+def results_to_csv(results: bytes) -> bytes:
+    """Convert JSONL results (as from `Batch.results`) to CSV, in input row order"""
+    records = {}
+    for line in results.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        # A later successful retry of a row replaces its earlier failure
+        if record["row"] not in records or record.get("error") is None:
+            records[record["row"]] = record
+    fieldnames = []
+    for record in records.values():
+        fieldnames.extend(key for key in record if key not in fieldnames)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in sorted(records):
+        writer.writerow(records[row])
+    return buffer.getvalue().encode("utf-8")
+
+
+_batches: Dict[str, Batch] = {}
+_batches_lock = threading.Lock()
+
+
+def start_batch(
+    id: str,
+    rows: List[dict],
+    fn: Callable[[dict], Any],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+) -> Batch:
+    """Start (or resume) the batch `id` in the background and return it
+
+    If the batch is already running in this process, the running batch is returned instead of
+    starting another. `fn(row)` may return an `InvokeResult` (whose `output` is saved, and whose
+    retry count feeds the rate limiting) or any JSON-serializable value.
+    """
+    with _batches_lock:
+        batch = _batches.get(id)
+        if batch is not None and not batch.done:
+            return batch
+        batch = Batch(id, rows, fn, os.path.join(output_dir, f"{id}.jsonl"), max_concurrency=max_concurrency)
+        _batches[id] = batch
+    threading.Thread(target=batch.run, name=f"batch-{id[:8]}", daemon=True).start()
+    return batch
+
+
+def get_batch(id: str) -> Optional[Batch]:
+    """Look up a batch started in this process"""
+    with _batches_lock:
+        return _batches.get(id)
@@ -3,30 +3,61 @@
 """Helper utilities for working with Amazon Bedrock from Python notebooks"""
 # Python Built-Ins:
 import os
+import threading
 from typing import Optional
 
 # External Dependencies:
 import boto3
 from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
+from botocore.session import get_session
 
 
-def get_bedrock_client(
+# Default size of the HTTPS connection pool shared by every user of a cached client. Streamlit
+# serves each browser session from its own thread, so this bounds concurrent Bedrock calls per
+# client rather than per session.
+DEFAULT_MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", 50))
+# Kept low because throttled requests are queued and retried by the per-model governors in
+# `throttling`, which slow all sessions down together; botocore retrying each request on its own
+# as well only adds to the load while Bedrock is throttling.
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_ATTEMPTS", 3))
+
+_client_cache = {}
+_client_cache_lock = threading.Lock()
+
+
+def _assume_role_refresher(session: boto3.Session, assumed_role: str):
+    """Return a callable fetching fresh credentials for `assumed_role` in botocore metadata format"""
+    sts = session.client("sts")
+
+    def refresh():
+        print(f"  Refreshing credentials for role: {assumed_role}")
+        response = sts.assume_role(
+            RoleArn=str(assumed_role),
+            RoleSessionName="langchain-llm-1"
+        )
+        credentials = response["Credentials"]
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": credentials["Expiration"].isoformat(),
+        }
+
+    return refresh
+
+
+def create_bedrock_client(
     assumed_role: Optional[str] = None,
     region: Optional[str] = None,
     runtime: Optional[bool] = True,
+    max_pool_connections: Optional[int] = None,
 ):
-    """Create a boto3 client for Amazon Bedrock, with optional configuration overrides
+    """Create a new (uncached) boto3 client for Amazon Bedrock
 
-    Parameters
-    ----------
-    assumed_role :
-        Optional ARN of an AWS IAM role to assume for calling the Bedrock service. If not
-        specified, the current active credentials will be used.
-    region :
-        Optional name of the AWS Region in which the service should be called (e.g. "us-east-1").
-        If not specified, AWS_REGION or AWS_DEFAULT_REGION environment variable will be used.
-    runtime :
-        Optional choice of getting different client to perform operations with the Amazon Bedrock service.
+    Parameters are as for `get_bedrock_client`. When `assumed_role` is given, the client is built on
+    refreshable credentials, so botocore calls STS again shortly before the assumed-role session
+    expires instead of failing with an expired token.
     """
     if region is None:
         target_region = os.environ.get("AWS_REGION", os.environ.get("AWS_DEFAULT_REGION"))
@@ -35,7 +66,6 @@ def get_bedrock_client(
 
     print(f"Create new client\n  Using region: {target_region}")
     session_kwargs = {"region_name": target_region}
-    client_kwargs = {**session_kwargs}
 
     profile_name = os.environ.get("AWS_PROFILE")
     if profile_name:
@@ -45,35 +75,94 @@ def get_bedrock_client(
     retry_config = Config(
         region_name=target_region,
         retries={
-            "max_attempts": 10,
+            "max_attempts": DEFAULT_MAX_ATTEMPTS,
             "mode": "standard",
         },
+        max_pool_connections=max_pool_connections or DEFAULT_MAX_POOL_CONNECTIONS,
     )
     session = boto3.Session(**session_kwargs)
 
     if assumed_role:
         print(f"  Using role: {assumed_role}", end='')
-        sts = session.client("sts")
-        response = sts.assume_role(
-            RoleArn=str(assumed_role),
-            RoleSessionName="langchain-llm-1"
+        refresh = _assume_role_refresher(session, assumed_role)
+        botocore_session = get_session()
+        botocore_session._credentials = RefreshableCredentials.create_from_metadata(
+            metadata=refresh(),
+            refresh_using=refresh,
+            method="sts-assume-role",
         )
+        session = boto3.Session(botocore_session=botocore_session, region_name=target_region)
         print(" ... successful!")
-        client_kwargs["aws_access_key_id"] = response["Credentials"]["AccessKeyId"]
-        client_kwargs["aws_secret_access_key"] = response["Credentials"]["SecretAccessKey"]
-        client_kwargs["aws_session_token"] = response["Credentials"]["SessionToken"]
 
     if runtime:
         service_name='bedrock-runtime'
     else:
         service_name='bedrock'
 
+    # Lets the app be pointed at a local stand-in (see benchmarks/fake_bedrock_server.py)
+    endpoint_url = None
+    if runtime:
+        endpoint_url = os.environ.get("BEDROCK_ENDPOINT_URL") or None
+    if endpoint_url:
+        print(f"  Using endpoint: {endpoint_url}")
+
     bedrock_client = session.client(
         service_name=service_name,
+        region_name=target_region,
+        endpoint_url=endpoint_url,
         config=retry_config,
-        **client_kwargs
     )
 
     print("boto3 Bedrock client successfully created!")
     print(bedrock_client._endpoint)
     return bedrock_client
+
+
+def get_bedrock_client(
+    assumed_role: Optional[str] = None,
+    region: Optional[str] = None,
+    runtime: Optional[bool] = True,
+    max_pool_connections: Optional[int] = None,
+):
+    """Get a shared boto3 client for Amazon Bedrock, with optional configuration overrides
+
+    Clients are cached process-wide by (region, role, runtime, pool size), so Streamlit reruns and
+    concurrent browser sessions reuse the same client and its HTTPS connection pool instead of
+    creating a new session (and possibly an STS call) on every interaction. boto3 clients are
+    thread-safe, so sharing them between sessions is fine.
+
+    Parameters
+    ----------
+    assumed_role :
+        Optional ARN of an AWS IAM role to assume for calling the Bedrock service. If not
+        specified, the current active credentials will be used.
+    region :
+        Optional name of the AWS Region in which the service should be called (e.g. "us-east-1").
+        If not specified, AWS_REGION or AWS_DEFAULT_REGION environment variable will be used.
+    runtime :
+        Optional choice of getting different client to perform operations with the Amazon Bedrock service.
+    max_pool_connections :
+        Optional maximum number of pooled HTTPS connections for the client. Defaults to the
+        BEDROCK_MAX_POOL_CONNECTIONS environment variable, or 50.
+    """
+    if region is None:
+        region = os.environ.get("AWS_REGION", os.environ.get("AWS_DEFAULT_REGION"))
+    key = (region, assumed_role or None, bool(runtime), max_pool_connections or DEFAULT_MAX_POOL_CONNECTIONS)
+
+    with _client_cache_lock:
+        client = _client_cache.get(key)
+        if client is None:
+            client = create_bedrock_client(
+                assumed_role=assumed_role,
+                region=region,
+                runtime=runtime,
+                max_pool_connections=max_pool_connections,
+            )
+            _client_cache[key] = client
+    return client
+
+
+def clear_client_cache():
+    """Drop all cached Bedrock clients, so the next `get_bedrock_client` call creates new ones"""
+    with _client_cache_lock:
+        _client_cache.clear()
@@ -0,0 +1,277 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Multi-turn chat with bounded, token-aware conversation memory
+
+A `Conversation` keeps every exchange for display, but only sends the most recent ones to the
+model verbatim: once they add up to more than `history_tokens`, the oldest are folded into a
+rolling summary (written by the model itself, via `claude_summarizer`) that is sent in their place.
+Prompt size, and so latency and cost, stays roughly flat however long the conversation gets.
+
+Conversations live in Streamlit session state. `get_conversations()` tracks them all, to cap the
+memory each one holds and clear those left idle for longer than CHAT_IDLE_TTL_SECONDS.
+"""
+# Python Built-Ins:
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+import weakref
+
+# Local Dependencies:
+from .metrics import get_metrics
+from .summarize import estimate_tokens
+from .templates import PromptTemplate
+
+
+# Recent turns sent verbatim are kept under this many tokens (about half of it after a fold)
+DEFAULT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", 2000))
+DEFAULT_SUMMARY_TOKENS = int(os.environ.get("CHAT_SUMMARY_TOKENS", 400))
+# UTF-8 bytes of text held per conversation, including turns only kept for display. Kept under
+# session_store.MAX_VALUE_BYTES, with room for the JSON around the text
+DEFAULT_MAX_BYTES = int(os.environ.get("CHAT_MAX_SESSION_BYTES", 256 * 1024))
+DEFAULT_IDLE_TTL = float(os.environ.get("CHAT_IDLE_TTL_SECONDS", 1800))
+
+
+class Turn(NamedTuple):
+    role: str  # "Human" or "Assistant"
+    text: str
+    tokens: int
+
+
+# Writes an updated summary from the previous one (possibly empty) and the turns being folded in
+Summarizer = Callable[[str, List[Turn]], str]
+
+
+def _utf8_size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cut `text` down to about `max_tokens` tokens, at a word boundary"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    while words and estimate_tokens(" ".join(words)) > max_tokens:
+        words = words[: len(words) * 9 // 10]
+    return " ".join(words) + " ..."
+
+
+class Conversation:
+    """History of one chat session, and the prompts built from it
+
+    Parameters
+    ----------
+    history_tokens :
+        Most tokens of recent turns to send verbatim. When exceeded, the oldest exchanges are
+        folded into the summary until the rest fit in half of this, so summaries are written
+        every few exchanges rather than on every one.
+    summary_tokens :
+        Most tokens of rolling summary to send.
+    max_bytes :
+        Most bytes of text (UTF-8 encoded) to hold. The oldest turns already folded into the
+        summary are dropped (from display) beyond this.
+    """
+
+    def __init__(
+        self,
+        history_tokens: int = DEFAULT_HISTORY_TOKENS,
+        summary_tokens: int = DEFAULT_SUMMARY_TOKENS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.max_bytes = max_bytes
+        self.turns: List[Turn] = []
+        self.summary = ""
+        # Turns dropped from the start of `turns` to stay under `max_bytes`
+        self.dropped = 0
+        self.evicted = False
+        self.last_active = time.time()
+        # turns[:_summarized] are covered by the summary and no longer sent verbatim
+        self._summarized = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Bytes of text held, UTF-8 encoded"""
+        return _utf8_size(self.summary) + sum(_utf8_size(turn.text) for turn in self.turns)
+
+    @property
+    def history(self) -> List[Turn]:
+        """Turns sent verbatim with the next message"""
+        return self.turns[self._summarized:]
+
+    def to_dict(self) -> dict:
+        """JSON-serializable state, e.g. for a `session_store.SessionStore`"""
+        with self._lock:
+            return {
+                "turns": [[turn.role, turn.text] for turn in self.turns],
+                "summary": self.summary,
+                "summarized": self._summarized,
+                "dropped": self.dropped,
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict, **kwargs) -> "Conversation":
+        """Restore a conversation saved with `to_dict`; `kwargs` are as for the constructor"""
+        conversation = cls(**kwargs)
+        conversation.turns = [Turn(role, text, estimate_tokens(text)) for role, text in data["turns"]]
+        conversation.summary = data["summary"]
+        conversation._summarized = data["summarized"]
+        conversation.dropped = data["dropped"]
+        return conversation
+
+    def clear(self):
+        with self._lock:
+            self.turns = []
+            self.summary = ""
+            self.dropped = 0
+            self._summarized = 0
+
+    def add_exchange(self, message: str, reply: str):
+        """Record a message and the model's reply to it"""
+        with self._lock:
+            self.turns.append(Turn("Human", message, estimate_tokens(message)))
+            self.turns.append(Turn("Assistant", reply, estimate_tokens(reply)))
+            self.last_active = time.time()
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        size = self.size
+        while self._summarized >= 2 and size > self.max_bytes:
+            size -= _utf8_size(self.turns[0].text) + _utf8_size(self.turns[1].text)
+            del self.turns[:2]
+            self._summarized -= 2
+            self.dropped += 2
+
+    def compact(self, summarize: Optional[Summarizer] = None):
+        """Fold the oldest exchanges into the summary, if the recent ones are over budget
+
+        Without `summarize` (or if it fails), the folded exchanges are simply left out.
+        """
+        with self._lock:
+            history_tokens = sum(turn.tokens for turn in self.history)
+            if history_tokens <= self.history_tokens:
+                return
+            start = end = self._summarized
+            # Whole exchanges, and always keep the latest one
+            while history_tokens > self.history_tokens // 2 and end + 2 < len(self.turns):
+                history_tokens -= self.turns[end].tokens + self.turns[end + 1].tokens
+                end += 2
+            if end == start:
+                return
+            folded = self.turns[start:end]
+            summary = self.summary
+        if summarize is not None:
+            try:
+                summary = _clip(summarize(summary, folded).strip(), self.summary_tokens)
+            except Exception as e:
+                print(f"Could not summarize conversation history, leaving it out: {e}")
+        with self._lock:
+            self.summary = summary
+            self._summarized = end
+            self._drop_oldest()
+
+    def build_prompt(self, message: str, summarize: Optional[Summarizer] = None) -> str:
+        """The prompt for the model's reply to `message`, given the conversation so far
+
+        Returns the text to go between the first "Human:" and the final "Assistant:" of a Claude
+        prompt, i.e. the `prompt` parameter of `models.invoke` / `invoke_stream`.
+        """
+        self.compact(summarize)
+        with self._lock:
+            self.last_active = time.time()
+            turns = [(turn.role, turn.text) for turn in self.history] + [("Human", message)]
+            summary = self.summary
+        first = turns[0][1]
+        if summary:
+            first = f"Here is a summary of our conversation so far:\n<summary>\n{summary}\n</summary>\n\n{first}"
+        return first + "".join(f"\n\n{role}: {text}" for role, text in turns[1:])
+
+    def context_digest(self) -> str:
+        """Hash of what `build_prompt` sends before the new message: the summary and recent turns
+
+        Two messages only get the same reply from the semantic cache when this matches too, so a
+        follow-up is never answered with a reply written for another point of the conversation.
+        """
+        with self._lock:
+            parts = [self.summary] + [f"{turn.role}: {turn.text}" for turn in self.history]
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+SUMMARY_UPDATE_PROMPT = PromptTemplate("""
+    Update the summary of a conversation with the new messages below. Keep every fact, name, number and decision that later messages might refer to, and write at most {words} words.
+    <summary>
+    {summary}
+    </summary>
+    <messages>
+    {transcript}
+    </messages>
+    Reply with just the updated summary.
+""")
+
+
+def claude_summarizer(model_id: str, client=None, summary_tokens: int = DEFAULT_SUMMARY_TOKENS) -> Summarizer:
+    """A `Summarizer` that asks a Claude model to update the summary"""
+    # Imported here, so that conversations can be used (e.g. benchmarked) without Bedrock
+    from .models import invoke
+
+    def summarize(summary: str, turns: List[Turn]) -> str:
+        transcript = "\n\n".join(f"{'User' if turn.role == 'Human' else 'Assistant'}: {turn.text}" for turn in turns)
+        prompt = SUMMARY_UPDATE_PROMPT.render(words=summary_tokens * 3 // 4, summary=summary, transcript=transcript)
+        return invoke(model_id, client=client, prompt=prompt, max_tokens=summary_tokens, temperature=0.0).output
+
+    return summarize
+
+
+class ConversationRegistry:
+    """Tracks the conversations of all sessions in the process, clearing idle ones
+
+    Only weak references are held, so conversations of sessions Streamlit has closed are freed as
+    usual; this takes care of sessions left open (e.g. in a background browser tab).
+
+    Parameters
+    ----------
+    idle_ttl :
+        Seconds without a new message after which a conversation is cleared.
+    """
+
+    def __init__(self, idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._conversations = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def touch(self, conversation: Conversation):
+        """Track `conversation` (if not already) and clear any idle conversations"""
+        now = time.time()
+        with self._lock:
+            self._conversations.add(conversation)
+            idle = [c for c in self._conversations if now - c.last_active > self.idle_ttl]
+            for c in idle:
+                self._conversations.discard(c)
+        for c in idle:
+            c.clear()
+            c.evicted = True
+        stats = self.stats()
+        get_metrics().set_gauge("chat_conversations", "all", stats["conversations"])
+        get_metrics().set_gauge("chat_memory_bytes", "all", stats["bytes"])
+
+    def stats(self) -> dict:
+        """Number of conversations tracked and the text they hold, for display"""
+        with self._lock:
+            conversations = list(self._conversations)
+        return {"conversations": len(conversations), "bytes": sum(c.size for c in conversations)}
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_conversations() -> ConversationRegistry:
+    """Get the process-wide conversation registry"""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ConversationRegistry()
+        return _default_registry
@@ -0,0 +1,153 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Publishing load metrics to Amazon CloudWatch, for the ECS service to scale on
+
+The app is I/O-bound on Bedrock, so its CPU stays low while users queue behind long SDXL calls.
+When CLOUDWATCH_METRICS_NAMESPACE is set, each task publishes (every CLOUDWATCH_METRICS_INTERVAL
+seconds, default 60) the signals that do show it is busy:
+
+- `InFlightRequests`: Bedrock requests in progress in this task,
+- `QueuedRequests`: Bedrock requests waiting for a slot from their model's governor,
+- `ActiveSessions`: connected Streamlit sessions, and
+- `BedrockLatencyP95`: p95 latency (in seconds) of the Bedrock requests completed since the last
+  publish, if there were any,
+
+all with a `Service` dimension (CLOUDWATCH_METRICS_SERVICE, default "WebApplication"), so they
+can be averaged across the service's tasks for scaling. See `stack/web_stack.py` for the
+scaling policies using them. Requests are counted by the governors (see `throttling`), so both
+request counts stay at 0 with BEDROCK_GOVERNOR=0.
+"""
+# Python Built-Ins:
+import os
+import threading
+from typing import Callable, List, Optional
+
+# Local Dependencies:
+from .metrics import get_metrics, percentile
+from .throttling import governor_states
+
+
+DEFAULT_INTERVAL = float(os.environ.get("CLOUDWATCH_METRICS_INTERVAL", 60))
+DEFAULT_SERVICE = os.environ.get("CLOUDWATCH_METRICS_SERVICE", "WebApplication")
+# Most metrics CloudWatch accepts in one PutMetricData request
+MAX_METRIC_DATA = 1000
+
+
+def active_sessions() -> Optional[int]:
+    """Number of connected Streamlit sessions in this process, or None if not running in Streamlit"""
+    # Imported here to keep the rest of this module usable outside Streamlit
+    from streamlit import runtime
+
+    if not runtime.exists():
+        return None
+    return runtime.get_instance()._session_mgr.num_active_sessions()
+
+
+class CloudWatchPublisher:
+    """Collects this task's load metrics and sends them to CloudWatch with `put_metric_data`
+
+    Parameters
+    ----------
+    client :
+        boto3 CloudWatch client, or any object with a compatible `put_metric_data` (e.g. a stub).
+    namespace :
+        CloudWatch namespace to publish in.
+    service :
+        Value of the `Service` dimension.
+    interval :
+        Seconds between publishes, when started with `start()`.
+    session_count :
+        Returns the number of active sessions (or None to skip the metric). Defaults to
+        `active_sessions`.
+    """
+
+    def __init__(
+        self,
+        client,
+        namespace: str,
+        service: str = DEFAULT_SERVICE,
+        interval: float = DEFAULT_INTERVAL,
+        session_count: Callable[[], Optional[int]] = active_sessions,
+    ):
+        self.client = client
+        self.namespace = namespace
+        self.service = service
+        self.interval = interval
+        self.session_count = session_count
+        self._latency_marks = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def collect(self) -> List[dict]:
+        """The `MetricData` for one publish"""
+        states = governor_states()
+        values = [
+            ("InFlightRequests", sum(state["in flight"] for state in states), "Count"),
+            ("QueuedRequests", sum(state["queue depth"] for state in states), "Count"),
+        ]
+        sessions = self.session_count()
+        if sessions is not None:
+            values.append(("ActiveSessions", sessions, "Count"))
+        latencies, self._latency_marks = get_metrics().samples_since("bedrock_latency_seconds", self._latency_marks)
+        if latencies:
+            values.append(("BedrockLatencyP95", percentile(sorted(latencies), 0.95), "Seconds"))
+        dimensions = [{"Name": "Service", "Value": self.service}]
+        return [
+            {"MetricName": name, "Dimensions": dimensions, "Value": float(value), "Unit": unit}
+            for name, value, unit in values
+        ]
+
+    def publish(self) -> List[dict]:
+        """Collect and send the metrics now, returning what was sent
+
+        Metrics are sent MAX_METRIC_DATA per request. A request that fails is logged and skipped
+        rather than raised: scaling signals are best-effort.
+        """
+        metric_data = self.collect()
+        sent = []
+        for start in range(0, len(metric_data), MAX_METRIC_DATA):
+            batch = metric_data[start:start + MAX_METRIC_DATA]
+            try:
+                self.client.put_metric_data(Namespace=self.namespace, MetricData=batch)
+            except Exception as e:
+                print(f"Could not publish CloudWatch metrics: {e}")
+            else:
+                sent.extend(batch)
+        return sent
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except Exception as e:
+                # Collecting failed: never let scaling signals take the app down
+                print(f"Could not collect CloudWatch metrics: {e}")
+
+    def start(self) -> threading.Thread:
+        """Publish every `interval` seconds from a daemon thread, until `stop()`"""
+        self._thread = threading.Thread(target=self._run, name="cloudwatch-metrics", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+
+_default_publisher = None
+_default_publisher_lock = threading.Lock()
+
+
+def start_cloudwatch_publisher() -> Optional[CloudWatchPublisher]:
+    """Start the process-wide publisher if CLOUDWATCH_METRICS_NAMESPACE is set (only once)"""
+    global _default_publisher
+    namespace = os.environ.get("CLOUDWATCH_METRICS_NAMESPACE")
+    if not namespace:
+        return None
+    with _default_publisher_lock:
+        if _default_publisher is None:
+            import boto3
+
+            _default_publisher = CloudWatchPublisher(boto3.client("cloudwatch"), namespace)
+            _default_publisher.start()
+            print(f"Publishing CloudWatch metrics to {namespace} every {_default_publisher.interval}s")
+        return _default_publisher
@@ -0,0 +1,209 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Embedding requests from all sessions, coalesced into micro-batches
+
+Each feature using embeddings (semantic caching, document search) embeds a text or a few at a
+time, from every session at once. `EmbeddingService` sits in front of an embedder (see
+`embeddings`) with the same `embed(texts)` interface, and:
+
+- serves recently embedded texts from a bounded LRU cache of float32 vectors,
+- shares one embedding between concurrent requests for the same text, and
+- gathers the other texts requested within EMBEDDING_BATCH_WINDOW_MS (default 10ms) of each
+  other, from any thread, into batches of up to EMBEDDING_BATCH_SIZE for the embedder, with up to
+  EMBEDDING_MAX_CONCURRENCY batches in flight.
+
+Batching saves requests only for embedders taking a batch in one request. `BedrockEmbedder` sends
+one request per text (Titan embeds one at a time), so behind it the service saves time through
+its cache and shared embeddings, and bounds how many requests embedding sends at once, but
+sends as many requests for new texts as sessions would on their own (see
+benchmarks/embedding_service_bench.py).
+
+A request waits at most the batching window longer than it would on its own, and every text
+embedded is counted in the `embedding_texts_total` metric by how it was served ("cache",
+"coalesced" or "embedded").
+"""
+# Python Built-Ins:
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# External Dependencies:
+import numpy as np
+
+# Local Dependencies:
+from .embeddings import get_embedder
+from .metrics import get_metrics
+
+
+DEFAULT_BATCH_WINDOW = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", 10)) / 1000
+DEFAULT_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 32))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", 4))
+DEFAULT_CACHE_BYTES = int(os.environ.get("EMBEDDING_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+def _text_key(text: str) -> bytes:
+    # Digests rather than the texts themselves, which can be whole document chunks
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingService:
+    """Coalescing, caching front for an embedder, safe to share between all sessions
+
+    Parameters
+    ----------
+    embedder :
+        Object with an `embed(texts) -> np.ndarray` method returning L2-normalized rows.
+    batch_window :
+        Seconds to wait for more texts after the first one of a batch arrives.
+    batch_size :
+        Most texts sent to the embedder at once: a full batch is sent without waiting.
+    max_concurrency :
+        Most batches being embedded at once.
+    cache_bytes :
+        Size of the LRU cache of vectors, beyond which the least recently used are forgotten.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        batch_window: float = DEFAULT_BATCH_WINDOW,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+    ):
+        self.embedder = embedder
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.cache_bytes = cache_bytes
+        self.batches = 0
+        self.batched_texts = 0
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._cache_used = 0
+        # Texts waiting for a batch, and the futures of all texts not embedded yet, by key
+        self._queue: List[Tuple[bytes, str]] = []
+        self._queued_since: Optional[float] = None
+        self._pending: Dict[bytes, Future] = {}
+        self._condition = threading.Condition()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embedding-batch")
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed `texts` (blocking), as one float32 row per text"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        rows: List[Optional[np.ndarray]] = [None] * len(texts)
+        waiting: List[Tuple[int, Future]] = []
+        served = {"cache": 0, "coalesced": 0, "embedded": 0}
+        with self._condition:
+            for n, text in enumerate(texts):
+                key = _text_key(text)
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    rows[n] = vector
+                    served["cache"] += 1
+                    continue
+                future = self._pending.get(key)
+                if future is not None:
+                    served["coalesced"] += 1
+                else:
+                    future = self._pending[key] = Future()
+                    self._queue.append((key, text))
+                    if self._queued_since is None:
+                        self._queued_since = time.monotonic()
+                    served["embedded"] += 1
+                waiting.append((n, future))
+            if served["embedded"]:
+                self._start_dispatcher()
+                self._condition.notify_all()
+        for how, count in served.items():
+            if count:
+                get_metrics().increment("embedding_texts_total", how, count)
+        for n, future in waiting:
+            rows[n] = future.result()
+        return np.stack(rows)
+
+    def _start_dispatcher(self):
+        # Called with the condition held
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, name="embedding-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                # Wait out the window from the batch's first text, unless the batch fills up first
+                deadline = self._queued_since + self.batch_window
+                while len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._queue[: self.batch_size]
+                del self._queue[: self.batch_size]
+                self._queued_since = time.monotonic() if self._queue else None
+            # Blocks while `max_concurrency` batches are in flight, so the queue keeps filling up
+            self._slots.acquire()
+            self._executor.submit(self._embed_batch, batch)
+
+    def _embed_batch(self, batch: List[Tuple[bytes, str]]):
+        try:
+            try:
+                vectors = np.asarray(self.embedder.embed([text for _, text in batch]), dtype=np.float32)
+            except BaseException as e:
+                with self._condition:
+                    futures = [self._pending.pop(key) for key, _ in batch]
+                for future in futures:
+                    future.set_exception(e)
+                return
+            get_metrics().observe("embedding_batch_size", "all", len(batch))
+            with self._condition:
+                self.batches += 1
+                self.batched_texts += len(batch)
+                futures = []
+                for (key, _), vector in zip(batch, vectors):
+                    # A copy, so the cache doesn't keep the whole batch's array alive
+                    vector = vector.copy()
+                    vector.flags.writeable = False
+                    if key not in self._cache:
+                        self._cache[key] = vector
+                        self._cache_used += vector.nbytes
+                    futures.append((self._pending.pop(key), vector))
+                while self._cache_used > self.cache_bytes and self._cache:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_used -= evicted.nbytes
+            for future, vector in futures:
+                future.set_result(vector)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "cached vectors": len(self._cache),
+                "cache bytes": self._cache_used,
+                "queued": len(self._queue),
+                "batches": self.batches,
+                "mean batch size": self.batched_texts / self.batches if self.batches else None,
+            }
+
+
+_default_service: Optional[EmbeddingService] = None
+_default_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Get the process-wide embedding service, in front of `embeddings.get_embedder()`"""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = EmbeddingService(get_embedder())
+        return _default_service
@@ -0,0 +1,98 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Text embeddings, from a Bedrock embedding model or a local stand-in
+
+Embedders turn a list of texts into a float32 array of L2-normalized rows, so the inner product
+of two rows is their cosine similarity.
+"""
+# Python Built-Ins:
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import re
+import threading
+from typing import List
+
+# External Dependencies:
+import numpy as np
+
+
+DEFAULT_EMBEDDING_MODEL = os.environ.get("BEDROCK_EMBEDDING_MODEL", "amazon.titan-embed-text-v1")
+# Titan Text Embeddings accepts up to 8k tokens; longer texts are cut to about that many characters
+MAX_EMBED_CHARS = 25000
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a 2D array (all-zero rows are left as they are)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    """Local, dependency-free embedder for tests and offline runs
+
+    Hashes lower-cased words and word bigrams into `dimension` buckets (the "hashing trick"), so
+    texts sharing most of their words get similar vectors. It knows nothing about meaning, but
+    near-duplicate prompts come out close together, which is what the caches here need.
+    """
+
+    def __init__(self, dimension: int = 512):
+        self.dimension = dimension
+
+    def _bucket(self, feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little") % self.dimension
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for n, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                vectors[n, self._bucket(feature)] += 1
+        return normalize(vectors)
+
+
+class BedrockEmbedder:
+    """Embeds texts with a Bedrock embedding model, one request per text
+
+    Requests go through `models.invoke`, so they share the response cache, metrics and the
+    model's request governor with everything else. The texts of one call are embedded up to
+    `max_workers` at a time, so a batch takes about as long as its slowest text.
+    """
+
+    def __init__(self, model_id: str = DEFAULT_EMBEDDING_MODEL, client=None, max_workers: int = 8):
+        self.model_id = model_id
+        self.client = client
+        self.max_workers = max_workers
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        # Imported here: models imports this module's users, not the other way around
+        from .models import invoke
+
+        def embed_one(text):
+            return invoke(self.model_id, client=self.client, prompt=text[:MAX_EMBED_CHARS]).output
+
+        if len(texts) <= 1:
+            return normalize([embed_one(text) for text in texts])
+        with ThreadPoolExecutor(max_workers=min(len(texts), self.max_workers)) as executor:
+            return normalize(list(executor.map(embed_one, texts)))
+
+
+_default_embedder = None
+_default_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Get the process-wide embedder
+
+    Set EMBEDDER=local to use `HashingEmbedder` (the default when BEDROCK_FAKE is set), or
+    EMBEDDER=bedrock to use BEDROCK_EMBEDDING_MODEL (default amazon.titan-embed-text-v1).
+    """
+    global _default_embedder
+    with _default_embedder_lock:
+        if _default_embedder is None:
+            kind = os.environ.get("EMBEDDER") or ("local" if os.environ.get("BEDROCK_FAKE") else "bedrock")
+            _default_embedder = HashingEmbedder() if kind == "local" else BedrockEmbedder()
+        return _default_embedder
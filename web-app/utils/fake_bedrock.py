@@ -0,0 +1,129 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Offline stand-in for the boto3 `bedrock-runtime` client, for local development and testing"""
+# Python Built-Ins:
+import base64
+import functools
+import io
+import json
+import threading
+import time
+from typing import Optional
+
+
+@functools.lru_cache(maxsize=4)
+def _fake_png(size: int) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.linear_gradient("L").resize((size, size)).convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _FakeEventStream:
+    """Mimics botocore's EventStream: iterable of {"chunk": {"bytes": ...}} events, closable"""
+
+    def __init__(self, payloads, delay: float):
+        self._payloads = payloads
+        self._delay = delay
+        self.closed = False
+
+    def __iter__(self):
+        for payload in self._payloads:
+            if self.closed:
+                return
+            time.sleep(self._delay)
+            yield {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBedrockClient:
+    """Answers `invoke_model` and `invoke_model_with_response_stream` without calling AWS
+
+    Text models echo a canned completion, embedding models hash the words of their input (see
+    `embeddings.HashingEmbedder`), and Stable Diffusion returns a gradient PNG. Responses
+    use the same JSON shapes as the real models, so the whole provider/caching/streaming stack is
+    exercised.
+
+    Parameters
+    ----------
+    latency :
+        Seconds to sleep per `invoke_model` call.
+    chunk_delay :
+        Seconds to sleep before each streamed chunk.
+    image_size :
+        Side length of the generated images, in pixels.
+    """
+
+    def __init__(self, latency: float = 0.2, chunk_delay: float = 0.02, image_size: int = 512):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.image_size = image_size
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    @staticmethod
+    def _text_response(modelId: str, text: str) -> dict:
+        if modelId.startswith("amazon.titan-text"):
+            return {"results": [{"outputText": text, "completionReason": "FINISH"}]}
+        if modelId.startswith("meta.llama2"):
+            return {"generation": text, "stop_reason": "stop"}
+        if modelId.startswith("cohere.command"):
+            return {"generations": [{"text": text, "finish_reason": "COMPLETE"}]}
+        return {"completion": text, "stop_reason": "stop_sequence"}
+
+    @staticmethod
+    def _stream_key(modelId: str) -> str:
+        if modelId.startswith("amazon.titan-text"):
+            return "outputText"
+        if modelId.startswith("meta.llama2"):
+            return "generation"
+        if modelId.startswith("cohere.command"):
+            return "text"
+        return "completion"
+
+    def _completion(self, body: dict) -> str:
+        prompt = body.get("prompt") or body.get("inputText") or ""
+        return f"This is a fake completion for a {len(prompt)}-character prompt."
+
+    def invoke_model(self, body, modelId: str, accept: Optional[str] = None, contentType: Optional[str] = None):
+        self._count()
+        request = json.loads(body)
+        time.sleep(self.latency)
+        if modelId.startswith("amazon.titan-embed"):
+            from .embeddings import HashingEmbedder
+
+            response = {
+                "embedding": HashingEmbedder(1536).embed([request["inputText"]])[0].tolist(),
+                "inputTextTokenCount": len(request["inputText"].split()),
+            }
+        elif modelId.startswith("stability."):
+            response = {
+                "result": "success",
+                "artifacts": [{
+                    "seed": request.get("seed", 0),
+                    "base64": base64.b64encode(_fake_png(self.image_size)).decode("ascii"),
+                    "finishReason": "SUCCESS",
+                }],
+            }
+        else:
+            response = self._text_response(modelId, self._completion(request))
+        return {"body": io.BytesIO(json.dumps(response).encode("utf-8")), "contentType": "application/json"}
+
+    def invoke_model_with_response_stream(self, body, modelId: str, accept: Optional[str] = None, contentType: Optional[str] = None):
+        self._count()
+        request = json.loads(body)
+        words = self._completion(request).split(" ")
+        key = self._stream_key(modelId)
+        payloads = [{key: (" " if n else "") + word} for n, word in enumerate(words)]
+        payloads[-1]["amazon-bedrock-invocationMetrics"] = {
+            "inputTokenCount": len(json.dumps(request)) // 4,
+            "outputTokenCount": len(words),
+        }
+        return {"body": _FakeEventStream(payloads, self.chunk_delay)}
@@ -0,0 +1,155 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Bounded-concurrency fan-out of independent Bedrock requests (and their response streams)"""
+# Python Built-Ins:
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterator, NamedTuple, Optional, Sequence
+
+
+# Kept low by default so that one user selecting 8 presets doesn't trip Bedrock throttling for everyone
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("BEDROCK_MAX_CONCURRENCY", 4))
+DEFAULT_TIMEOUT = float(os.environ.get("BEDROCK_REQUEST_TIMEOUT", 300))
+
+
+class FanOutResult(NamedTuple):
+    """Outcome of one fanned-out call: exactly one of `result` and `error` is set"""
+    index: int
+    item: Any
+    result: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+
+def fan_out(
+    fn: Callable[[Any], Any],
+    items: Sequence[Any],
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Iterator[FanOutResult]:
+    """Call `fn(item)` for every item in a thread pool, yielding results in completion order
+
+    Results are yielded from the calling thread, so callers can safely write them into Streamlit
+    elements as they arrive. A failing call does not affect the others: its exception is reported
+    in `FanOutResult.error`.
+
+    Parameters
+    ----------
+    fn :
+        Function to call once per item.
+    items :
+        Items to fan out over.
+    max_concurrency :
+        Maximum number of calls in flight at once. Defaults to the BEDROCK_MAX_CONCURRENCY
+        environment variable, or 4.
+    timeout :
+        Per-call timeout in seconds, measured from when the call actually starts running. Calls
+        running longer are reported with a `TimeoutError` (the worker thread itself can't be
+        interrupted, and its late result is discarded). Defaults to BEDROCK_REQUEST_TIMEOUT, or 300.
+    """
+    max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+    timeout = timeout or DEFAULT_TIMEOUT
+    started = {}
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        return fn(item)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_concurrency, max(len(items), 1)))
+    try:
+        pending = {executor.submit(run, n, item): n for n, item in enumerate(items)}
+        while pending:
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                n = pending.pop(future)
+                elapsed = time.monotonic() - started.get(n, time.monotonic())
+                error = future.exception()
+                if error is None:
+                    yield FanOutResult(n, items[n], result=future.result(), elapsed=elapsed)
+                else:
+                    yield FanOutResult(n, items[n], error=error, elapsed=elapsed)
+
+            now = time.monotonic()
+            for future, n in list(pending.items()):
+                if n in started and now - started[n] > timeout:
+                    del pending[future]
+                    future.cancel()
+                    yield FanOutResult(
+                        n, items[n],
+                        error=TimeoutError(f"Request timed out after {timeout} seconds"),
+                        elapsed=now - started[n],
+                    )
+    finally:
+        # Don't block the page on stragglers that already timed out, or on a rerun/stop
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamEvent(NamedTuple):
+    """One chunk from one of several merged streams; `chunk` is None once that stream has ended"""
+    index: int
+    chunk: Any = None
+    error: Optional[BaseException] = None
+
+
+def merge_streams(
+    factories: Sequence[Callable[[], Iterator[Any]]],
+    timeout: Optional[float] = None,
+) -> Iterator[StreamEvent]:
+    """Consume several streams concurrently, yielding their chunks as they arrive
+
+    Each factory is called on its own thread, so all streams are requested at once and the whole
+    merge takes about as long as the slowest stream rather than the sum of them. Chunks are passed
+    back through a queue and yielded from the calling thread, so callers can safely write them into
+    Streamlit elements. Every stream ends with exactly one event whose `chunk` is None, carrying the
+    stream's exception (if it failed) in `error`.
+
+    Closing the returned generator early (e.g. on a Streamlit rerun) asks the worker threads to
+    close their streams at the next chunk.
+
+    Parameters
+    ----------
+    factories :
+        Functions each returning an iterator of chunks, e.g. `partial(invoke_stream, model_id, ...)`.
+    timeout :
+        Longest wait in seconds for the next chunk from any stream, after which `TimeoutError` is
+        raised. Defaults to BEDROCK_REQUEST_TIMEOUT, or 300.
+    """
+    timeout = timeout or DEFAULT_TIMEOUT
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def pump(index, factory):
+        try:
+            stream = factory()
+            try:
+                for chunk in stream:
+                    if stop.is_set():
+                        break
+                    events.put(StreamEvent(index, chunk))
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+        except Exception as e:
+            events.put(StreamEvent(index, error=e))
+        else:
+            events.put(StreamEvent(index))
+
+    for n, factory in enumerate(factories):
+        threading.Thread(target=pump, args=(n, factory), name=f"merge-streams-{n}", daemon=True).start()
+
+    remaining = len(factories)
+    try:
+        while remaining:
+            try:
+                event = events.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No stream produced output for {timeout} seconds")
+            if event.chunk is None:
+                remaining -= 1
+            yield event
+    finally:
+        stop.set()
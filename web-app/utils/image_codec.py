@@ -0,0 +1,83 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Helpers for moving images between Bedrock's base64 payloads and Streamlit without extra copies"""
+# Python Built-Ins:
+import base64
+from collections import OrderedDict
+import functools
+import hashlib
+import io
+import threading
+from typing import Tuple
+
+
+def decode_image(base64_str: str) -> bytes:
+    """Decode a base64 image artifact (e.g. SDXL's `artifacts[n]["base64"]`) to raw image bytes
+
+    The result can be passed straight to `st.image`, which serves PNG/JPEG bytes as-is instead of
+    re-encoding a PIL image. `b64decode` accepts the ASCII string directly, so no intermediate
+    `bytes(...)` copy or `BytesIO` is needed.
+    """
+    return base64.b64decode(base64_str)
+
+
+def encode_image(image_bytes: bytes) -> str:
+    """Encode raw image bytes as the base64 string Bedrock expects (e.g. SDXL's `init_image`)"""
+    return base64.b64encode(image_bytes).decode("ascii")
+
+
+def content_hash(data: bytes) -> str:
+    """Hex SHA-256 digest of `data`, used to key per-upload caches"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def memoize_by_content(maxsize: int = 16):
+    """Decorator caching `fn(data, *args)` on the content hash of `data` plus the other arguments
+
+    Unlike `functools.lru_cache`, the cache doesn't keep a reference to the (possibly large) input
+    bytes, only to its digest and the result. The cache is shared by all sessions in the process.
+    """
+    def decorator(fn):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(data: bytes, *args, **kwargs):
+            key = (content_hash(data), args, tuple(sorted(kwargs.items())))
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            result = fn(data, *args, **kwargs)
+            with lock:
+                cache[key] = result
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
+@memoize_by_content()
+def prepare_init_image(data: bytes, size: int = 512, resample: str = "lanczos") -> Tuple[bytes, str]:
+    """Preprocess an uploaded image for SDXL image-to-image, once per distinct upload and settings
+
+    See `image_preprocess.preprocess_image` for the crop/resize applied.
+
+    Returns
+    -------
+    png_bytes :
+        The `size` x `size` source image as PNG, ready for `st.image`.
+    init_image_b64 :
+        The same PNG as a base64 string for the request's `init_image` field.
+    """
+    from .image_preprocess import preprocess_image
+
+    image = preprocess_image(data, size=size, resample=resample)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    png_bytes = buffer.getvalue()
+    return png_bytes, encode_image(png_bytes)
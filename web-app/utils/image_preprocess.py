@@ -0,0 +1,84 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Preparation of uploaded images as square SDXL init images"""
+# Python Built-Ins:
+import io
+import os
+from typing import Tuple
+
+# External Dependencies:
+from PIL import Image, ImageOps
+
+
+RESAMPLING_FILTERS = {
+    "lanczos": Image.Resampling.LANCZOS,
+    "bicubic": Image.Resampling.BICUBIC,
+    "bilinear": Image.Resampling.BILINEAR,
+    "nearest": Image.Resampling.NEAREST,
+}
+
+# Uploads are rejected above this size before any pixel data is decoded. JPEGs are decoded at a
+# reduced scale (see `preprocess_image`), so this mainly bounds the memory used by large PNGs.
+MAX_UPLOAD_PIXELS = int(os.environ.get("MAX_UPLOAD_PIXELS", 64_000_000))
+
+
+def square_crop_box(width: int, height: int) -> Tuple[int, int, int, int]:
+    """(left, upper, right, lower) box of the largest centered square in a width x height image"""
+    side = min(width, height)
+    left = (width - side) // 2
+    top = (height - side) // 2
+    return (left, top, left + side, top + side)
+
+
+def preprocess_image(data: bytes, size: int = 512, resample: str = "lanczos") -> Image.Image:
+    """Decode an uploaded image and center-crop/resize it to a `size` x `size` RGB image
+
+    - JPEGs are decoded with `Image.draft`, which lets libjpeg scale down by up to 8x while
+      decoding, so e.g. a 50 MP photo never exists in memory at full resolution.
+    - EXIF orientation is applied, so phone photos aren't sent to the model sideways.
+    - The crop is always exactly square, and is applied as part of the resize rather than as a
+      separate copy.
+
+    Files that can't be read, or are too large, raise `ValueError` with a message fit for the user.
+
+    Parameters
+    ----------
+    data :
+        Raw bytes of the uploaded PNG or JPEG file.
+    size :
+        Side length of the output image in pixels.
+    resample :
+        Name of the resampling filter, one of `RESAMPLING_FILTERS`.
+    """
+    if resample not in RESAMPLING_FILTERS:
+        raise ValueError(f"Unknown resampling filter {resample!r}. Expected one of {list(RESAMPLING_FILTERS)}")
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Image is too large: {e}") from e
+    except OSError as e:
+        raise ValueError("Couldn't read the image: upload a PNG or JPEG file") from e
+    width, height = image.size
+    if width * height > MAX_UPLOAD_PIXELS:
+        raise ValueError(
+            f"Image is too large ({width}x{height}); the maximum is {MAX_UPLOAD_PIXELS / 1e6:g} megapixels"
+        )
+
+    # Only has an effect for JPEG. The decoded image is never smaller than requested in either
+    # dimension, so the square crop below still covers at least `size` pixels.
+    image.draft("RGB", (size, size))
+    try:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        return image.resize(
+            (size, size),
+            resample=RESAMPLING_FILTERS[resample],
+            box=square_crop_box(*image.size),
+            reducing_gap=3.0,
+        )
+    except OSError as e:
+        # Pixel data is only decoded from here on, so this is where truncated files fail
+        raise ValueError(f"Couldn't decode the image: {e}") from e
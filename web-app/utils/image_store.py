@@ -0,0 +1,253 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Content-addressed store of generated images on local disk, with thumbnails for display
+
+Generated PNGs are written once under their SHA-256 digest, so the same image generated (or
+served from cache) for several sessions is stored once, and jobs and session state only need
+to hold the key. Pages show `thumbnail(key, width)` (a JPEG at the display width, a fraction of
+the size of the original) and only read the full-resolution PNG when the user asks for it:
+
+    key = store.put(png_bytes)
+    st.image(store.thumbnail(key, picture_width))
+    st.download_button("Download", data=partial(store.full, key), file_name=f"{key}.png")
+
+Each session's `Gallery` of past generations holds keys only, and at most IMAGE_GALLERY_MAX_ITEMS
+of them. The store doesn't know which keys sessions and jobs still hold: images are deleted least
+recently shown first once the store outgrows IMAGE_STORE_MAX_BYTES, after which `full` and
+`thumbnail` raise `KeyError` for them, for pages to show as expired.
+"""
+# Python Built-Ins:
+from collections import OrderedDict
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+# Local Dependencies:
+from .image_codec import content_hash
+
+
+DEFAULT_STORE_DIR = os.environ.get("IMAGE_STORE_DIR") or os.path.join(tempfile.gettempdir(), "bedrock-images")
+DEFAULT_STORE_MAX_BYTES = int(os.environ.get("IMAGE_STORE_MAX_BYTES", 2 * 1024**3))
+DEFAULT_THUMBNAIL_CACHE_BYTES = int(os.environ.get("IMAGE_THUMBNAIL_CACHE_BYTES", 32 * 1024 * 1024))
+DEFAULT_GALLERY_MAX_ITEMS = int(os.environ.get("IMAGE_GALLERY_MAX_ITEMS", 48))
+THUMBNAIL_QUALITY = 85
+# Images stored between checks of the store's size on disk
+PRUNE_EVERY = 50
+
+
+class ImageStore:
+    """Images on disk by content hash, plus thumbnails at the widths they are displayed at
+
+    Parameters
+    ----------
+    directory :
+        Where images and thumbnails are written (created if needed).
+    max_bytes :
+        Size on disk above which the least recently used images (and their thumbnails) are
+        deleted.
+    thumbnail_cache_bytes :
+        Size of the in-memory LRU cache of thumbnails, shared by all sessions.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_STORE_DIR,
+        max_bytes: int = DEFAULT_STORE_MAX_BYTES,
+        thumbnail_cache_bytes: int = DEFAULT_THUMBNAIL_CACHE_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.thumbnail_cache_bytes = thumbnail_cache_bytes
+        self._thumbnails = OrderedDict()
+        self._thumbnail_bytes = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str = ".png") -> str:
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, data: bytes) -> str:
+        """Store image bytes (if not stored already) and return their key"""
+        key = content_hash(data)
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+        return key
+
+    def _touch(self, key: str):
+        """Mark an image as recently used, so it is pruned last; raises `KeyError` if it's gone"""
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def full(self, key: str) -> bytes:
+        """The original image; raises `KeyError` if it isn't (or is no longer) stored"""
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        self._touch(key)
+        return data
+
+    def thumbnail(self, key: str, width: int) -> bytes:
+        """JPEG of the image scaled to `width` pixels wide (or the original, if it's no wider)
+
+        Thumbnails are made once per key and width, kept on disk next to the original and in an
+        in-memory LRU cache. Showing a thumbnail counts as using the image, for `prune`. Raises
+        `KeyError` if the image isn't (or is no longer) stored.
+        """
+        cache_key = (key, width)
+        with self._lock:
+            data = self._thumbnails.get(cache_key)
+            if data is not None:
+                self._thumbnails.move_to_end(cache_key)
+        if data is not None:
+            self._touch(key)
+            return data
+        path = self._path(key, f".w{width}.thumb")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            self._touch(key)
+        except FileNotFoundError:
+            # Making the thumbnail reads (and so touches) the original
+            data = self._make_thumbnail(key, width)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            if cache_key not in self._thumbnails:
+                self._thumbnails[cache_key] = data
+                self._thumbnail_bytes += len(data)
+            while self._thumbnail_bytes > self.thumbnail_cache_bytes and len(self._thumbnails) > 1:
+                _, evicted = self._thumbnails.popitem(last=False)
+                self._thumbnail_bytes -= len(evicted)
+        return data
+
+    def _make_thumbnail(self, key: str, width: int) -> bytes:
+        # Imported here: PIL is only needed once a page shows an image
+        from PIL import Image
+
+        data = self.full(key)
+        image = Image.open(io.BytesIO(data))
+        if image.width <= width:
+            return data
+        # Decoding at reduced size is much cheaper for JPEG, and a no-op for PNG
+        image.draft("RGB", (width, width * image.height // image.width))
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+        return buffer.getvalue()
+
+    def prune(self):
+        """Delete the least recently used images until the store is under `max_bytes`
+
+        Files still being written (`.tmp`) are left alone, and so are files other threads or
+        tasks delete first.
+        """
+        originals, total = [], 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for file in os.scandir(entry.path):
+                if file.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue
+                total += stat.st_size
+                if file.name.endswith(".png"):
+                    originals.append((stat.st_mtime, file.path))
+        if total <= self.max_bytes:
+            return
+        for _, path in sorted(originals):
+            key = os.path.basename(path)[: -len(".png")]
+            for file in os.scandir(os.path.dirname(path)):
+                # The original and its thumbnails: "<key>.png" and "<key>.w<width>.thumb"
+                if not file.name.startswith(key + ".") or file.name.endswith(".tmp"):
+                    continue
+                try:
+                    total -= file.stat().st_size
+                    os.remove(file.path)
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                for cache_key in [cache_key for cache_key in self._thumbnails if cache_key[0] == key]:
+                    self._thumbnail_bytes -= len(self._thumbnails.pop(cache_key))
+            if total <= self.max_bytes:
+                break
+
+
+class GalleryItem(NamedTuple):
+    key: str
+    caption: str
+    created: float
+
+
+class Gallery:
+    """One session's past generations, newest first: image keys and captions only
+
+    Parameters
+    ----------
+    max_items :
+        Oldest items are forgotten beyond this many.
+    """
+
+    def __init__(self, max_items: int = DEFAULT_GALLERY_MAX_ITEMS):
+        self.max_items = max_items
+        self.items: List[GalleryItem] = []
+
+    def add(self, key: str, caption: str = "") -> bool:
+        """Add an image, unless it is already in the gallery; returns whether it was added"""
+        if any(item.key == key for item in self.items):
+            return False
+        self.items.insert(0, GalleryItem(key, caption, time.time()))
+        del self.items[self.max_items:]
+        return True
+
+    def to_list(self) -> list:
+        """JSON-serializable items, e.g. for a `session_store.SessionStore`"""
+        return [list(item) for item in self.items]
+
+    @classmethod
+    def from_list(cls, items: list, **kwargs) -> "Gallery":
+        """Restore a gallery saved with `to_list`; `kwargs` are as for the constructor"""
+        gallery = cls(**kwargs)
+        gallery.items = [GalleryItem(*item) for item in items][: gallery.max_items]
+        return gallery
+
+
+_default_store: Optional[ImageStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    """Get the process-wide image store, under IMAGE_STORE_DIR"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ImageStore()
+        return _default_store
@@ -0,0 +1,149 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Background jobs for long-running generations that outlive a single Streamlit script run"""
+# Python Built-Ins:
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import uuid
+
+# Local Dependencies:
+from .fan_out import FanOutResult, fan_out
+from .task_protection import get_task_protection
+
+
+# How long finished jobs are kept for polling pages to pick up their results
+DEFAULT_JOB_TTL = float(os.environ.get("JOB_TTL_SECONDS", 3600))
+DEFAULT_MAX_JOB_WORKERS = int(os.environ.get("JOB_MAX_WORKERS", 8))
+
+
+class Job:
+    """A fan-out of one function over several items, run in the background
+
+    `results` has one slot per item, filled in (with a `FanOutResult`) as each call completes, so
+    pages can show partial results while the job is still running.
+    """
+
+    def __init__(self, items: Sequence[Any], params: Optional[dict] = None, kind: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        # What submitted the job, e.g. "text_to_image", so pages only pick up their own jobs
+        self.kind = kind
+        self.items = list(items)
+        self.params = params or {}
+        self.status = "queued"
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.results: List[Optional[FanOutResult]] = [None] * len(self.items)
+        # Indexes of `items` in the order their results came in
+        self.completion_order: List[int] = []
+        self.error: Optional[BaseException] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @property
+    def completed(self) -> int:
+        return sum(result is not None for result in self.results)
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+
+class LocalJobBackend:
+    """In-process job backend: jobs run on a thread pool and results are held in memory
+
+    Jobs survive Streamlit reruns and browser reconnects to the same task, but not a restart of
+    the task itself.
+
+    Parameters
+    ----------
+    max_workers :
+        Maximum number of jobs running at once; further jobs wait in the queue.
+    ttl :
+        Seconds after which finished jobs are forgotten.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_JOB_WORKERS, ttl: float = DEFAULT_JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, job: Job, fn: Callable[[Any], Any], max_concurrency: Optional[int], timeout: Optional[float]):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            # Don't let the task be scaled in under a running job
+            with get_task_protection().hold():
+                for outcome in fan_out(fn, job.items, max_concurrency=max_concurrency, timeout=timeout):
+                    job.results[outcome.index] = outcome
+                    job.completion_order.append(outcome.index)
+            job.status = "done"
+        except BaseException as e:
+            job.error = e
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+
+    def _evict_expired(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.done and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+
+    def submit(
+        self,
+        fn: Callable[[Any], Any],
+        items: Sequence[Any],
+        params: Optional[dict] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        kind: Optional[str] = None,
+    ) -> str:
+        """Start a job calling `fn(item)` for every item, and return its job ID
+
+        `params` is stored on the job for display purposes, and `kind` to tell which page's job it
+        is (see `get`). `max_concurrency` and `timeout` are passed on to `fan_out`.
+        """
+        job = Job(items, params=params, kind=kind)
+        with self._lock:
+            self._evict_expired()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, max_concurrency, timeout)
+        return job.id
+
+    def get(self, job_id: str, kind: Optional[str] = None) -> Optional[Job]:
+        """Look up a job by ID, or None if it is unknown, has expired or (given `kind`) is of another kind"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and kind is not None and job.kind != kind:
+            return None
+        return job
+
+    def stats(self) -> dict:
+        """Counts of jobs by status"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_job_backend() -> LocalJobBackend:
+    """Get the process-wide job backend"""
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            _default_backend = LocalJobBackend()
+        return _default_backend
@@ -0,0 +1,261 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""In-process performance metrics for Bedrock calls and page renders
+
+Every Bedrock invocation and page render is recorded into a process-wide `MetricsStore`, which
+keeps recent samples for percentiles plus running totals. The store can be:
+
+- shown in the app (see the "Performance" page),
+- scraped in Prometheus text format, from `http://<host>:$METRICS_PORT/metrics` if METRICS_PORT
+  is set, and/or
+- appended as one JSON object per event to the file named by METRICS_JSONL_PATH.
+"""
+# Python Built-Ins:
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+# Number of recent samples kept per (metric, label) for percentile calculations
+DEFAULT_MAX_SAMPLES = int(os.environ.get("METRICS_MAX_SAMPLES", 5000))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values, q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already-sorted sequence, or None if it is empty"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def _escape_label(value: str) -> str:
+    """A label value escaped for the Prometheus text format: backslashes, quotes and line feeds"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsStore:
+    """Thread-safe store of timing samples and counters, labelled by model ID or page name"""
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES, jsonl_path: Optional[str] = None):
+        self.max_samples = max_samples
+        self.jsonl_path = jsonl_path
+        self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._sums = defaultdict(float)
+        self._counts = defaultdict(int)
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, label: str, value: float):
+        """Record one sample of a timing/size metric"""
+        with self._lock:
+            self._samples[(name, label)].append(value)
+            self._sums[(name, label)] += value
+            self._counts[(name, label)] += 1
+
+    def increment(self, name: str, label: str, value: float = 1):
+        """Add to a running total"""
+        with self._lock:
+            self._counters[(name, label)] += value
+
+    def set_gauge(self, name: str, label: str, value: float):
+        """Set the current value of a level (e.g. queue depth)"""
+        with self._lock:
+            self._gauges[(name, label)] = value
+
+    def write_event(self, event: dict):
+        """Append an event to the JSONL sink, if one is configured"""
+        if not self.jsonl_path:
+            return
+        line = json.dumps({"timestamp": time.time(), **event}, default=str)
+        with self._lock:
+            with open(self.jsonl_path, "a") as f:
+                f.write(line + "\n")
+
+    def summary(self, name: str) -> Dict[str, dict]:
+        """Count and p50/p95/p99 of the recent samples of `name`, by label"""
+        with self._lock:
+            samples = {label: sorted(values) for (metric, label), values in self._samples.items() if metric == name}
+            counts = {label: count for (metric, label), count in self._counts.items() if metric == name}
+        return {
+            label: {
+                "count": counts[label],
+                **{f"p{int(q * 100)}": percentile(values, q) for q in QUANTILES},
+            }
+            for label, values in samples.items()
+        }
+
+    def samples_since(self, name: str, marks: Dict[str, int]) -> Tuple[List[float], Dict[str, int]]:
+        """Samples of `name` (for all labels) recorded since `marks`, and the marks for next time
+
+        Pass `{}` the first time. Only the last `max_samples` samples per label are kept, so after
+        a very busy period the oldest new samples may be missing.
+        """
+        values, new_marks = [], {}
+        with self._lock:
+            for (metric, label), samples in self._samples.items():
+                if metric != name:
+                    continue
+                count = self._counts[(metric, label)]
+                new = min(count - marks.get(label, 0), len(samples))
+                if new > 0:
+                    values.extend(list(samples)[-new:])
+                new_marks[label] = count
+        return values, new_marks
+
+    def counters(self, name: str) -> Dict[str, float]:
+        """Running totals of counter `name`, by label"""
+        with self._lock:
+            return {label: value for (metric, label), value in self._counters.items() if metric == name}
+
+    def gauges(self, name: str) -> Dict[str, float]:
+        """Current values of gauge `name`, by label"""
+        with self._lock:
+            return {label: value for (metric, label), value in self._gauges.items() if metric == name}
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (timings as summaries)
+
+        Page metrics (named `page_*`) are labelled by `page`, all others by `model`.
+        """
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+            sums = dict(self._sums)
+            counts = dict(self._counts)
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        def labels(name, label):
+            return f'{"page" if name.startswith("page_") else "model"}="{_escape_label(label)}"'
+
+        lines = []
+        for name in sorted({name for name, _ in samples}):
+            lines.append(f"# TYPE {name} summary")
+            for (metric, label), values in sorted(samples.items()):
+                if metric != name:
+                    continue
+                for q in QUANTILES:
+                    lines.append(f'{name}{{{labels(name, label)},quantile="{q}"}} {percentile(values, q)}')
+                lines.append(f'{name}_sum{{{labels(name, label)}}} {sums[(metric, label)]}')
+                lines.append(f'{name}_count{{{labels(name, label)}}} {counts[(metric, label)]}')
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (metric, label), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{{{labels(name, label)}}} {value}')
+        for name in sorted({name for name, _ in gauges}):
+            lines.append(f"# TYPE {name} gauge")
+            for (metric, label), value in sorted(gauges.items()):
+                if metric == name:
+                    lines.append(f'{name}{{{labels(name, label)}}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def record_invocation(
+    model_id: str,
+    latency: float,
+    ttfb: Optional[float] = None,
+    request_bytes: Optional[int] = None,
+    response_bytes: Optional[int] = None,
+    input_tokens: Optional[int] = None,
+    output_tokens: Optional[int] = None,
+    retries: int = 0,
+    cached: bool = False,
+    error: Optional[str] = None,
+    streaming: bool = False,
+):
+    """Record one Bedrock model invocation (including cache hits and failures)"""
+    store = get_metrics()
+    if error is not None:
+        store.increment("bedrock_errors_total", model_id)
+    elif cached:
+        store.increment("bedrock_cache_hits_total", model_id)
+    else:
+        store.observe("bedrock_latency_seconds", model_id, latency)
+        if ttfb is not None:
+            store.observe("bedrock_ttfb_seconds", model_id, ttfb)
+    store.increment("bedrock_requests_total", model_id)
+    store.increment("bedrock_retries_total", model_id, retries)
+    for name, value in [
+        ("bedrock_request_bytes_total", request_bytes),
+        ("bedrock_response_bytes_total", response_bytes),
+        ("bedrock_input_tokens_total", input_tokens),
+        ("bedrock_output_tokens_total", output_tokens),
+    ]:
+        if value:
+            store.increment(name, model_id, value)
+    store.write_event({
+        "type": "invocation",
+        "model_id": model_id,
+        "latency": latency,
+        "ttfb": ttfb,
+        "request_bytes": request_bytes,
+        "response_bytes": response_bytes,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "retries": retries,
+        "cached": cached,
+        "streaming": streaming,
+        "error": error,
+    })
+
+
+class PageTimer:
+    """Measures one run of a page script: create it at the top of the page, `finish()` at the end"""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.start_time = time.time()
+
+    def finish(self):
+        duration = time.time() - self.start_time
+        store = get_metrics()
+        store.observe("page_render_seconds", self.page, duration)
+        store.write_event({"type": "render", "page": self.page, "duration": duration})
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Tuple[ThreadingHTTPServer, threading.Thread]:
+    """Serve `/metrics` in Prometheus format from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server, thread
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsStore:
+    """Get the process-wide metrics store, starting the /metrics endpoint on first use if configured"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = MetricsStore(jsonl_path=os.environ.get("METRICS_JSONL_PATH") or None)
+            port = os.environ.get("METRICS_PORT")
+            if port:
+                print(f"Serving Prometheus metrics on port {port}")
+                start_metrics_server(int(port))
+        return _default_store
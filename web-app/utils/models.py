@@ -0,0 +1,621 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Single entry point for invoking Bedrock models, with per-provider request/response adapters
+
+Pages describe *what* they want (a prompt and sampling parameters) and `invoke`/`invoke_stream`
+take care of building the provider-specific request body, caching, retries, timing and parsing:
+
+    result = invoke("anthropic.claude-v2", prompt="Hello", max_tokens=500, temperature=0.5)
+    result.output  # -> "Hi! How can I help?"
+
+Requests repeated with only a few parameters changing can be serialized once with
+`prepare_request`, and only those parameters filled in per call:
+
+    request = prepare_request(model_id, fields=["prompt", "style_preset"], negative_prompts=[...], seed=0)
+    invoke(model_id, request=request, prompt="A unicorn", style_preset="photographic")
+"""
+# Python Built-Ins:
+from collections import OrderedDict
+from functools import partial
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Sequence
+
+# External Dependencies:
+from botocore.exceptions import ClientError
+
+# Local Dependencies:
+from .image_codec import decode_image
+from .metrics import record_invocation
+from .response_cache import ResponseCache, cached_invoke_model, is_cacheable, serialize_body
+from .streaming import StreamStats, stream_completion
+from .templates import BodyTemplate, PreparedBody
+from .throttling import get_governor, is_throttling_error
+
+
+# Error codes worth retrying on top of botocore's own retries (which already cover throttling)
+RETRYABLE_ERRORS = {
+    "ThrottlingException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "ServiceUnavailableException",
+}
+DEFAULT_MAX_RETRIES = 2
+# Throttled requests are queued again behind the model's governor (which has just lowered its
+# limits) rather than failed, up to this many times
+DEFAULT_MAX_THROTTLE_RETRIES = int(os.environ.get("BEDROCK_MAX_THROTTLE_RETRIES", 8))
+# Request templates kept by `prepare_request`
+MAX_PREPARED_REQUESTS = 128
+
+
+class ModelProvider:
+    """Adapter owning the request format and response parsing for one family of models"""
+
+    def build_body(self, **params) -> dict:
+        raise NotImplementedError()
+
+    def parse_response(self, response_body: dict) -> Any:
+        raise NotImplementedError()
+
+    def build_stream_body(self, **params) -> dict:
+        """Request body for `invoke_model_with_response_stream`; the same as `build_body` by default"""
+        return self.build_body(**params)
+
+    def parse_stream_chunk(self, payload: dict) -> Optional[str]:
+        raise NotImplementedError(f"{type(self).__name__} does not support streaming")
+
+    def temperature(self, body: dict) -> Optional[float]:
+        """Sampling temperature of a request body, or None if the model doesn't sample"""
+        return body.get("temperature")
+
+    def is_cacheable(self, body: dict) -> bool:
+        """Whether responses to a request body may be cached (see `response_cache.is_cacheable`)"""
+        return is_cacheable(body, self.temperature(body))
+
+
+class AnthropicTextProvider(ModelProvider):
+    """Anthropic Claude models, through the text completions API"""
+
+    def build_body(
+        self,
+        prompt: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.5,
+        top_k: int = 250,
+        top_p: float = 0.5,
+        stop_sequences: Optional[List[str]] = None,
+    ) -> dict:
+        return {
+            "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
+            "max_tokens_to_sample": max_tokens,
+            "temperature": temperature,
+            "top_k": top_k,
+            "top_p": top_p,
+            "stop_sequences": ["\n\nHuman:"] if stop_sequences is None else stop_sequences,
+        }
+
+    def parse_response(self, response_body: dict) -> str:
+        return response_body.get("completion")
+
+    def parse_stream_chunk(self, payload: dict) -> Optional[str]:
+        return payload.get("completion")
+
+
+class TitanTextProvider(ModelProvider):
+    """Amazon Titan Text models"""
+
+    def build_body(
+        self,
+        prompt: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.5,
+        top_k: Optional[int] = None,
+        top_p: float = 0.5,
+        stop_sequences: Optional[List[str]] = None,
+    ) -> dict:
+        # Titan has no top_k; it is accepted (and ignored) so pages can pass the same parameters
+        return {
+            "inputText": prompt,
+            "textGenerationConfig": {
+                "maxTokenCount": min(max_tokens, 8192),
+                "temperature": temperature,
+                "topP": top_p,
+                "stopSequences": stop_sequences or [],
+            },
+        }
+
+    def parse_response(self, response_body: dict) -> str:
+        return response_body["results"][0]["outputText"]
+
+    def temperature(self, body: dict) -> Optional[float]:
+        return body["textGenerationConfig"].get("temperature")
+
+    def parse_stream_chunk(self, payload: dict) -> Optional[str]:
+        return payload.get("outputText")
+
+
+class MetaLlamaProvider(ModelProvider):
+    """Meta Llama 2 chat models"""
+
+    def build_body(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.5,
+        top_k: Optional[int] = None,
+        top_p: float = 0.5,
+        stop_sequences: Optional[List[str]] = None,
+    ) -> dict:
+        # Llama 2 on Bedrock takes neither top_k nor stop sequences; both are accepted and ignored
+        return {
+            "prompt": f"[INST] {prompt} [/INST]",
+            "max_gen_len": min(max_tokens, 2048),
+            "temperature": temperature,
+            "top_p": top_p,
+        }
+
+    def parse_response(self, response_body: dict) -> str:
+        return response_body["generation"]
+
+    def parse_stream_chunk(self, payload: dict) -> Optional[str]:
+        return payload.get("generation")
+
+
+class CohereCommandProvider(ModelProvider):
+    """Cohere Command text models"""
+
+    def build_body(
+        self,
+        prompt: str,
+        max_tokens: int = 4000,
+        temperature: float = 0.5,
+        top_k: int = 250,
+        top_p: float = 0.5,
+        stop_sequences: Optional[List[str]] = None,
+    ) -> dict:
+        body = {
+            "prompt": prompt,
+            "max_tokens": min(max_tokens, 4000),
+            "temperature": temperature,
+            "k": min(top_k, 500),
+            "p": min(top_p, 0.99),
+        }
+        if stop_sequences:
+            body["stop_sequences"] = stop_sequences
+        return body
+
+    def build_stream_body(self, **params) -> dict:
+        # Cohere only streams when asked to in the body, as well as through the streaming API
+        return {**self.build_body(**params), "stream": True}
+
+    def parse_response(self, response_body: dict) -> str:
+        return response_body["generations"][0]["text"]
+
+    def parse_stream_chunk(self, payload: dict) -> Optional[str]:
+        # The final chunk repeats the whole response, with is_finished set
+        if payload.get("is_finished"):
+            return None
+        return payload.get("text")
+
+
+class TitanEmbeddingProvider(ModelProvider):
+    """Amazon Titan Text Embeddings"""
+
+    def build_body(self, prompt: str) -> dict:
+        return {"inputText": prompt}
+
+    def parse_response(self, response_body: dict) -> List[float]:
+        return response_body["embedding"]
+
+
+class StabilityImageProvider(ModelProvider):
+    """Stability AI Stable Diffusion XL, for text-to-image and image-to-image"""
+
+    def build_body(
+        self,
+        prompt: str,
+        negative_prompts: Optional[List[str]] = None,
+        cfg_scale: float = 5,
+        seed: int = 0,
+        steps: int = 50,
+        style_preset: Optional[str] = None,
+        init_image: Optional[str] = None,
+    ) -> dict:
+        body = {
+            "text_prompts": (
+                [{"text": prompt, "weight": 1.0}]
+                + [{"text": negprompt, "weight": -1.0} for negprompt in negative_prompts or []]
+            ),
+            "cfg_scale": cfg_scale,
+            "seed": seed,
+            "steps": steps,
+        }
+        if style_preset:
+            body["style_preset"] = style_preset
+        if init_image:
+            body["init_image"] = init_image
+        return body
+
+    def parse_response(self, response_body: dict) -> bytes:
+        """PNG bytes of the first generated image"""
+        artifact = response_body["artifacts"][0]
+        if artifact.get("finishReason") == "ERROR":
+            raise ValueError(f"Image generation failed: {response_body.get('result')}")
+        return decode_image(artifact["base64"])
+
+
+# Matched on model ID prefix, most specific first
+PROVIDERS = [
+    ("anthropic.", AnthropicTextProvider()),
+    ("amazon.titan-text", TitanTextProvider()),
+    ("amazon.titan-tg1", TitanTextProvider()),
+    ("amazon.titan-embed-text", TitanEmbeddingProvider()),
+    ("meta.llama2", MetaLlamaProvider()),
+    ("cohere.command", CohereCommandProvider()),
+    ("stability.", StabilityImageProvider()),
+]
+
+
+def get_provider(model_id: str) -> ModelProvider:
+    """Look up the adapter for a Bedrock model ID"""
+    for prefix, provider in PROVIDERS:
+        if model_id.startswith(prefix):
+            return provider
+    raise ValueError(f"No provider adapter registered for model {model_id!r}")
+
+
+_fake_client: Optional[Any] = None
+_fake_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """The Bedrock runtime client to use when none is given
+
+    Set BEDROCK_FAKE=1 to use the offline `fake_bedrock.FakeBedrockClient` instead of AWS. boto3
+    is only imported here, so pages can render their header before paying for it (see `warmup`).
+    Either way, the same client is returned on every call.
+    """
+    global _fake_client
+    if os.environ.get("BEDROCK_FAKE"):
+        from .fake_bedrock import FakeBedrockClient
+
+        with _fake_client_lock:
+            if _fake_client is None:
+                _fake_client = FakeBedrockClient()
+            return _fake_client
+    from .bedrock import get_bedrock_client
+
+    return get_bedrock_client(
+        assumed_role=os.environ.get("BEDROCK_ASSUME_ROLE", None),
+        region=os.environ.get("AWS_DEFAULT_REGION", None),
+    )
+
+
+class RequestTemplate(BodyTemplate):
+    """A model's request body serialized once (see `templates.BodyTemplate`); use `prepare_request`"""
+
+    def __init__(self, model_id: str, stream: bool, **kwargs):
+        self.model_id = model_id
+        self.stream = stream
+        super().__init__(**kwargs)
+
+
+_prepared: "OrderedDict[str, RequestTemplate]" = OrderedDict()
+_prepared_lock = threading.Lock()
+
+
+def prepare_request(
+    model_id: str,
+    fields: Sequence[str] = ("prompt",),
+    raw_fields: Sequence[str] = (),
+    stream: bool = False,
+    **params,
+) -> RequestTemplate:
+    """The model's request body for `params`, serialized once, to pass to `invoke` as `request`
+
+    Parameters
+    ----------
+    model_id :
+        Bedrock model ID; selects the provider adapter.
+    fields :
+        String parameters given to each `invoke` call instead, e.g. `prompt`.
+    raw_fields :
+        String parameters given to each call that need no JSON escaping (like a base64
+        `init_image`), spliced into the body as they are.
+    stream :
+        Prepare the body for `invoke_stream` rather than `invoke`.
+    **params :
+        The other provider-specific parameters, the same for every call.
+
+    The same template is returned while called with the same arguments (for the last
+    MAX_PREPARED_REQUESTS sets of arguments), so pages can call this on every rerun.
+    """
+    key = json.dumps([model_id, list(fields), list(raw_fields), stream, params], sort_keys=True, default=str)
+    with _prepared_lock:
+        template = _prepared.get(key)
+        if template is not None:
+            _prepared.move_to_end(key)
+            return template
+    provider = get_provider(model_id)
+    template = RequestTemplate(
+        model_id,
+        stream,
+        build=provider.build_stream_body if stream else provider.build_body,
+        fields=fields,
+        raw_fields=raw_fields,
+        cacheable=provider.is_cacheable,
+        **params,
+    )
+    with _prepared_lock:
+        _prepared[key] = template
+        while len(_prepared) > MAX_PREPARED_REQUESTS:
+            _prepared.popitem(last=False)
+    return template
+
+
+def _build_body(model_id: str, request: Optional[RequestTemplate], stream: bool, params: dict):
+    if request is None:
+        provider = get_provider(model_id)
+        return provider.build_stream_body(**params) if stream else provider.build_body(**params)
+    if request.model_id != model_id or request.stream != stream:
+        raise ValueError(
+            f"Request was prepared for {'invoke_stream' if request.stream else 'invoke'} with {request.model_id}"
+        )
+    return request.render(**params)
+
+
+def _is_cacheable(provider: ModelProvider, body) -> bool:
+    # Prepared bodies were checked by the provider when they were prepared
+    return body.cacheable if isinstance(body, PreparedBody) else provider.is_cacheable(body)
+
+
+class InvokeResult(NamedTuple):
+    output: Any
+    model_id: str
+    cached: bool
+    latency: float
+    retries: int
+    response_body: dict
+    # Cosine similarity of the matched prompt, when served from the semantic cache
+    similarity: Optional[float] = None
+
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in RETRYABLE_ERRORS
+
+
+def _semantic_scope(
+    model_id: str, params: dict, request: Optional[RequestTemplate] = None, context: Optional[str] = None
+) -> str:
+    # Imported here so pages that don't use the semantic cache don't load numpy
+    from .semantic_cache import semantic_scope
+
+    if request is not None:
+        params = {**request.static, **params}
+    settings = {key: value for key, value in params.items() if key != "prompt"}
+    if context is not None:
+        settings["semantic_context"] = context
+    return semantic_scope(model_id, settings)
+
+
+def invoke(
+    model_id: str,
+    client=None,
+    cache: Optional[ResponseCache] = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    semantic_cache=None,
+    semantic_prompt: Optional[str] = None,
+    semantic_context: Optional[str] = None,
+    request: Optional[RequestTemplate] = None,
+    **params,
+) -> InvokeResult:
+    """Invoke a Bedrock model and return its parsed output
+
+    Parameters
+    ----------
+    model_id :
+        Bedrock model ID; selects the provider adapter.
+    client :
+        Optional boto3 `bedrock-runtime` client (or fake). Defaults to `get_default_client()`.
+    cache :
+        Optional response cache for deterministic requests. Defaults to the process-wide cache.
+    max_retries :
+        Extra attempts, with jittered exponential backoff, for errors in `RETRYABLE_ERRORS` that
+        are still failing after botocore's own retries. While the model's governor is enabled
+        (see `throttling`), throttled requests are instead queued again, without a backoff of
+        their own, up to BEDROCK_MAX_THROTTLE_RETRIES times; pass 0 to fail on throttling.
+    semantic_cache :
+        Optional `semantic_cache.SemanticCache` for text models. If an earlier prompt with the same
+        model and other parameters is similar enough, its completion is returned without calling
+        the model (whatever the temperature); otherwise the new completion is added to it.
+    semantic_prompt :
+        Text compared with earlier prompts in the semantic cache instead of the whole `prompt`,
+        e.g. just the latest message of a chat.
+    semantic_context :
+        Anything else the completion depends on, matched exactly rather than by similarity, e.g. a
+        digest of the chat so far (see `chat.Conversation.context_digest`).
+    request :
+        Optional request body prepared with `prepare_request`, in which case `params` are only its
+        `fields` and `raw_fields`.
+    **params :
+        Provider-specific parameters, e.g. `prompt`, `max_tokens`, `temperature`.
+    """
+    provider = get_provider(model_id)
+    client = client or get_default_client()
+    body = _build_body(model_id, request, False, params)
+
+    if semantic_cache is not None:
+        start_time = time.time()
+        scope = _semantic_scope(model_id, params, request, semantic_context)
+        semantic_prompt = params["prompt"] if semantic_prompt is None else semantic_prompt
+        hit = semantic_cache.lookup(scope, semantic_prompt)
+        if hit is not None:
+            latency = time.time() - start_time
+            record_invocation(model_id, latency, cached=True)
+            return InvokeResult(hit.completion, model_id, True, latency, 0, {}, similarity=hit.similarity)
+
+    governor = get_governor(model_id)
+    throttle_retries = DEFAULT_MAX_THROTTLE_RETRIES if governor is not None and max_retries else 0
+
+    start_time = time.time()
+    attempt = failures = throttles = 0
+    while True:
+        try:
+            response = cached_invoke_model(
+                client, body, model_id, cache=cache, governor=governor, cacheable=_is_cacheable(provider, body)
+            )
+            break
+        except ClientError as e:
+            if governor is not None and is_throttling_error(e) and throttles < throttle_retries:
+                throttles += 1
+            elif failures < max_retries and _is_retryable(e):
+                time.sleep(random.uniform(0, 2 ** failures))
+                failures += 1
+            else:
+                record_invocation(
+                    model_id, time.time() - start_time, retries=attempt, error=e.response.get("Error", {}).get("Code")
+                )
+                raise
+            attempt += 1
+    latency = time.time() - start_time
+
+    record_invocation(
+        model_id,
+        latency,
+        ttfb=response.ttfb,
+        request_bytes=response.request_bytes,
+        response_bytes=response.response_bytes,
+        input_tokens=response.input_tokens,
+        output_tokens=response.output_tokens,
+        retries=attempt + response.retry_attempts,
+        cached=response.cached,
+    )
+    output = provider.parse_response(response.body)
+    if semantic_cache is not None and not response.cached:
+        semantic_cache.put(scope, semantic_prompt, output)
+    return InvokeResult(
+        output=output,
+        model_id=model_id,
+        cached=response.cached,
+        latency=latency,
+        retries=attempt + response.retry_attempts,
+        response_body=response.body,
+    )
+
+
+def _record_stream(chunks: Iterator[str], model_id: str, stats: StreamStats, request_bytes: int) -> Iterator[str]:
+    """Pass through a completion stream, recording its metrics once it finishes or is closed"""
+    error = None
+    response_bytes = 0
+    try:
+        for chunk in chunks:
+            response_bytes += len(chunk.encode("utf-8"))
+            yield chunk
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        chunks.close()
+        record_invocation(
+            model_id,
+            (stats.end_time or time.time()) - stats.start_time,
+            ttfb=stats.time_to_first_token,
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            input_tokens=stats.input_tokens,
+            output_tokens=stats.output_tokens,
+            cached=stats.cached,
+            error=error,
+            streaming=True,
+        )
+
+
+def _requeue_throttled(start_stream: Callable[[], Iterator[str]], retries: int) -> Iterator[str]:
+    """Pass through the stream from `start_stream()`, starting it again if it is throttled before
+    its first chunk (each new start waits its turn at the model's governor again)"""
+    for attempt in range(retries + 1):
+        chunks = start_stream()
+        started = False
+        try:
+            for chunk in chunks:
+                started = True
+                yield chunk
+            return
+        except ClientError as e:
+            if started or attempt == retries or not is_throttling_error(e):
+                raise
+        finally:
+            chunks.close()
+
+
+def _semantic_hit_stream(completion: str) -> Iterator[str]:
+    yield completion
+
+
+def _remember_stream(chunks: Iterator[str], semantic_cache, scope: str, prompt: str, stats: StreamStats) -> Iterator[str]:
+    """Pass through a completion stream, adding it to the semantic cache if it runs to the end
+    (and wasn't itself served from the exact-match cache)"""
+    completion = []
+    try:
+        for chunk in chunks:
+            completion.append(chunk)
+            yield chunk
+    finally:
+        chunks.close()
+    if not stats.cached:
+        semantic_cache.put(scope, prompt, "".join(completion))
+
+
+def invoke_stream(
+    model_id: str,
+    client=None,
+    stats: Optional[StreamStats] = None,
+    cache: Optional[ResponseCache] = None,
+    semantic_cache=None,
+    semantic_prompt: Optional[str] = None,
+    semantic_context: Optional[str] = None,
+    request: Optional[RequestTemplate] = None,
+    **params,
+) -> Iterator[str]:
+    """Invoke a text model with response streaming, yielding chunks of the output as they arrive
+
+    See `streaming.stream_completion` for how caching and early closing behave. Parameters are as
+    for `invoke`; a throttled stream is queued again behind the model's governor like in `invoke`,
+    and a semantic cache hit is yielded as a single chunk (with `stats.similarity` set). A
+    `request` must have been prepared with `prepare_request(..., stream=True)`.
+    """
+    provider = get_provider(model_id)
+    client = client or get_default_client()
+    body = _build_body(model_id, request, True, params)
+    stats = stats or StreamStats()
+
+    if semantic_cache is not None:
+        scope = _semantic_scope(model_id, params, request, semantic_context)
+        semantic_prompt = params["prompt"] if semantic_prompt is None else semantic_prompt
+        hit = semantic_cache.lookup(scope, semantic_prompt)
+        if hit is not None:
+            stats.cached = True
+            stats.similarity = hit.similarity
+            stats.first_token_time = stats.end_time = time.time()
+            return _record_stream(_semantic_hit_stream(hit.completion), model_id, stats, 0)
+
+    governor = get_governor(model_id)
+    start_stream = partial(
+        stream_completion,
+        client,
+        body,
+        model_id,
+        stats=stats,
+        cache=cache,
+        parse_chunk=provider.parse_stream_chunk,
+        governor=governor,
+        cacheable=_is_cacheable(provider, body),
+    )
+    chunks = _requeue_throttled(start_stream, DEFAULT_MAX_THROTTLE_RETRIES if governor is not None else 0)
+    if semantic_cache is not None:
+        chunks = _remember_stream(chunks, semantic_cache, scope, semantic_prompt, stats)
+    # The body is serialized again here only to measure it; it's small for text models
+    return _record_stream(chunks, model_id, stats, len(serialize_body(body)))
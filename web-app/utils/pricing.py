@@ -0,0 +1,39 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Rough cost estimates for Bedrock text model invocations
+
+Prices are on-demand USD per 1,000 tokens in us-east-1, as published on the Amazon Bedrock pricing
+page at the time of writing. They are only meant for comparing models side by side - check
+https://aws.amazon.com/bedrock/pricing/ for current figures, and set BEDROCK_PRICES_PATH to a JSON
+file of `{"model_id": [input_price, output_price]}` to override or extend them.
+"""
+# Python Built-Ins:
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+
+# (input, output) USD per 1,000 tokens
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "anthropic.claude-v2": (0.008, 0.024),
+    "anthropic.claude-v2:1": (0.008, 0.024),
+    "anthropic.claude-instant-v1": (0.0008, 0.0024),
+    "amazon.titan-text-express-v1": (0.0008, 0.0016),
+    "amazon.titan-text-lite-v1": (0.0003, 0.0004),
+    "meta.llama2-13b-chat-v1": (0.00075, 0.001),
+    "meta.llama2-70b-chat-v1": (0.00195, 0.00256),
+    "cohere.command-text-v14": (0.0015, 0.002),
+    "cohere.command-light-text-v14": (0.0003, 0.0006),
+}
+
+if os.environ.get("BEDROCK_PRICES_PATH"):
+    with open(os.environ["BEDROCK_PRICES_PATH"]) as f:
+        MODEL_PRICES.update({model_id: tuple(prices) for model_id, prices in json.load(f).items()})
+
+
+def estimate_cost(model_id: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> Optional[float]:
+    """Estimated USD cost of one invocation, or None if the model's price or token counts are unknown"""
+    prices = MODEL_PRICES.get(model_id)
+    if prices is None or input_tokens is None or output_tokens is None:
+        return None
+    return (input_tokens * prices[0] + output_tokens * prices[1]) / 1000
@@ -0,0 +1,288 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Persistent, incrementally built FAISS index of document chunks for retrieval-augmented generation
+
+Documents are indexed page by page: each page's text is hashed, and only pages not already in the
+index with the same hash are chunked and embedded, so re-uploading a document that has grown (or
+changed) only indexes its new (or changed) pages. Embedding runs in batches, overlapping with PDF
+text extraction, through the process-wide `embedding_service.EmbeddingService`: how many batches
+are embedded at once is its EMBEDDING_MAX_CONCURRENCY, shared with every other session.
+
+A collection is stored in its own directory as `index.faiss` (memory-mapped when loaded), plus
+`chunks.jsonl` holding the text of every chunk by ID.
+"""
+# Python Built-Ins:
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# External Dependencies:
+import numpy as np
+
+# Local Dependencies:
+from .embedding_service import get_embedding_service
+from .summarize import split_text
+from .templates import PromptTemplate
+
+
+DEFAULT_INDEX_DIR = os.environ.get("RAG_INDEX_DIR") or os.path.join(tempfile.gettempdir(), "bedrock-rag")
+DEFAULT_CHUNK_TOKENS = 400
+DEFAULT_EMBED_BATCH_SIZE = 16
+# Batches in flight at once, for embedders that don't set their own `max_concurrency`
+DEFAULT_INDEX_WORKERS = int(os.environ.get("RAG_INDEX_WORKERS", 8))
+
+# Prompt answering a question from the retrieved chunks (as `<document>` elements)
+ANSWER_PROMPT = PromptTemplate("""
+    Answer the question using only the following documents. If they don't contain the answer, say so.
+    <documents>
+    {context}
+    </documents>
+
+    Question: {question}
+""")
+
+
+class Chunk(NamedTuple):
+    id: int
+    document: str
+    page: int
+    page_hash: str
+    text: str
+
+
+class SearchHit(NamedTuple):
+    chunk: Chunk
+    score: float
+
+
+class IndexStats(NamedTuple):
+    pages: int
+    new_pages: int
+    chunks: int
+    seconds: float
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class DocumentIndex:
+    """FAISS inner-product index over document chunks, persisted in `directory`
+
+    Parameters
+    ----------
+    directory :
+        Where the collection is stored. Created if needed; an existing index there is loaded.
+    embedder :
+        Object with an `embed(texts) -> np.ndarray` method returning L2-normalized rows.
+    """
+
+    def __init__(self, directory: str, embedder):
+        # Imported here: faiss is only needed once a page actually uses an index
+        import faiss
+
+        self._faiss = faiss
+        self.directory = directory
+        self.embedder = embedder
+        self._index = None
+        self._chunks: Dict[int, Chunk] = {}
+        # (document, page) -> (page hash, chunk IDs)
+        self._pages: Dict[Tuple[str, int], Tuple[str, List[int]]] = {}
+        self._next_id = 0
+        # One document is indexed at a time; `_lock` is only held while the index is updated, so
+        # searches carry on while new pages are embedded
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.faiss")
+
+    @property
+    def _chunks_path(self) -> str:
+        return os.path.join(self.directory, "chunks.jsonl")
+
+    def _load(self):
+        try:
+            with open(self._chunks_path) as f:
+                for line in f:
+                    try:
+                        chunk = Chunk(*json.loads(line))
+                    except (ValueError, TypeError):
+                        # The tail of a write cut short; that page is indexed again next time
+                        continue
+                    self._chunks[chunk.id] = chunk
+        except FileNotFoundError:
+            return
+        if os.path.exists(self._index_path):
+            # Memory-mapped, so a large index is paged in on demand rather than read up front
+            self._index = self._faiss.read_index(self._index_path, self._faiss.IO_FLAG_MMAP)
+        indexed = set() if self._index is None else set(self._faiss.vector_to_array(self._index.id_map).tolist())
+        for id, chunk in list(self._chunks.items()):
+            if id not in indexed:
+                del self._chunks[id]
+                continue
+            self._pages.setdefault((chunk.document, chunk.page), (chunk.page_hash, []))[1].append(id)
+            self._next_id = max(self._next_id, id + 1)
+
+    def _save(self):
+        tmp_path = f"{self._index_path}.tmp"
+        self._faiss.write_index(self._index, tmp_path)
+        os.replace(tmp_path, self._index_path)
+        with open(f"{self._chunks_path}.tmp", "w") as f:
+            for chunk in self._chunks.values():
+                f.write(json.dumps(list(chunk)) + "\n")
+        os.replace(f"{self._chunks_path}.tmp", self._chunks_path)
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def documents(self) -> Dict[str, int]:
+        """Number of indexed pages by document name"""
+        counts = {}
+        with self._lock:
+            for document, _ in self._pages:
+                counts[document] = counts.get(document, 0) + 1
+        return counts
+
+    def add_document(
+        self,
+        name: str,
+        pages: Iterable[str],
+        chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+        batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        workers: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> IndexStats:
+        """Index the new or changed pages of document `name`, and save the collection
+
+        Pages are consumed lazily (e.g. from `summarize.iter_pdf_pages`). Chunks are embedded in
+        batches of `batch_size` texts, with up to `workers` batches in flight at once: by default,
+        as many as the embedder runs at once (an `EmbeddingService`'s `max_concurrency`), or
+        RAG_INDEX_WORKERS. `on_progress(chunks_done, chunks_submitted)` is called from the calling
+        thread.
+        """
+        start_time = time.time()
+        workers = workers or getattr(self.embedder, "max_concurrency", DEFAULT_INDEX_WORKERS)
+        with self._write_lock:
+            pending = {}
+            batch: List[Chunk] = []
+            new_chunks: List[Tuple[Chunk, np.ndarray]] = []
+            replaced: List[int] = []
+            submitted = page_count = new_pages = 0
+            seen_pages = set()
+
+            def collect(return_when):
+                done, _ = wait(pending, return_when=return_when)
+                for future in done:
+                    chunks = pending.pop(future)
+                    new_chunks.extend(zip(chunks, future.result()))
+                if on_progress is not None:
+                    on_progress(len(new_chunks), submitted)
+
+            def submit(executor):
+                nonlocal batch, submitted
+                if len(pending) >= workers:
+                    collect(FIRST_COMPLETED)
+                pending[executor.submit(self.embedder.embed, [chunk.text for chunk in batch])] = batch
+                submitted += len(batch)
+                batch = []
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-index") as executor:
+                try:
+                    for number, text in enumerate(pages, start=1):
+                        page_count += 1
+                        seen_pages.add(number)
+                        digest = page_hash(text)
+                        existing = self._pages.get((name, number))
+                        if existing is not None and existing[0] == digest:
+                            continue
+                        new_pages += 1
+                        if existing is not None:
+                            replaced.extend(existing[1])
+                        for piece in split_text([text], chunk_tokens=chunk_tokens):
+                            batch.append(Chunk(self._next_id, name, number, digest, piece))
+                            self._next_id += 1
+                            if len(batch) >= batch_size:
+                                submit(executor)
+                    if batch:
+                        submit(executor)
+                    while pending:
+                        collect(FIRST_COMPLETED)
+                finally:
+                    for future in pending:
+                        future.cancel()
+
+            # Pages beyond the end of a document that got shorter
+            replaced.extend(
+                id for (document, number), (_, ids) in self._pages.items()
+                if document == name and number not in seen_pages for id in ids
+            )
+            self._commit(name, new_chunks, replaced, seen_pages)
+
+        return IndexStats(page_count, new_pages, len(new_chunks), time.time() - start_time)
+
+    def _commit(self, name: str, new_chunks: List[Tuple[Chunk, np.ndarray]], replaced: List[int], seen_pages: set):
+        if not new_chunks and not replaced:
+            return
+        with self._lock:
+            if replaced:
+                self._index.remove_ids(np.asarray(replaced, dtype=np.int64))
+                for id in replaced:
+                    self._chunks.pop(id, None)
+                self._pages = {
+                    key: value for key, value in self._pages.items()
+                    if key[0] != name or (key[1] in seen_pages and not set(value[1]) & set(replaced))
+                }
+            if new_chunks:
+                vectors = np.ascontiguousarray(np.stack([vector for _, vector in new_chunks]), dtype=np.float32)
+                if self._index is None:
+                    self._index = self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(vectors.shape[1]))
+                self._index.add_with_ids(vectors, np.asarray([chunk.id for chunk, _ in new_chunks], dtype=np.int64))
+                for chunk, _ in new_chunks:
+                    self._chunks[chunk.id] = chunk
+                    self._pages.setdefault((name, chunk.page), (chunk.page_hash, []))[1].append(chunk.id)
+            self._save()
+
+    def search(self, query: str, k: int = 4) -> Tuple[List[SearchHit], Dict[str, float]]:
+        """Top-`k` chunks most similar to `query`, and the seconds spent in each stage"""
+        timings = {}
+        start_time = time.time()
+        vector = np.ascontiguousarray(self.embedder.embed([query]), dtype=np.float32)
+        timings["embed"] = time.time() - start_time
+
+        start_time = time.time()
+        with self._lock:
+            hits = []
+            if self._index is not None and self._index.ntotal:
+                scores, ids = self._index.search(vector, min(k, self._index.ntotal))
+                hits = [
+                    SearchHit(self._chunks[int(id)], float(score))
+                    for score, id in zip(scores[0], ids[0]) if int(id) in self._chunks
+                ]
+        timings["search"] = time.time() - start_time
+        return hits, timings
+
+
+_indexes: Dict[str, DocumentIndex] = {}
+_indexes_lock = threading.Lock()
+_COLLECTION_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def get_document_index(collection: str = "default", directory: str = DEFAULT_INDEX_DIR) -> DocumentIndex:
+    """Get the process-wide index of a named collection, stored under RAG_INDEX_DIR"""
+    name = _COLLECTION_RE.sub("-", collection).strip("-.") or "default"
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None:
+            index = DocumentIndex(os.path.join(directory, name), get_embedding_service())
+            _indexes[name] = index
+        return index
@@ -0,0 +1,273 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Content-addressed cache of Bedrock responses for deterministic requests"""
+# Python Built-Ins:
+from collections import OrderedDict
+from contextlib import nullcontext
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import NamedTuple, Optional, Union
+
+# Local Dependencies:
+from .templates import PreparedBody
+
+
+# Default in-memory budget: enough for a few hundred SDXL images (~0.5 MB of base64 each)
+DEFAULT_MAX_BYTES = int(os.environ.get("BEDROCK_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+DEFAULT_DISK_MAX_BYTES = int(os.environ.get("BEDROCK_CACHE_DIR_MAX_BYTES", 1024**3))
+# Responses stored between checks of the on-disk tier's size
+PRUNE_EVERY = 50
+
+
+def cache_key(modelId: str, body: Union[dict, PreparedBody], stream: bool = False) -> str:
+    """Canonical SHA-256 hash of a model ID and request body, independent of key order/whitespace
+
+    Prepared bodies are hashed as they are: `templates.BodyTemplate` always lays them out the same.
+    Streamed responses are cached in a different format than the model's own response body (see
+    `streaming.stream_completion`), so they get different keys for the same request.
+    """
+    kind = "stream" if stream else "invoke"
+    if isinstance(body, PreparedBody):
+        digest = hashlib.sha256(f"{modelId}\n{kind}\n".encode("utf-8"))
+        digest.update(body.text.encode("utf-8"))
+        return digest.hexdigest()
+    canonical = json.dumps([modelId, kind, body], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(body: Union[dict, PreparedBody], temperature: Optional[float] = None) -> bool:
+    """Whether a request is deterministic enough to cache
+
+    Image requests are deterministic for a given seed, and text requests are when sampled at
+    temperature 0. Anything sampled at a non-zero temperature is expected to vary between calls.
+    Pass the sampling `temperature` for models that don't take it as a top-level `temperature`
+    field (see `models.ModelProvider.temperature`).
+    """
+    if isinstance(body, PreparedBody):
+        return body.cacheable
+    return not (body.get("temperature") if temperature is None else temperature)
+
+
+def serialize_body(body: Union[dict, PreparedBody]) -> str:
+    """The JSON to send for a request body (prepared bodies are already serialized)"""
+    return body.text if isinstance(body, PreparedBody) else json.dumps(body)
+
+
+class ResponseCache:
+    """Two-tier cache of response bytes: a size-bounded in-memory LRU and an optional directory
+
+    Parameters
+    ----------
+    max_bytes :
+        Maximum total size of the values held in memory. Least recently used entries are evicted
+        first. Values larger than this are only stored on disk (if enabled).
+    directory :
+        Optional directory for the on-disk tier. Disk hits are promoted into the memory tier.
+    disk_max_bytes :
+        Size of the on-disk tier above which its least recently used entries are deleted
+        (checked every PRUNE_EVERY puts).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        directory: Optional[str] = None,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _remember(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = value
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    value = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                # Mark as recently used, so `prune` deletes it last
+                try:
+                    os.utime(self._path(key))
+                except FileNotFoundError:
+                    pass
+                with self._lock:
+                    self._remember(key, value)
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._remember(key, value)
+
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._puts += 1
+                prune = self._puts % PRUNE_EVERY == 0
+            if prune:
+                self.prune()
+
+    def prune(self):
+        """Delete the least recently used entries on disk until the tier is under `disk_max_bytes`
+
+        Files still being written (`.tmp`) are left alone, and so are files other threads or
+        tasks delete first.
+        """
+        if not self.directory:
+            return
+        entries, total = [], 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for file in os.scandir(entry.path):
+                if file.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue
+                total += stat.st_size
+                entries.append((stat.st_mtime, stat.st_size, file.path))
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Empty the in-memory tier (the on-disk tier is left alone)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache
+
+    Configured by the BEDROCK_CACHE_MAX_BYTES, (optional) BEDROCK_CACHE_DIR and
+    BEDROCK_CACHE_DIR_MAX_BYTES environment variables.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(directory=os.environ.get("BEDROCK_CACHE_DIR") or None)
+        return _default_cache
+
+
+class InvokeResponse(NamedTuple):
+    """Parsed response of `cached_invoke_model`, with the request details worth measuring"""
+    body: dict
+    cached: bool
+    request_bytes: int = 0
+    response_bytes: int = 0
+    retry_attempts: int = 0
+    ttfb: Optional[float] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+def _header_int(headers: dict, name: str) -> Optional[int]:
+    value = headers.get(name)
+    return int(value) if value is not None else None
+
+
+def cached_invoke_model(
+    client,
+    body: Union[dict, PreparedBody],
+    modelId: str,
+    accept: str = "application/json",
+    contentType: str = "application/json",
+    cache: Optional[ResponseCache] = None,
+    governor=None,
+    cacheable: Optional[bool] = None,
+) -> InvokeResponse:
+    """Call `invoke_model`, serving deterministic requests from the response cache when possible
+
+    On a cache hit no request is sent to Bedrock at all, and `cached` is True in the result.
+    Otherwise the result also reports the request/response sizes, botocore's retry count, the time
+    until the response headers arrived and (where Bedrock reports them) token counts. If a
+    `throttling.ModelGovernor` is given, the request waits for one of its slots first (cache hits
+    don't). Whether the response may be cached is decided by `is_cacheable`, unless `cacheable` is
+    given.
+    """
+    if cacheable is None:
+        cacheable = is_cacheable(body)
+    if cacheable:
+        cache = cache or get_response_cache()
+        key = cache_key(modelId, body)
+        raw = cache.get(key)
+        if raw is not None:
+            return InvokeResponse(json.loads(raw), True, response_bytes=len(raw))
+
+    request = serialize_body(body)
+    with governor.slot() if governor is not None else nullcontext() as slot:
+        start_time = time.time()
+        response = client.invoke_model(body=request, modelId=modelId, accept=accept, contentType=contentType)
+        ttfb = time.time() - start_time
+        raw = response.get("body").read()
+        metadata = response.get("ResponseMetadata", {})
+        if slot is not None and metadata.get("RetryAttempts"):
+            slot.congested = True
+    if cacheable:
+        cache.put(key, raw)
+
+    headers = metadata.get("HTTPHeaders", {})
+    return InvokeResponse(
+        json.loads(raw),
+        False,
+        request_bytes=len(request),
+        response_bytes=len(raw),
+        retry_attempts=metadata.get("RetryAttempts", 0),
+        ttfb=ttfb,
+        input_tokens=_header_int(headers, "x-amzn-bedrock-input-token-count"),
+        output_tokens=_header_int(headers, "x-amzn-bedrock-output-token-count"),
+    )
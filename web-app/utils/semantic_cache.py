@@ -0,0 +1,224 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Semantic cache of text completions: near-duplicate prompts get the earlier completion
+
+Unlike the exact-match `response_cache`, prompts are compared by the cosine similarity of their
+embeddings (in a FAISS inner-product index), and completions sampled at any temperature are
+reused. Entries are scoped by model and generation parameters, so a prompt is only matched
+against earlier prompts sent with the same settings.
+"""
+# Python Built-Ins:
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+# External Dependencies:
+import numpy as np
+
+# Local Dependencies:
+from .embedding_service import get_embedding_service
+from .metrics import get_metrics
+
+
+DEFAULT_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 10000))
+DEFAULT_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 24 * 3600))
+# Nearest neighbours checked per lookup, since the closest ones may be out of scope or expired
+SEARCH_K = 8
+# Minimum seconds between saves of the index to disk
+SAVE_INTERVAL = 30.0
+
+
+def semantic_scope(model_id: str, settings: dict) -> str:
+    """Scope of a prompt: its model ID and a hash of everything else in the request"""
+    canonical = json.dumps(settings, sort_keys=True, separators=(",", ":"))
+    return f"{model_id}#{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]}"
+
+
+class SemanticHit(NamedTuple):
+    completion: str
+    prompt: str
+    similarity: float
+
+
+class _Entry(NamedTuple):
+    scope: str
+    prompt: str
+    completion: str
+    created: float
+
+
+class SemanticCache:
+    """FAISS-backed cache of completions keyed by prompt embedding, with TTL and LRU eviction
+
+    Parameters
+    ----------
+    embedder :
+        Object with an `embed(texts) -> np.ndarray` method returning L2-normalized rows.
+    threshold :
+        Lowest cosine similarity counted as a hit.
+    max_entries :
+        Least recently used entries are evicted beyond this many.
+    ttl :
+        Seconds after which entries expire.
+    directory :
+        Optional directory to persist the index and entries in. They are loaded from there on
+        creation, and saved (at most every SAVE_INTERVAL seconds) as entries are added.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        directory: Optional[str] = None,
+    ):
+        # Imported here: faiss is only needed once a page actually uses the cache
+        import faiss
+
+        self._faiss = faiss
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._saved = 0.0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _embed(self, text: str) -> np.ndarray:
+        return np.ascontiguousarray(self.embedder.embed([text]), dtype=np.float32)
+
+    def _remove(self, ids):
+        for id in ids:
+            self._entries.pop(id, None)
+        if ids:
+            self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def _evict(self, now: float):
+        expired = [id for id, entry in self._entries.items() if now - entry.created > self.ttl]
+        overflow = len(self._entries) - len(expired) - self.max_entries
+        if overflow > 0:
+            # Least recently used first; expired entries are already being removed
+            skip = set(expired)
+            expired.extend([id for id in self._entries if id not in skip][:overflow])
+        self._remove(expired)
+
+    def lookup(self, scope: str, prompt: str) -> Optional[SemanticHit]:
+        """The completion of the most similar earlier prompt in `scope`, if similar enough"""
+        vector = self._embed(prompt)
+        now = time.time()
+        with self._lock:
+            hit = None
+            if self._index is not None and self._index.ntotal:
+                similarities, ids = self._index.search(vector, min(SEARCH_K, self._index.ntotal))
+                for similarity, id in zip(similarities[0], ids[0]):
+                    if similarity < self.threshold:
+                        break
+                    entry = self._entries.get(int(id))
+                    if entry is not None and entry.scope == scope and now - entry.created <= self.ttl:
+                        self._entries.move_to_end(int(id))
+                        hit = SemanticHit(entry.completion, entry.prompt, float(similarity))
+                        break
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        get_metrics().increment("semantic_cache_hits_total" if hit else "semantic_cache_misses_total", scope.rsplit("#", 1)[0])
+        return hit
+
+    def put(self, scope: str, prompt: str, completion: str):
+        """Remember the completion of a prompt"""
+        vector = self._embed(prompt)
+        now = time.time()
+        with self._lock:
+            if self._index is None:
+                self._index = self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(vector.shape[1]))
+            id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.asarray([id], dtype=np.int64))
+            self._entries[id] = _Entry(scope, prompt, completion, now)
+            self._evict(now)
+            if self.directory and now - self._saved > SAVE_INTERVAL:
+                self._save()
+                self._saved = now
+
+    def stats(self) -> dict:
+        """Size and hit rate, for display"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit rate": None if self.hit_rate is None else round(self.hit_rate, 3),
+        }
+
+    def _save(self):
+        index_path = os.path.join(self.directory, "index.faiss")
+        entries_path = os.path.join(self.directory, "entries.json")
+        self._faiss.write_index(self._index, f"{index_path}.tmp")
+        with open(f"{entries_path}.tmp", "w") as f:
+            json.dump({"next_id": self._next_id, "entries": [[id, *entry] for id, entry in self._entries.items()]}, f)
+        os.replace(f"{index_path}.tmp", index_path)
+        os.replace(f"{entries_path}.tmp", entries_path)
+
+    def save(self):
+        """Write the index and entries to `directory` now"""
+        with self._lock:
+            if self.directory and self._index is not None:
+                self._save()
+                self._saved = time.time()
+
+    def _load(self):
+        index_path = os.path.join(self.directory, "index.faiss")
+        entries_path = os.path.join(self.directory, "entries.json")
+        try:
+            with open(entries_path) as f:
+                saved = json.load(f)
+            index = self._faiss.read_index(index_path)
+        except (FileNotFoundError, ValueError, RuntimeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Ignoring unreadable semantic cache in {self.directory}: {e}")
+            return
+        self._index = index
+        self._next_id = saved["next_id"]
+        for id, *entry in saved["entries"]:
+            self._entries[id] = _Entry(*entry)
+        self._evict(time.time())
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Get the process-wide semantic cache
+
+    Configured by the SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_TTL_SECONDS and (optional) SEMANTIC_CACHE_DIR environment variables, and uses
+    `embedding_service.get_embedding_service()`.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SemanticCache(get_embedding_service(), directory=os.environ.get("SEMANTIC_CACHE_DIR") or None)
+        return _default_cache
@@ -0,0 +1,202 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Session state that must survive a reconnect to another task: chat history, result references, job IDs
+
+Streamlit keeps `st.session_state` in the memory of the task serving the websocket, so it is lost
+when the load balancer sends a reconnecting browser to another task, or the task is scaled in.
+Pages keep the state users would miss in a `SessionStore` as well, keyed by a session ID that the
+browser keeps in the `session` query parameter:
+
+    store = get_session_store()
+    sid = session_id(st.session_state, st.query_params)
+    history = store.get(sid, "conversation")
+    ...
+    store.put(sid, "conversation", conversation.to_dict())
+
+Set SESSION_STORE=dynamodb (with SESSION_STORE_TABLE) to share sessions between tasks, or leave
+the default SESSION_STORE=sqlite for a local file (SESSION_STORE_PATH), which is enough for a
+single task and for tests. Values must be JSON-serializable, at most SESSION_STORE_MAX_VALUE_BYTES
+(default 350 KiB, under DynamoDB's 400 KB item limit) as UTF-8 JSON, and expire after
+SESSION_STORE_TTL_SECONDS without being written.
+"""
+# Python Built-Ins:
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, MutableMapping, Optional
+import uuid
+
+
+DEFAULT_TTL = float(os.environ.get("SESSION_STORE_TTL_SECONDS", 7 * 24 * 3600))
+DEFAULT_SQLITE_PATH = os.environ.get("SESSION_STORE_PATH") or os.path.join(tempfile.gettempdir(), "bedrock-sessions.sqlite")
+# DynamoDB items are at most 400 KB, counting the key and attribute names: leave room for those
+MAX_VALUE_BYTES = int(os.environ.get("SESSION_STORE_MAX_VALUE_BYTES", 350 * 1024))
+
+_SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def session_id(state: MutableMapping, query_params: MutableMapping) -> str:
+    """The ID of this browser session, created if needed
+
+    Kept in session state (so it follows the user between pages) and in the `session` query
+    parameter (so it survives reconnecting to a new Streamlit session, on this task or another).
+    """
+    sid = state.get("session_id") or query_params.get("session")
+    if not sid or not _SESSION_ID_RE.match(sid):
+        sid = uuid.uuid4().hex
+    state["session_id"] = sid
+    if query_params.get("session") != sid:
+        query_params["session"] = sid
+    return sid
+
+
+class SessionValueTooLarge(ValueError):
+    """Raised by `SessionStore.put` for values over MAX_VALUE_BYTES of JSON"""
+
+
+def _serialize(value: Any) -> str:
+    """`value` as JSON, checked against MAX_VALUE_BYTES in the UTF-8 bytes actually stored"""
+    # Not ASCII-escaped: a "\\uXXXX" escape takes 6 bytes (12 for an emoji) for what UTF-8 encodes in 2 to 4
+    payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    size = len(payload.encode("utf-8"))
+    if size > MAX_VALUE_BYTES:
+        raise SessionValueTooLarge(f"Session value is {size} bytes, over the limit of {MAX_VALUE_BYTES}")
+    return payload
+
+
+class SessionStore:
+    """JSON values by session ID and name; see `SQLiteSessionStore` and `DynamoDBSessionStore`
+
+    `put` raises `SessionValueTooLarge` for values over MAX_VALUE_BYTES, whatever the backend, so
+    sizes are checked the same way locally as in DynamoDB.
+    """
+
+    def get(self, session_id: str, name: str, default: Any = None) -> Any:
+        raise NotImplementedError()
+
+    def put(self, session_id: str, name: str, value: Any):
+        raise NotImplementedError()
+
+    def delete(self, session_id: str, name: str):
+        raise NotImplementedError()
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a local SQLite file, shared by all processes on the host
+
+    Parameters
+    ----------
+    path :
+        Database file (created if needed), or ":memory:".
+    ttl :
+        Seconds after its last write that a value expires.
+    """
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS session_values ("
+            "session_id TEXT, name TEXT, value TEXT, expires REAL, PRIMARY KEY (session_id, name))"
+        )
+        with self._lock:
+            self._connection.execute("DELETE FROM session_values WHERE expires < ?", (time.time(),))
+
+    def get(self, session_id: str, name: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM session_values WHERE session_id = ? AND name = ? AND expires >= ?",
+                (session_id, name, time.time()),
+            ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def put(self, session_id: str, name: str, value: Any):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO session_values VALUES (?, ?, ?, ?)",
+                (session_id, name, _serialize(value), time.time() + self.ttl),
+            )
+
+    def delete(self, session_id: str, name: str):
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM session_values WHERE session_id = ? AND name = ?", (session_id, name),
+            )
+
+
+class DynamoDBSessionStore(SessionStore):
+    """Session store in a DynamoDB table, shared by all tasks of the service
+
+    The table needs a `session_id` (string) partition key and a `name` (string) sort key. Enable
+    DynamoDB TTL on its `expires` attribute to have expired values deleted.
+
+    Parameters
+    ----------
+    table_name :
+        Name of the table.
+    client :
+        Optional boto3 DynamoDB client.
+    ttl :
+        Seconds after its last write that a value expires.
+    """
+
+    def __init__(self, table_name: str, client=None, ttl: float = DEFAULT_TTL):
+        if client is None:
+            import boto3
+
+            client = boto3.client("dynamodb")
+        self.table_name = table_name
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, session_id: str, name: str) -> dict:
+        return {"session_id": {"S": session_id}, "name": {"S": name}}
+
+    def get(self, session_id: str, name: str, default: Any = None) -> Any:
+        item = self.client.get_item(
+            TableName=self.table_name, Key=self._key(session_id, name), ConsistentRead=True,
+        ).get("Item")
+        # DynamoDB TTL deletes expired items eventually, not straight away
+        if item is None or float(item["expires"]["N"]) < time.time():
+            return default
+        return json.loads(item["value"]["S"])
+
+    def put(self, session_id: str, name: str, value: Any):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                **self._key(session_id, name),
+                "value": {"S": _serialize(value)},
+                "expires": {"N": str(int(time.time() + self.ttl))},
+            },
+        )
+
+    def delete(self, session_id: str, name: str):
+        self.client.delete_item(TableName=self.table_name, Key=self._key(session_id, name))
+
+
+_default_store: Optional[SessionStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Get the process-wide session store, as configured by SESSION_STORE"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            kind = os.environ.get("SESSION_STORE", "sqlite")
+            if kind == "dynamodb":
+                _default_store = DynamoDBSessionStore(os.environ["SESSION_STORE_TABLE"])
+            elif kind == "sqlite":
+                _default_store = SQLiteSessionStore()
+            else:
+                raise ValueError(f"Unknown SESSION_STORE {kind!r}: expected 'sqlite' or 'dynamodb'")
+        return _default_store
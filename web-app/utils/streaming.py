@@ -0,0 +1,156 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Streaming text completions from Amazon Bedrock"""
+# Python Built-Ins:
+from contextlib import nullcontext
+import json
+import time
+from typing import Callable, Iterator, Optional, Union
+
+# Local Dependencies:
+from .response_cache import ResponseCache, cache_key, get_response_cache, is_cacheable, serialize_body
+from .templates import PreparedBody
+
+
+class StreamStats:
+    """Timing and token counts collected while a completion streams in"""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.first_token_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.output_tokens: Optional[int] = None
+        self.input_tokens: Optional[int] = None
+        self.chunks = 0
+        self.cached = False
+        # Cosine similarity of the matched prompt, when served from the semantic cache
+        self.similarity: Optional[float] = None
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Output tokens per second after the first token, or None if not measurable"""
+        if self.first_token_time is None or self.end_time is None or not self.output_tokens:
+            return None
+        generation_time = self.end_time - self.first_token_time
+        if generation_time <= 0:
+            return None
+        return self.output_tokens / generation_time
+
+    def caption(self) -> str:
+        """Short human-readable summary, for display next to the execution time"""
+        if self.cached and self.similarity is not None:
+            return f"Served from semantic cache (similarity {self.similarity:.2f})"
+        if self.cached:
+            return "Served from cache"
+        parts = []
+        if self.time_to_first_token is not None:
+            parts.append(f"Time to first token: {round(self.time_to_first_token, 2)} seconds")
+        if self.tokens_per_second is not None:
+            parts.append(f"{round(self.tokens_per_second, 1)} tokens/sec")
+        return " | ".join(parts)
+
+
+def claude_chunk_text(payload: dict) -> Optional[str]:
+    """Text of one Anthropic Claude (text completions API) stream chunk"""
+    return payload.get("completion")
+
+
+def stream_completion(
+    client,
+    body: Union[dict, PreparedBody],
+    modelId: str,
+    stats: Optional[StreamStats] = None,
+    accept: str = "application/json",
+    contentType: str = "application/json",
+    cache: Optional[ResponseCache] = None,
+    parse_chunk: Callable[[dict], Optional[str]] = claude_chunk_text,
+    governor=None,
+    cacheable: Optional[bool] = None,
+) -> Iterator[str]:
+    """Invoke a text model with response streaming, yielding completion text chunks
+
+    The underlying HTTP stream is closed when the generator is closed, including when a Streamlit
+    rerun or stop interrupts the page while it is still consuming chunks - use it with
+    `contextlib.closing` (or let it be garbage-collected) so the connection goes back to the pool
+    instead of streaming tokens nobody will read.
+
+    Parameters
+    ----------
+    client :
+        boto3 `bedrock-runtime` client.
+    body :
+        Request body (as a dict, or a `templates.PreparedBody`) for the model.
+    modelId :
+        ID of the model to invoke.
+    stats :
+        Optional `StreamStats` to record time-to-first-token and token counts into.
+    cache :
+        Response cache to use for deterministic (temperature 0) requests. Defaults to the
+        process-wide cache. A cache hit yields the whole completion as one chunk without calling
+        Bedrock; a completion is only stored once it has streamed in fully. Completions are
+        stored under their own keys (see `response_cache.cache_key`), apart from `invoke_model`
+        responses to the same request.
+    parse_chunk :
+        Function extracting the text (if any) from one decoded stream chunk. Defaults to the
+        Anthropic Claude format.
+    governor :
+        Optional `throttling.ModelGovernor`. A slot is held from before the request until the
+        stream ends, so streams in progress count against the model's concurrency limit.
+    cacheable :
+        Whether the completion may be cached. Decided by `response_cache.is_cacheable` by default.
+    """
+    if cacheable is None:
+        cacheable = is_cacheable(body)
+    if cacheable:
+        cache = cache or get_response_cache()
+        key = cache_key(modelId, body, stream=True)
+        raw = cache.get(key)
+        if raw is not None:
+            if stats is not None:
+                stats.cached = True
+                stats.first_token_time = stats.end_time = time.time()
+            yield json.loads(raw)["completion"]
+            return
+
+    with governor.slot() if governor is not None else nullcontext() as slot:
+        response = client.invoke_model_with_response_stream(
+            body=serialize_body(body), modelId=modelId, accept=accept, contentType=contentType
+        )
+        if slot is not None and response.get("ResponseMetadata", {}).get("RetryAttempts"):
+            slot.congested = True
+        yield from _read_stream(response.get("body"), key if cacheable else None, cache, stats, parse_chunk)
+
+
+def _read_stream(stream, key, cache, stats, parse_chunk) -> Iterator[str]:
+    """Yield the text of an event stream, caching the full completion under `key` (if not None)"""
+    completion = []
+    try:
+        for event in stream:
+            chunk = event.get("chunk")
+            if not chunk:
+                continue
+            payload = json.loads(chunk.get("bytes").decode())
+            if stats is not None:
+                stats.chunks += 1
+                metrics = payload.get("amazon-bedrock-invocationMetrics")
+                if metrics:
+                    stats.output_tokens = metrics.get("outputTokenCount")
+                    stats.input_tokens = metrics.get("inputTokenCount")
+            text = parse_chunk(payload)
+            if text:
+                if stats is not None and stats.first_token_time is None:
+                    stats.first_token_time = time.time()
+                completion.append(text)
+                yield text
+        if key is not None:
+            cache.put(key, json.dumps({"completion": "".join(completion)}).encode("utf-8"))
+    finally:
+        if stats is not None:
+            stats.end_time = time.time()
+        stream.close()
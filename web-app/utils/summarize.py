@@ -0,0 +1,193 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Map-reduce summarization of documents too long for a single prompt"""
+# Python Built-Ins:
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import itertools
+import re
+from typing import Callable, Iterable, Iterator, List, Optional
+
+# Local Dependencies:
+from .fan_out import DEFAULT_MAX_CONCURRENCY
+from .templates import PromptTemplate
+
+
+DEFAULT_CHUNK_TOKENS = 3000
+
+# Prompt condensing one chunk of a long document (the map/reduce stages)
+CHUNK_SUMMARY_PROMPT = PromptTemplate("""
+    Write a concise summary of the following part of a longer document.
+    <text>
+    {text}
+    </text>
+""")
+# Prompt applying the user's instruction to a text (or its condensed summary)
+INSTRUCTION_PROMPT = PromptTemplate("""
+    {instruction}
+    <text>
+    {text}
+    </text>
+""")
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap estimate of the Claude token count of `text`
+
+    Counts words and punctuation marks, with an extra token for every 6 characters of long words.
+    This errs slightly high for English prose, which is the safe side for fitting a context window.
+    """
+    return sum(1 + len(piece) // 6 for piece in _TOKEN_RE.findall(text))
+
+
+def _split_oversized(text: str, chunk_tokens: int) -> Iterator[str]:
+    """Split one paragraph that doesn't fit in a chunk by sentences, then by words"""
+    for sentence in _SENTENCE_RE.split(text):
+        if estimate_tokens(sentence) <= chunk_tokens:
+            yield sentence
+            continue
+        words, size = [], 0
+        for word in sentence.split():
+            word_tokens = estimate_tokens(word)
+            if words and size + word_tokens > chunk_tokens:
+                yield " ".join(words)
+                words, size = [], 0
+            words.append(word)
+            size += word_tokens
+        if words:
+            yield " ".join(words)
+
+
+def split_text(pages: Iterable[str], chunk_tokens: int = DEFAULT_CHUNK_TOKENS) -> Iterator[str]:
+    """Split a stream of text (e.g. PDF pages) into chunks of at most roughly `chunk_tokens` tokens
+
+    Chunks are built from whole paragraphs where possible, falling back to sentences and then words
+    for paragraphs that are too long on their own. Pages are consumed lazily, so a chunk is yielded
+    as soon as it is full, without reading the rest of the document first.
+    """
+    parts, size = [], 0
+    for page in pages:
+        for paragraph in _PARAGRAPH_RE.split(page):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            pieces = [paragraph]
+            if estimate_tokens(paragraph) > chunk_tokens:
+                pieces = _split_oversized(paragraph, chunk_tokens)
+            for piece in pieces:
+                piece_tokens = estimate_tokens(piece)
+                if parts and size + piece_tokens > chunk_tokens:
+                    yield "\n\n".join(parts)
+                    parts, size = [], 0
+                parts.append(piece)
+                size += piece_tokens
+    if parts:
+        yield "\n\n".join(parts)
+
+
+def iter_pdf_pages(file) -> Iterator[str]:
+    """Extract the text of a PDF one page at a time
+
+    `file` may be a path or a binary file-like object (such as a Streamlit upload). pypdf parses
+    page contents lazily, so only the page being extracted is held in memory as text.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(file)
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def map_chunks(
+    chunks: Iterable[str],
+    summarize_fn: Callable[[str], str],
+    max_concurrency: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[str]:
+    """Summarize every chunk in parallel, returning the summaries in document order
+
+    Chunks are submitted as soon as they are produced (so PDF extraction overlaps with the first
+    map calls) but at most `max_concurrency` are in flight at once. `on_progress(done, submitted)`
+    is called from the calling thread, so it may update Streamlit elements.
+    """
+    max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+    summaries = {}
+    pending = {}
+    submitted = 0
+
+    def collect(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            summaries[pending.pop(future)] = future.result()
+        if on_progress is not None:
+            on_progress(len(summaries), submitted)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        try:
+            for chunk in chunks:
+                if len(pending) >= max_concurrency:
+                    collect(FIRST_COMPLETED)
+                pending[executor.submit(summarize_fn, chunk)] = submitted
+                submitted += 1
+            while pending:
+                collect(FIRST_COMPLETED)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    return [summaries[n] for n in range(submitted)]
+
+
+def map_reduce(
+    pages: Iterable[str],
+    summarize_fn: Callable[[str], str],
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    max_concurrency: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int, int], None]] = None,
+) -> str:
+    """Reduce a document to text that fits in one chunk, by recursively summarizing its parts
+
+    The map stage summarizes each chunk of the document. While the joined summaries are still
+    longer than `chunk_tokens`, they are regrouped into chunks and summarized again (the reduce
+    stage). The result is short enough for one final prompt, which the caller typically streams.
+    A document that already fits in one chunk is returned as-is, without calling `summarize_fn`.
+
+    Parameters
+    ----------
+    pages :
+        The document, as an iterable of text (e.g. `iter_pdf_pages(file)`, or `[text]`).
+    summarize_fn :
+        Function summarizing one chunk of text. Called from worker threads.
+    chunk_tokens :
+        Approximate maximum size of each chunk sent to `summarize_fn`.
+    max_concurrency :
+        Maximum number of `summarize_fn` calls in flight at once.
+    on_progress :
+        Optional callback `on_progress(level, done, total)`, where level 0 is the map stage.
+    """
+    texts = split_text(pages, chunk_tokens)
+    first = next(texts, None)
+    second = next(texts, None)
+    if second is None:
+        return first or ""
+    texts = itertools.chain([first, second], texts)
+
+    level = 0
+    previous_count = None
+    while True:
+        progress = None
+        if on_progress is not None:
+            progress = lambda done, total, level=level: on_progress(level, done, total)
+        summaries = map_chunks(texts, summarize_fn, max_concurrency, on_progress=progress)
+        combined = "\n\n".join(summaries)
+        if len(summaries) <= 1 or estimate_tokens(combined) <= chunk_tokens:
+            return combined
+        if previous_count is not None and len(summaries) >= previous_count:
+            # Summaries aren't getting any shorter; further levels would never converge
+            return combined
+        previous_count = len(summaries)
+        level += 1
+        texts = split_text(summaries, chunk_tokens)
@@ -0,0 +1,86 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Amazon ECS task scale-in protection while background generations are running
+
+Background jobs and batches run in the memory of one task, so scaling that task in would kill
+them. While any are running, the task asks the ECS agent (at ECS_AGENT_URI, set by ECS) to protect
+it from scale-in; protection is removed when the last one finishes, and expires on its own after
+TASK_PROTECTION_MINUTES in case the task can't remove it. Outside ECS this does nothing.
+
+    with get_task_protection().hold():
+        ...  # long-running work
+"""
+# Python Built-Ins:
+from contextlib import contextmanager
+import json
+import os
+import threading
+from typing import Iterator, Optional
+import urllib.request
+
+
+DEFAULT_EXPIRES_MINUTES = int(os.environ.get("TASK_PROTECTION_MINUTES", 60))
+
+
+class TaskProtection:
+    """Reference-counted ECS task scale-in protection
+
+    Parameters
+    ----------
+    agent_uri :
+        ECS agent endpoint, or None to do nothing (e.g. when not running on ECS).
+    expires_minutes :
+        How long each protection lasts unless removed (or renewed by the next `hold`) first.
+    """
+
+    def __init__(self, agent_uri: Optional[str] = None, expires_minutes: int = DEFAULT_EXPIRES_MINUTES):
+        self.agent_uri = agent_uri
+        self.expires_minutes = expires_minutes
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def _set(self, enabled: bool):
+        body = {"ProtectionEnabled": enabled}
+        if enabled:
+            body["ExpiresInMinutes"] = self.expires_minutes
+        request = urllib.request.Request(
+            f"{self.agent_uri}/task-protection/v1/state",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="PUT",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+        except Exception as e:
+            # The work itself should go ahead regardless
+            print(f"Could not {'enable' if enabled else 'disable'} ECS task scale-in protection: {e}")
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        """Keep the task protected for the duration of a `with` block"""
+        with self._lock:
+            self.active += 1
+            if self.agent_uri:
+                # Renewed on every new hold, so long-running tasks stay protected past the expiry
+                self._set(True)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                if self.agent_uri and not self.active:
+                    self._set(False)
+
+
+_default_protection = None
+_default_protection_lock = threading.Lock()
+
+
+def get_task_protection() -> TaskProtection:
+    """Get the process-wide task protection, using ECS_AGENT_URI if set"""
+    global _default_protection
+    with _default_protection_lock:
+        if _default_protection is None:
+            _default_protection = TaskProtection(os.environ.get("ECS_AGENT_URI"))
+        return _default_protection
@@ -0,0 +1,134 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Prompt templates and request bodies compiled once, then filled in per request
+
+`PromptTemplate` normalizes a prompt's whitespace once, when it is defined, so indented
+triple-quoted strings don't send the source's indentation to the model as stray tokens:
+
+    SUMMARY_PROMPT = PromptTemplate('''
+        {instruction}
+        <text>
+        {text}
+        </text>
+    ''')
+    prompt = SUMMARY_PROMPT.render(instruction=instruction, text=text)
+
+`BodyTemplate` serializes the static part of a request body (sampling parameters, negative
+prompts...) to JSON once, and splices in only the fields that change between requests. Fields
+declared raw (such as a base64 `init_image`) are spliced in as they are, after a check that they
+need no escaping, rather than being JSON-encoded again. See `models.prepare_request` for building
+these from a provider's request format.
+"""
+# Python Built-Ins:
+import json
+import re
+import string
+import textwrap
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Tuple
+import uuid
+
+
+_TRAILING_SPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+_BLANK_LINES = re.compile(r"\n{3,}")
+# ASCII characters that need escaping inside a JSON string, which raw fields can't contain. Deleting
+# them with `bytes.translate` checks a 4 MB base64 init image in ~6 ms, against ~32 ms for a regular
+# expression search and ~19 ms for JSON-encoding it (see benchmarks/request_body_bench.py)
+_JSON_UNSAFE = bytes(range(0x20)) + b'"\\'
+
+
+def normalize_prompt(text: str) -> str:
+    """Remove common indentation, trailing spaces, runs of blank lines and leading/trailing blanks"""
+    text = textwrap.dedent(text)
+    text = _TRAILING_SPACE.sub("", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+class PromptTemplate:
+    """A prompt with `{name}` fields (and `{{`/`}}` for literal braces), normalized when compiled
+
+    Field values are inserted as they are, apart from leading and trailing whitespace.
+    """
+
+    def __init__(self, text: str):
+        self.text = normalize_prompt(text)
+        self._parts: List[Tuple[str, str]] = []
+        for literal, field, spec, conversion in string.Formatter().parse(self.text):
+            if spec or conversion:
+                raise ValueError(f"Prompt template field {field!r} can't have a format spec or conversion")
+            self._parts.append((literal, field))
+        self.fields = {field for _, field in self._parts if field is not None}
+
+    def render(self, **values) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Missing prompt template fields: {', '.join(sorted(missing))}")
+        return "".join(
+            literal + ("" if field is None else str(values[field]).strip()) for literal, field in self._parts
+        )
+
+
+class PreparedBody(NamedTuple):
+    """A serialized request body, ready to send as it is"""
+    text: str
+    # Whether the response may be cached (see `response_cache.is_cacheable`)
+    cacheable: bool
+
+
+class BodyTemplate:
+    """A request body serialized once, with placeholders for the fields that vary
+
+    Parameters
+    ----------
+    build :
+        Builds the body (a JSON-serializable dict) from keyword arguments, e.g. a provider's
+        `build_body`. It must pass each field's value through, or embed it in a longer string.
+    fields :
+        Names of the string arguments filled in by `render`, JSON-escaped.
+    raw_fields :
+        Names of string arguments filled in by `render` as they are. Their values must not need
+        any JSON escaping (as base64 doesn't); `render` checks they are ASCII without quotes,
+        backslashes or control characters.
+    cacheable :
+        Decides from the built body whether responses may be cached.
+    **static :
+        The other arguments to `build`, the same for every request.
+    """
+
+    def __init__(
+        self,
+        build: Callable[..., dict],
+        fields: Sequence[str] = (),
+        raw_fields: Sequence[str] = (),
+        cacheable: Callable[[dict], bool] = lambda body: True,
+        **static,
+    ):
+        self.fields = tuple(fields)
+        self.raw_fields = tuple(raw_fields)
+        self.static = static
+        # Unique placeholders: NUL characters, escaped by JSON, can't come from the static values
+        token = uuid.uuid4().hex
+        placeholders = {name: f"\x00{token}{n}\x00" for n, name in enumerate(self.fields + self.raw_fields)}
+        body = build(**static, **placeholders)
+        self.cacheable = cacheable(body)
+        serialized = json.dumps(body)
+        escaped = {json.dumps(placeholder)[1:-1]: name for name, placeholder in placeholders.items()}
+        pieces = re.split("(" + "|".join(map(re.escape, escaped)) + ")", serialized) if escaped else [serialized]
+        # Alternating literal JSON and field names: literal, field, literal, ..., literal
+        self._pieces: List[Any] = [escaped.get(piece, piece) if n % 2 else piece for n, piece in enumerate(pieces)]
+        unused = set(placeholders) - set(self._pieces[1::2])
+        if unused:
+            raise ValueError(f"Request body doesn't contain fields {', '.join(sorted(unused))} as given")
+
+    def render(self, **values: str) -> PreparedBody:
+        """The serialized body for these field values"""
+        encoded: Dict[str, str] = {}
+        for name in self.fields:
+            encoded[name] = json.dumps(values[name])[1:-1]
+        for name in self.raw_fields:
+            value = values[name]
+            if not value.isascii() or len(value.encode("ascii").translate(None, _JSON_UNSAFE)) != len(value):
+                raise ValueError(f"Raw request field {name!r} has characters that need JSON escaping")
+            encoded[name] = value
+        pieces = self._pieces.copy()
+        pieces[1::2] = [encoded[name] for name in pieces[1::2]]
+        return PreparedBody("".join(pieces), self.cacheable)
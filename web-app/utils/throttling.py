@@ -0,0 +1,317 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Adaptive concurrency limits and per-model request governors that back off when Bedrock throttles
+
+Every Bedrock call in the task goes through the `ModelGovernor` for its model (see
+`models.invoke`), shared by all Streamlit sessions. When Bedrock starts throttling, the governor
+lowers that model's concurrency and request rate for everyone at once and queues further
+requests in arrival order, instead of each session retrying on its own and making it worse.
+
+Limits can be set per model with the BEDROCK_RATE_LIMITS environment variable: either JSON, or
+the path of a JSON file, like
+
+    {"default": {"concurrency": 8}, "stability.stable-diffusion-xl-v1": {"rate": 1.5, "concurrency": 4}}
+
+where `rate` is in requests per second (unlimited if not set, until throttling shows a limit),
+and `concurrency` / `max_concurrency` are the starting and highest concurrency limits. Set
+BEDROCK_GOVERNOR=0 to turn governors off.
+"""
+# Python Built-Ins:
+from collections import deque
+from contextlib import contextmanager
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+# External Dependencies:
+from botocore.exceptions import ClientError
+
+
+THROTTLING_ERRORS = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+# Successful request rate is measured over this many seconds when throttling reveals a rate limit
+RATE_WINDOW = 30.0
+MIN_RATE = 0.1
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Whether an exception from a Bedrock call means the request was throttled"""
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_ERRORS
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit adjusted by additive-increase / multiplicative-decrease (AIMD)
+
+    Callers `acquire()` a slot before each request and `release()` it afterwards, saying whether
+    the request was throttled. Waiting callers are served strictly first come, first served. Each
+    throttled request halves the limit (at most once per "generation" of in-flight requests, so
+    a burst of throttles doesn't collapse it to the minimum), and every `limit` successful
+    requests in a row raise it by one.
+
+    Parameters
+    ----------
+    initial :
+        Starting limit.
+    minimum :
+        Lowest the limit will go.
+    maximum :
+        Highest the limit will go.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self.throttles = 0
+        self._successes = 0
+        self._generation = 0
+        self._tickets = itertools.count()
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers waiting for a slot"""
+        return len(self._queue)
+
+    def _ready(self) -> Optional[float]:
+        """Called with the lock held for the caller at the head of the queue: None if it may go
+        now, else how long to wait before checking again (0 to wait for a release)"""
+        return None if self.in_flight < self.limit else 0
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """Wait for a free slot; returns a token to pass back to `release`
+
+        Raises `TimeoutError` if no slot became free within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            try:
+                while True:
+                    wait = 0
+                    if self._queue[0] == ticket:
+                        wait = self._ready()
+                        if wait is None:
+                            break
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(f"No request slot free after {timeout} seconds")
+                        wait = min(wait, remaining) if wait else remaining
+                    self._condition.wait(wait or None)
+            finally:
+                self._queue.remove(ticket)
+                # Let the next in line check whether it can go too
+                self._condition.notify_all()
+            self.in_flight += 1
+            return self._generation
+
+    def _on_throttle(self):
+        """Called with the lock held when the limit is lowered because of throttling"""
+
+    def release(self, token: int, throttled: bool = False):
+        """Free a slot taken by `acquire`, adjusting the limit by the request's outcome"""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self._successes = 0
+                # Requests started before the last decrease were sent at the old, higher limit
+                if token == self._generation:
+                    self.limit = max(self.minimum, self.limit // 2)
+                    self._generation += 1
+                    self._on_throttle()
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class Slot:
+    """A request slot held from a `ModelGovernor`; set `congested` if the request needed retries"""
+
+    def __init__(self):
+        self.throttled = False
+        self.congested = False
+        self.queue_wait = 0.0
+
+
+class ModelGovernor(AdaptiveConcurrency):
+    """Process-wide request governor for one Bedrock model: AIMD concurrency plus a token bucket
+
+    The token bucket limits the request rate, with bursts of up to `burst` requests. If no `rate`
+    is configured, the rate is unlimited until the model is first throttled, when it is set to
+    90% of the successful request rate just before the throttling. After that, throttling halves
+    it and it grows again by 10% for every `limit` successful requests in a row.
+
+    Parameters
+    ----------
+    model_id :
+        The model this governor is for (for display).
+    rate :
+        Optional requests per second.
+    burst :
+        Token bucket size, i.e. how many requests may be sent at once after a quiet period.
+    clock :
+        Monotonic time in seconds, for refilling the bucket and measuring the request rate.
+    **kwargs :
+        As for `AdaptiveConcurrency`.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        rate: Optional[float] = None,
+        burst: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.model_id = model_id
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._refilled = clock()
+        self._sent = deque()
+        self._rate_successes = 0
+
+    def _ready(self) -> Optional[float]:
+        if self.in_flight >= self.limit:
+            return 0
+        if self.rate is None:
+            return None
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        self._tokens -= 1
+        return None
+
+    def _on_throttle(self):
+        now = self._clock()
+        while self._sent and now - self._sent[0] > RATE_WINDOW:
+            self._sent.popleft()
+        if self.rate is None:
+            # First throttling: the rate we were actually getting through is a good estimate of the quota
+            span = now - self._sent[0] if self._sent else 0
+            observed = len(self._sent) / max(span, 1.0)
+            self.rate = observed * 0.9 if observed else 1.0
+        else:
+            self.rate *= 0.5
+        self.rate = max(MIN_RATE, self.rate)
+        self._rate_successes = 0
+        self._tokens = min(self._tokens, 1.0)
+
+    def release(self, token: int, throttled: bool = False):
+        with self._condition:
+            if not throttled:
+                now = self._clock()
+                self._sent.append(now)
+                while now - self._sent[0] > RATE_WINDOW:
+                    self._sent.popleft()
+                self._rate_successes += 1
+                if self.rate is not None and self._rate_successes >= self.limit:
+                    self.rate *= 1.1
+                    self._rate_successes = 0
+        super().release(token, throttled=throttled)
+
+    @contextmanager
+    def slot(self) -> Iterator[Slot]:
+        """Hold a request slot for the duration of a `with` block
+
+        Waits (in turn with all other sessions) for both a concurrency slot and a rate token. A
+        throttling exception raised from the block, or `congested` being set on the slot, lowers
+        the limits.
+        """
+        slot = Slot()
+        start_time = time.monotonic()
+        token = self.acquire()
+        slot.queue_wait = time.monotonic() - start_time
+        try:
+            yield slot
+        except Exception as e:
+            slot.throttled = is_throttling_error(e)
+            raise
+        finally:
+            self.release(token, throttled=slot.throttled or slot.congested)
+            _publish(self, slot)
+
+    def state(self) -> dict:
+        """Current limits and load, for display"""
+        with self._condition:
+            return {
+                "model": self.model_id,
+                "concurrency limit": self.limit,
+                "in flight": self.in_flight,
+                "queue depth": len(self._queue),
+                "rate limit (req/s)": None if self.rate is None else round(self.rate, 2),
+                "throttles": self.throttles,
+            }
+
+
+def _publish(governor: ModelGovernor, slot: Slot):
+    # Imported here to keep this module free of the metrics module's start-up side effects
+    from .metrics import get_metrics
+
+    store = get_metrics()
+    store.observe("bedrock_queue_wait_seconds", governor.model_id, slot.queue_wait)
+    if slot.throttled:
+        store.increment("bedrock_throttles_total", governor.model_id)
+    store.set_gauge("bedrock_concurrency_limit", governor.model_id, governor.limit)
+    store.set_gauge("bedrock_in_flight", governor.model_id, governor.in_flight)
+    store.set_gauge("bedrock_queue_depth", governor.model_id, governor.queue_depth)
+    if governor.rate is not None:
+        store.set_gauge("bedrock_rate_limit", governor.model_id, governor.rate)
+
+
+def _load_limits() -> dict:
+    config = os.environ.get("BEDROCK_RATE_LIMITS", "").strip()
+    if not config:
+        return {}
+    if not config.startswith("{"):
+        with open(config) as f:
+            return json.load(f)
+    return json.loads(config)
+
+
+_governors: Dict[str, ModelGovernor] = {}
+_governors_lock = threading.Lock()
+_limits = None
+
+
+def get_governor(model_id: str) -> Optional[ModelGovernor]:
+    """Get the process-wide governor for a model, or None if BEDROCK_GOVERNOR=0"""
+    global _limits
+    if os.environ.get("BEDROCK_GOVERNOR", "1") == "0":
+        return None
+    with _governors_lock:
+        governor = _governors.get(model_id)
+        if governor is None:
+            if _limits is None:
+                _limits = _load_limits()
+            limits = {**_limits.get("default", {}), **_limits.get(model_id, {})}
+            governor = ModelGovernor(
+                model_id,
+                rate=limits.get("rate"),
+                burst=limits.get("burst", 2.0),
+                initial=limits.get("concurrency", 8),
+                maximum=limits.get("max_concurrency", 64),
+            )
+            _governors[model_id] = governor
+        return governor
+
+
+def governor_states() -> List[dict]:
+    """State of every governor created so far"""
+    with _governors_lock:
+        governors = list(_governors.values())
+    return [governor.state() for governor in governors]
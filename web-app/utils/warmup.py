@@ -0,0 +1,92 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Once-per-process start-up work, kept off the page scripts that Streamlit re-runs
+
+Streamlit re-executes a page script on every interaction, and the first render after a scale-out
+also pays for importing boto3/botocore, loading the Bedrock service model and (on the image pages)
+PIL. `warm_up()` does that work once per process, by default on a background thread so the page
+that triggers it can render its header straight away:
+
+    from utils.warmup import logo, warm_up
+
+    warm_up()
+    st.image(logo(), width=100)
+"""
+# Python Built-Ins:
+import importlib
+import os
+import threading
+import time
+
+
+# Heavy modules some page will need sooner or later. Modules that aren't installed are skipped.
+WARM_UP_MODULES = [
+    "boto3",
+    "botocore.client",
+    "PIL.Image",
+    "PIL.PngImagePlugin",
+    "PIL.JpegImagePlugin",
+    "pypdf",
+    "numpy",
+    "faiss",
+]
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imgs", "bedrock.png")
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+_logo = None
+
+
+def logo() -> bytes:
+    """The Amazon Bedrock logo shown in every page header, read from disk only once"""
+    global _logo
+    if _logo is None:
+        with open(LOGO_PATH, "rb") as f:
+            _logo = f.read()
+    return _logo
+
+
+def _warm_up():
+    start_time = time.time()
+    for name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    logo()
+    try:
+        # Imported here so that importing this module stays cheap
+        from .models import get_default_client
+
+        get_default_client()
+    except Exception as e:
+        # Missing credentials etc. will surface again (with the page's own handling) on first use
+        print(f"Warm-up could not create the Bedrock client: {e}")
+    try:
+        from .cloudwatch import start_cloudwatch_publisher
+
+        start_cloudwatch_publisher()
+    except Exception as e:
+        print(f"Could not start publishing CloudWatch metrics: {e}")
+    print(f"Warm-up finished in {time.time() - start_time:.2f}s")
+
+
+def warm_up(background: bool = True) -> threading.Thread:
+    """Run the process start-up work, if it hasn't been started already
+
+    Safe to call from every page on every rerun: only the first call in a process does anything.
+
+    Parameters
+    ----------
+    background :
+        If True (default), return straight away and do the work on a daemon thread. If False, wait
+        for the warm-up (whether started by this call or an earlier one) to finish.
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+    if not background:
+        _warm_up_thread.join()
+    return _warm_up_thread